@@ -0,0 +1,295 @@
+"""Shared helpers for reading VBA project archives (ZIP of exported modules).
+
+Uploads are spooled to a temp file past ``Limits.spool_bytes`` and base64
+payloads are decoded chunk by chunk, so peak memory stays around one chunk
+plus one decoded module no matter how large the archive is.
+"""
+import io, os, re, json, binascii
+from contextlib import contextmanager
+
+from _http import send_json
+from _metrics import span
+
+MODULE_EXTS = (".bas", ".cls", ".frm")
+VBA_PROJECT = "xl/vbaproject.bin"        # inside .xlsm / .xlam / .xlsb packages
+ZIP_TYPES   = ("application/zip", "application/vnd.ms-excel", "application/octet-stream")
+CHUNK       = 64 * 1024
+NO_MODULES  = "No VBA modules (.bas/.cls/.frm or vbaProject.bin) found in ZIP"
+
+class ArchiveLimitError(ValueError):
+    """Upload or archive exceeds a configured limit (maps to HTTP 413)."""
+
+class UploadError(ValueError):
+    """Request body is not a usable archive upload (maps to HTTP 400)."""
+
+class Limits:
+    """Ingestion limits; defaults overridable via VBA_* environment variables."""
+
+    def __init__(self, **kw):
+        env = os.environ.get
+        self.max_upload   = kw.get("max_upload",   int(env("VBA_MAX_UPLOAD_MB", 256)) << 20)
+        self.max_total    = kw.get("max_total",    int(env("VBA_MAX_UNZIPPED_MB", 1024)) << 20)
+        self.max_members  = kw.get("max_members",  int(env("VBA_MAX_MEMBERS", 10000)))
+        self.max_ratio    = kw.get("max_ratio",    int(env("VBA_MAX_RATIO", 100)))
+        self.spool_bytes  = kw.get("spool_bytes",  int(env("VBA_SPOOL_MB", 8)) << 20)
+
+LIMITS = Limits()
+
+def is_zip_upload(content_type):
+    """Raw ZIP / workbook upload (.zip, .xlsm, .xlam all are ZIP packages)."""
+    return any(t in content_type for t in ZIP_TYPES)
+
+def open_zip(zip_bytes):
+    """Open raw ZIP bytes; raises zipfile.BadZipFile on garbage."""
+    import zipfile
+    return zipfile.ZipFile(io.BytesIO(zip_bytes))
+
+def _spool(limits):
+    import tempfile
+    return tempfile.SpooledTemporaryFile(max_size=limits.spool_bytes)
+
+def _chunks(rfile, length, limits):
+    if length > limits.max_upload:
+        raise ArchiveLimitError(f"Upload exceeds {limits.max_upload} bytes")
+    while length > 0:
+        buf = rfile.read(min(CHUNK, length))
+        if not buf:
+            break
+        length -= len(buf)
+        yield buf
+
+def spool_body(rfile, length, limits=LIMITS):
+    """Copy a raw request body into a rewound spooled file."""
+    out = _spool(limits)
+    for buf in _chunks(rfile, length, limits):
+        out.write(buf)
+    out.seek(0)
+    return out
+
+_ESCAPES    = re.compile(rb"\\[nrt]")
+_NON_B64    = re.compile(rb"[^A-Za-z0-9+/=]")
+_STR_STOP   = re.compile(rb'["\\]')             # inside a string: its end or an escape
+_TOKEN      = re.compile(rb'["{}\[\]:,]')         # outside strings: structure
+_SPACE      = re.compile(rb"[^ \t\r\n]")
+
+class _TopLevelKey:
+    """Finds the string value of one top-level key in a JSON body read chunk by chunk.
+
+    Tracks string, escape and nesting state, so the key only matches as a
+    key of the outermost object: never inside another string, as a value,
+    or in a nested object.  Bytes before the value are not kept (apart from
+    a top-level key being read), however far into the body it starts.
+    """
+
+    def __init__(self, field):
+        self.field  = field
+        self.raw    = field.encode()
+        self.depth  = 0
+        self.object = False     # the outermost value is an object
+        self.in_str = False
+        self.esc    = False
+        self.key    = None      # bytes of the top-level key being read
+        self.want   = False     # the next top-level string is a key
+        self.state  = None      # "colon" after the key matched, "value" after its colon
+
+    def _matches(self, key):
+        if b"\\" not in key:
+            return key == self.raw
+        try:
+            return json.loads(b'"' + key + b'"') == self.field
+        except ValueError:
+            return False
+
+    def feed(self, buf):
+        """Offset just past the value's opening quote in ``buf``, or -1 to read on."""
+        i, n = 0, len(buf)
+        while i < n:
+            if self.in_str:
+                if self.esc:                        # the escaped byte
+                    if self.key is not None:
+                        self.key += buf[i:i + 1]
+                    self.esc, i = False, i + 1
+                    continue
+                m = _STR_STOP.search(buf, i)
+                j = m.start() if m else n
+                if self.key is not None and len(self.key) <= 6 * len(self.raw):
+                    self.key += buf[i:j]
+                if m is None:
+                    return -1
+                if buf[j] == 0x5C:                  # backslash
+                    if self.key is not None:
+                        self.key += b"\\"
+                    self.esc, i = True, j + 1
+                    continue
+                self.in_str, i = False, j + 1
+                if self.key is not None:
+                    self.state = "colon" if self._matches(bytes(self.key)) else None
+                    self.key   = None
+                continue
+            if self.state == "value":
+                m = _SPACE.search(buf, i)
+                if m is None:
+                    return -1
+                if buf[m.start()] != 0x22:
+                    raise ValueError(f"Missing '{self.field}'")      # present, but not a string
+                return m.end()
+            m = _TOKEN.search(buf, i)
+            if m is None:
+                return -1
+            c, i = buf[m.start()], m.end()
+            if c == 0x22:
+                self.in_str = True
+                if self.want and self.depth == 1:
+                    self.key, self.want = bytearray(), False
+            elif c in b"{[":
+                self.depth += 1
+                if self.depth == 1:
+                    self.object = self.want = c == 0x7B
+            elif c in b"}]":
+                self.depth -= 1
+            elif c == 0x2C:
+                self.want = self.depth == 1 and self.object
+            elif self.state == "colon":             # ":" after the matched key
+                self.state = "value"
+        return -1
+
+def _b64(data, field):
+    try:
+        return binascii.a2b_base64(data)
+    except binascii.Error as exc:
+        raise ValueError(f"Bad base64 in '{field}'") from exc
+
+def _feed(out, data, field):
+    """Decode the 4-char aligned head of ``data`` into ``out``; returns the rest."""
+    cut = len(data) - len(data) % 4
+    out.write(_b64(data[:cut], field))
+    return data[cut:]
+
+def _finish(out, pend, field):
+    if pend:
+        out.write(_b64(pend + b"=" * (-len(pend) % 4), field))
+    out.seek(0)
+    return out
+
+def spool_base64_field(rfile, length, field, limits=LIMITS):
+    """Stream-decode the base64 string value of ``field`` from a JSON body.
+
+    Only the top-level key counts (see _TopLevelKey); the value is decoded
+    in 4-char aligned chunks straight into a spooled file.  Raises ValueError
+    when the field is missing or not a base64 string.
+    """
+    scan   = _TopLevelKey(field)
+    out    = _spool(limits)
+    pend   = b""
+    inside = False
+    for buf in _chunks(rfile, length, limits):
+        if not inside:
+            at = scan.feed(buf)
+            if at == -1:
+                continue
+            inside, buf = True, buf[at:]
+        end   = buf.find(b'"')
+        pend += buf[: end if end != -1 else None]
+        carry = b"\\" if pend.endswith(b"\\") else b""   # escape split across chunks
+        data  = _NON_B64.sub(b"", _ESCAPES.sub(b"", pend[: len(pend) - len(carry)]))
+        pend  = _feed(out, data, field) + carry
+        if end != -1:
+            break
+    if not inside:
+        raise ValueError(f"Missing '{field}'")
+    return _finish(out, _NON_B64.sub(b"", pend), field)
+
+def spool_base64_text(text, field, limits=LIMITS):
+    """Decode an already parsed base64 string into a spooled file, CHUNK chars at a time."""
+    out, pend = _spool(limits), b""
+    for i in range(0, len(text), CHUNK):
+        pend = _feed(out, pend + _NON_B64.sub(b"", text[i:i + CHUNK].encode("ascii", "replace")), field)
+    return _finish(out, pend, field)
+
+def check_zip(zf, limits=LIMITS):
+    """Reject archives with too many members, too much data or bomb-like ratios."""
+    infos = zf.infolist()
+    if len(infos) > limits.max_members:
+        raise ArchiveLimitError(f"ZIP has more than {limits.max_members} members")
+    total = 0
+    for info in infos:
+        total += info.file_size
+        if info.file_size > limits.max_ratio * max(info.compress_size, 1) and info.file_size > CHUNK:
+            raise ArchiveLimitError(f"Suspicious compression ratio in {info.filename}")
+    if total > limits.max_total:
+        raise ArchiveLimitError(f"ZIP expands beyond {limits.max_total} bytes")
+
+def _read_member(zf, info):
+    with zf.open(info) as fh:
+        data = fh.read(info.file_size + 1)
+    if len(data) > info.file_size:   # header lied about the size
+        raise ArchiveLimitError(f"{info.filename} is larger than declared")
+    return data
+
+def iter_modules(zf, exts=MODULE_EXTS, limits=LIMITS):
+    """Yield (name, text) per module, decoding one member at a time.
+
+    A macro-enabled workbook yields the modules stored in its
+    ``xl/vbaProject.bin``; any other ZIP yields its exported module files.
+    """
+    check_zip(zf, limits)
+    infos   = zf.infolist()
+    project = next((i for i in infos if i.filename.lower() == VBA_PROJECT), None)
+    if project is not None:
+        from _ovba import iter_vba_modules
+        yield from iter_vba_modules(_read_member(zf, project))
+        return
+    for info in infos:
+        if info.filename.lower().endswith(exts):
+            yield info.filename, _read_member(zf, info).decode("utf-8", "ignore")
+
+def _spool_upload(handler, limits):
+    """Spool a ``zipBase64`` JSON body or a raw ZIP / workbook upload."""
+    content_type = handler.headers.get("Content-Type", "").lower()
+    length       = int(handler.headers.get("Content-Length", 0) or 0)
+    if "application/json" in content_type:
+        try:
+            with span(handler, "decode"):
+                return spool_base64_field(handler.rfile, length, "zipBase64", limits)
+        except ArchiveLimitError:
+            raise
+        except Exception as exc:
+            raise UploadError("Invalid JSON with 'zipBase64'") from exc
+    if is_zip_upload(content_type):
+        with span(handler, "decode"):
+            return spool_body(handler.rfile, length, limits)
+    raise UploadError("Expected zipBase64 (JSON) or ZIP file upload")
+
+@contextmanager
+def open_upload(handler, limits=LIMITS):
+    """The request's archive as an open ZipFile, or None once an error was sent.
+
+    Archive errors raised inside the block are answered too: 413 for
+    ArchiveLimitError, 400 for a corrupt vbaProject.bin.  The spool is
+    closed on exit::
+
+        with open_upload(self) as zf:
+            if zf is None:
+                return
+            modules = iter_modules(zf)
+    """
+    import zipfile
+    from _ovba import OVBAError
+    opened = False
+    try:
+        with _spool_upload(handler, limits) as spool:
+            try:
+                zf = zipfile.ZipFile(spool)
+            except Exception as exc:
+                raise UploadError("Invalid ZIP format") from exc
+            opened = True
+            yield zf
+        return
+    except UploadError as exc:
+        send_json(handler, {"error": str(exc)}, 400)
+    except ArchiveLimitError as exc:
+        send_json(handler, {"error": str(exc)}, 413)
+    except OVBAError as exc:
+        send_json(handler, {"error": f"Invalid vbaProject.bin: {exc}"}, 400)
+    if not opened:
+        yield None
@@ -0,0 +1,190 @@
+"""Small shared caches: a thread-safe LRU, a single-flight result cache and an optional on-disk pickle store."""
+import os, time, hashlib, threading
+from collections import Counter, OrderedDict
+
+def content_hash(*parts):
+    """sha256 hex digest over str/bytes parts (NUL-separated)."""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p if isinstance(p, bytes) else str(p).encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+class LRUCache:
+    """Entry-count bounded LRU with hit/miss counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits    = 0
+        self.misses  = 0
+        self._data   = OrderedDict()
+        self._lock   = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}
+
+class _Flight:
+    __slots__ = ("done", "value", "ok")
+
+    def __init__(self):
+        self.done  = threading.Event()
+        self.value = None
+        self.ok    = False
+
+class ResultCache:
+    """Finished responses shared across handlers, keyed by normalized request.
+
+    Bounded by entry count and total ``len()`` of the values, LRU first,
+    with a per-entry TTL.  Each namespace (endpoint) carries the version its
+    entries were computed under; a lookup with a different version drops
+    the namespace.  Concurrent misses on one key compute once: the first
+    caller computes, the others wait for its value.
+    """
+
+    def __init__(self, maxsize=2048, max_bytes=64 << 20, ttl=300.0):
+        self.maxsize   = maxsize
+        self.max_bytes = max_bytes
+        self.ttl       = ttl
+        self.bytes     = 0
+        self.events    = Counter()       # (namespace, event)
+        self._data     = OrderedDict()   # key → (namespace, expires, value)
+        self._versions = {}              # namespace → version
+        self._flights  = {}              # key → _Flight
+        self._lock     = threading.Lock()
+
+    def get_or_compute(self, namespace, version, key, compute):
+        """(value, "hit" | "miss" | "coalesced" | "bypass") for ``key``."""
+        if self.maxsize <= 0:
+            return compute(), "bypass"
+        with self._lock:
+            if self._versions.setdefault(namespace, version) != version:
+                self._invalidate(namespace)
+                self._versions[namespace] = version
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.events[(namespace, "hit")] += 1
+                    return entry[2], "hit"
+                self._pop(key)
+                self.events[(namespace, "expired")] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.ok:
+                with self._lock:
+                    self.events[(namespace, "coalesced")] += 1
+                return flight.value, "coalesced"
+            return compute(), "miss"      # the leader failed; its error is not ours to share
+
+        try:
+            value = compute()
+        except BaseException:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+            raise
+        with self._lock:
+            self._flights.pop(key, None)
+            self.events[(namespace, "miss")] += 1
+            if self._versions.get(namespace) == version:     # not superseded while computing
+                self._store(namespace, key, value)
+        flight.value, flight.ok = value, True
+        flight.done.set()
+        return value, "miss"
+
+    def _store(self, namespace, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._pop(key)
+        self._data[key] = (namespace, time.monotonic() + self.ttl, value)
+        self.bytes += size
+        while len(self._data) > self.maxsize or self.bytes > self.max_bytes:
+            _, (ns, _, val) = self._data.popitem(last=False)
+            self.bytes -= len(val)
+            self.events[(ns, "evicted")] += 1
+
+    def _pop(self, key):
+        _, _, value = self._data.pop(key)
+        self.bytes -= len(value)
+
+    def _invalidate(self, namespace):
+        stale = [k for k, (ns, _, _) in self._data.items() if ns == namespace]
+        for k in stale:
+            self._pop(k)
+        self.events[(namespace, "invalidated")] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            events = Counter()
+            for (_, ev), n in self.events.items():
+                events[ev] += n
+            return {"size": len(self._data), "maxsize": self.maxsize,
+                    "hits": events["hit"], "misses": events["miss"],
+                    "bytes": self.bytes, "maxBytes": self.max_bytes,
+                    "events": dict(self.events)}
+
+class DiskStore:
+    """Pickle-per-key store under ``root/ab/<key>.pkl``; misses and I/O errors return None."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".pkl")
+
+    def get(self, key):
+        import pickle
+        try:
+            with open(self._path(key), "rb") as fh:
+                return pickle.load(fh)
+        except (OSError, pickle.PickleError, EOFError, ValueError, KeyError, IndexError,
+                AttributeError, ImportError):     # corrupt or written by an incompatible version
+            return None
+
+    def put(self, key, value):
+        import pickle, tempfile
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(value, fh, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        return value
@@ -0,0 +1,192 @@
+"""Linear-time analytics over a flow_analyzer call graph.
+
+Strongly connected components come from an iterative Tarjan pass; the
+condensation is a DAG, so what each procedure can reach is summarised in
+one sweep from callees to callers as a small mask of effect kinds plus an
+error-hotspot bit.  Reach sets themselves are never materialised:
+unreachable procedures and ``reach`` queries are breadth-first searches.
+"""
+import heapq
+from urllib.parse import parse_qs
+
+def analytics_query(query):
+    """(entries, reach, top) from a query string; names are lower-cased, top defaults to 10."""
+    params = parse_qs(query)
+    top    = params.get("top", ["10"])[0]
+    return ([e.lower() for e in params.get("entry", [])],
+            [r.lower() for r in params.get("reach", [])],
+            int(top) if top.isdigit() else 10)
+
+class CallGraphIndex:
+    """Index over ``{proc: iterable of callees}``; non-procedure callees are ignored."""
+
+    def __init__(self, graph):
+        self.nodes = list(graph)
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+        self.adj   = [sorted({self.index[c] for c in graph[n] if c in self.index})
+                      for n in self.nodes]
+        self.fan_in = [0] * len(self.nodes)
+        for succ in self.adj:
+            for w in succ:
+                self.fan_in[w] += 1
+        self.comp, self.comps = _tarjan(self.adj)
+
+    # ---------- construction ----------
+    def _bfs(self, starts):
+        """Marks of every node reachable from ``starts`` (the starts included)."""
+        seen  = bytearray(len(self.nodes))
+        queue = []
+        for v in starts:
+            if not seen[v]:
+                seen[v] = 1
+                queue.append(v)
+        for v in queue:                       # grows while iterating
+            for w in self.adj[v]:
+                if not seen[w]:
+                    seen[w] = 1
+                    queue.append(w)
+        return seen
+
+    def _reached(self, own):
+        """OR of ``own`` over everything each node eventually calls, itself included."""
+        # Tarjan emits components sinks-first, so every callee component is done
+        done = [0] * len(self.comps)
+        for ci, members in enumerate(self.comps):
+            bits = 0
+            for v in members:
+                bits |= own[v]
+                for w in self.adj[v]:
+                    if self.comp[w] != ci:
+                        bits |= done[self.comp[w]]
+            done[ci] = bits
+        return [done[c] for c in self.comp]
+
+    # ---------- queries ----------
+    def reaches(self, node):
+        """Procedures ``node`` eventually calls, excluding itself unless recursive."""
+        seen = self._bfs(self.adj[self.index[node]])
+        return [n for n, s in zip(self.nodes, seen) if s]
+
+    def cycles(self):
+        """Recursive groups: components of size > 1 plus self-calling procedures."""
+        return [[self.nodes[v] for v in sorted(members)]
+                for members in reversed(self.comps)
+                if len(members) > 1 or members[0] in self.adj[members[0]]]
+
+    def topo_order(self):
+        """Callers before callees; members of a cycle stay adjacent."""
+        return [self.nodes[v] for members in reversed(self.comps) for v in sorted(members)]
+
+    def default_entries(self):
+        """Roots: procedures nothing else calls (macros, event handlers)."""
+        return [n for i, n in enumerate(self.nodes) if not self.fan_in[i]]
+
+    def unreachable(self, entries):
+        seen = self._bfs(self.index[e] for e in entries if e in self.index)
+        return [n for n, s in zip(self.nodes, seen) if not s]
+
+    def ranking(self, counts, top):
+        order = heapq.nsmallest(top, range(len(self.nodes)), key=lambda i: (-counts[i], self.nodes[i]))
+        return [{"proc": self.nodes[i], "count": counts[i]} for i in order if counts[i]]
+
+    def summary_from_query(self, query, effects, hotspots):
+        """summary() driven by a request's ``?entry=mod.proc&reach=mod.proc&top=N``."""
+        entries, reach, top = analytics_query(query)
+        return self.summary(effects, hotspots, entries=entries, top=top, reach=reach)
+
+    def summary(self, effects, hotspots, entries=None, top=10, reach=()):
+        """Everything the endpoint reports under ``analytics``.
+
+        hotPaths scores each procedure by (fan-in + 1) × (1 + distinct side
+        effects it can reach + 2 if it can reach an On Error hotspot).
+        """
+        fan_out = [len(a) for a in self.adj]
+        entries = [e for e in (entries or self.default_entries()) if e in self.index]
+
+        # one bit per effect kind, the top bit for "is an error hotspot"
+        kinds = sorted({k for ks in effects.values() for k in ks})
+        bit   = {k: 1 << j for j, k in enumerate(kinds)}
+        hot   = 1 << len(kinds)
+        own   = [0] * len(self.nodes)
+        for proc, ks in effects.items():
+            i = self.index.get(proc)
+            if i is not None:
+                for k in ks:
+                    own[i] |= bit[k]
+        for proc in hotspots:
+            i = self.index.get(proc)
+            if i is not None:
+                own[i] |= hot
+
+        decoded = {}                          # mask → kinds it names
+        paths   = []
+        for i, mask in enumerate(self._reached(own)):
+            if not mask:
+                continue
+            if mask not in decoded:
+                decoded[mask] = [k for k in kinds if mask & bit[k]]
+            names = decoded[mask]
+            err   = bool(mask & hot)
+            paths.append({"proc": self.nodes[i], "fanIn": self.fan_in[i], "fanOut": fan_out[i],
+                          "reachesEffects": list(names), "reachesErrorHotspot": err,
+                          "score": (self.fan_in[i] + 1) * (1 + len(names) + 2 * err)})
+
+        out = {
+            "cycles": self.cycles(),
+            "topologicalOrder": self.topo_order(),
+            "entryPoints": entries,
+            "unreachable": self.unreachable(entries),
+            "fanIn": self.ranking(self.fan_in, top),
+            "fanOut": self.ranking(fan_out, top),
+            "hotPaths": heapq.nsmallest(top, paths, key=lambda p: (-p["score"], p["proc"])),
+        }
+        if reach:
+            out["reach"] = {n: self.reaches(n) for n in reach if n in self.index}
+        return out
+
+def _tarjan(adj):
+    """Iterative Tarjan SCC; returns (component id per node, components sinks-first)."""
+    n       = len(adj)
+    index   = [-1] * n
+    low     = [0] * n
+    on      = [False] * n
+    comp    = [-1] * n
+    stack   = []
+    comps   = []
+    counter = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            v, pi = work.pop()
+            if pi == 0:
+                index[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                on[v] = True
+            succ = adj[v]
+            while pi < len(succ):
+                w = succ[pi]
+                pi += 1
+                if index[w] == -1:
+                    work.append((v, pi))
+                    work.append((w, 0))
+                    break
+                if on[w]:
+                    low[v] = min(low[v], index[w])
+            else:
+                if low[v] == index[v]:
+                    members = []
+                    while True:
+                        w = stack.pop()
+                        on[w] = False
+                        comp[w] = len(comps)
+                        members.append(w)
+                        if w == v:
+                            break
+                    comps.append(members)
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+    return comp, comps
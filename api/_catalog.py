@@ -0,0 +1,203 @@
+"""Shared on-disk knowledge catalog for contextual_features and hidden_features.
+
+The JSON catalog is parsed once, frozen (tuples / read-only mappings) and
+reloaded only when the file's mtime or size changes.  If the file goes
+missing or a new version fails to load, the last loaded catalog stays in
+service.  A pickle snapshot next to it (or in EXCELGPT_SNAPSHOT_DIR) skips
+JSON parsing on cold start.
+
+Derived indexes are declared with ``register(name, version, build)`` and
+snapshotted one file each, keyed by the catalog stamp and that version;
+scenario records inside them are stored as references into the catalog, so
+a loaded index shares the catalog's records.
+``python api/_catalog.py`` prebuilds the catalog and every index snapshot at
+deploy time.  Requests only write snapshots when EXCELGPT_SNAPSHOT_DIR names
+a writable cache directory: the catalog's own directory is read-only on
+serverless hosts.
+
+With EXCELGPT_PREWARM=1 the consumers also build their derived indexes at
+import, for hosts that initialise (or snapshot) a function before its first
+request; otherwise that work happens on the first request that needs it.
+"""
+import os, json, pickle, threading
+from types import MappingProxyType
+
+CATALOG_PATH = os.environ.get("EXCELGPT_CATALOG") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "catalog.json")
+SNAPSHOT_DIR = os.environ.get("EXCELGPT_SNAPSHOT_DIR")
+PREWARM      = os.environ.get("EXCELGPT_PREWARM", "").lower() in ("1", "true", "yes", "on")
+
+_INDEXES = {}       # name → (version, build); see register()
+
+class CatalogError(RuntimeError):
+    """No catalog has been loaded and the file cannot be read (maps to HTTP 503)."""
+
+def register(name, version, build):
+    """Declare a derived index: ``build(catalog)`` once per catalog version.
+
+    Bump ``version`` whenever the index's layout or the way it is built
+    changes, so stale snapshots are rebuilt instead of loaded.
+    """
+    _INDEXES[name] = (version, build)
+
+class Catalog:
+    """Immutable view of one catalog file version, plus memoized derived indexes."""
+
+    def __init__(self, raw, stamp, path=None):
+        self.stamp     = stamp
+        self.path      = path
+        self.version   = raw.get("version", 1)
+        self.scenarios = MappingProxyType({t: tuple(recs) for t, recs in raw.get("scenarios", {}).items()})
+        self.hints     = MappingProxyType(dict(raw.get("genericHints", {})))
+        self.gems      = MappingProxyType({t: tuple(g) for t, g in raw.get("gems", {}).items()})
+        self._derived  = {}
+        self._lock     = threading.Lock()
+
+    def derived(self, name):
+        """The registered index ``name``: from its snapshot, else built and snapshotted."""
+        try:
+            return self._derived[name]
+        except KeyError:
+            with self._lock:
+                if name not in self._derived:
+                    version, build = _INDEXES[name]
+                    index = _read_index(self, name, version)
+                    if index is None:
+                        index = build(self)
+                        if SNAPSHOT_DIR:
+                            _write_index(self, name, version, index)
+                    self._derived[name] = index
+                return self._derived[name]
+
+def _stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def _snapshot_path(path, name=None):
+    base = os.path.join(SNAPSHOT_DIR, os.path.basename(path)) if SNAPSHOT_DIR else path
+    return f"{base}.{name}.pickle" if name else base + ".pickle"
+
+def _read(path, stamp):
+    snap = _snapshot_path(path)
+    try:
+        with open(snap, "rb") as fh:
+            saved_stamp, raw = pickle.load(fh)
+        if saved_stamp == stamp:
+            return raw
+    except (OSError, pickle.PickleError, EOFError, ValueError):
+        pass
+    with open(path, encoding="utf-8") as fh:
+        raw = json.load(fh)
+    if SNAPSHOT_DIR:
+        write_snapshot(path, raw, stamp)
+    return raw
+
+def write_snapshot(path=CATALOG_PATH, raw=None, stamp=None):
+    """Best effort: a read-only filesystem just means no snapshot."""
+    try:
+        if raw is None:
+            with open(path, encoding="utf-8") as fh:
+                raw = json.load(fh)
+        stamp = stamp or _stamp(path)
+        snap  = _snapshot_path(path)
+        tmp   = f"{snap}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump((stamp, raw), fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, snap)
+        return snap
+    except OSError:
+        return None
+
+class _IndexPickler(pickle.Pickler):
+    """Pickles a topic's records as (topic,) and one record as (topic, position)."""
+
+    def __init__(self, fh, cat):
+        super().__init__(fh, pickle.HIGHEST_PROTOCOL)
+        self.refs = {id(recs): (topic,) for topic, recs in cat.scenarios.items()}
+        self.refs.update((id(rec), (topic, pos)) for topic, recs in cat.scenarios.items()
+                         for pos, rec in enumerate(recs))
+
+    def persistent_id(self, obj):
+        return self.refs.get(id(obj))
+
+class _IndexUnpickler(pickle.Unpickler):
+    def __init__(self, fh, cat):
+        super().__init__(fh)
+        self.scenarios = cat.scenarios
+
+    def persistent_load(self, ref):
+        recs = self.scenarios[ref[0]]
+        return recs if len(ref) == 1 else recs[ref[1]]
+
+def _read_index(cat, name, version):
+    """The snapshotted index, or None when missing, stale or unreadable."""
+    if cat.path is None:
+        return None
+    try:
+        with open(_snapshot_path(cat.path, name), "rb") as fh:
+            if pickle.load(fh) != (cat.stamp, version):
+                return None
+            return _IndexUnpickler(fh, cat).load()
+    except (OSError, pickle.PickleError, EOFError, ValueError, KeyError, IndexError):
+        return None
+
+def _write_index(cat, name, version, index):
+    """Best effort, like write_snapshot."""
+    if cat.path is None:
+        return None
+    try:
+        snap = _snapshot_path(cat.path, name)
+        tmp  = f"{snap}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump((cat.stamp, version), fh, pickle.HIGHEST_PROTOCOL)
+            _IndexPickler(fh, cat).dump(index)
+        os.replace(tmp, snap)
+        return snap
+    except OSError:
+        return None
+
+def prebuild(path=CATALOG_PATH):
+    """Write the catalog snapshot and every registered index snapshot (deploy time)."""
+    stamp = _stamp(path)
+    snaps = [write_snapshot(path, stamp=stamp)]
+    cat   = Catalog(_read(path, stamp), stamp, path)
+    for name, (version, build) in _INDEXES.items():
+        snaps.append(_write_index(cat, name, version, build(cat)))
+    return snaps
+
+_current = None
+_failed  = None     # stamp of a file version that failed to load
+_lock    = threading.Lock()
+
+def catalog():
+    """Current catalog; costs one stat() per call once loaded.
+
+    A missing file, or a new version that fails to load, keeps the last
+    loaded catalog (a failed version is not retried until the file changes
+    again); with nothing loaded yet it raises CatalogError.
+    """
+    global _current, _failed
+    path = CATALOG_PATH
+    try:
+        stamp = _stamp(path)
+    except OSError as exc:
+        if _current is not None:
+            return _current
+        raise CatalogError(f"Scenario catalog unavailable: {exc.strerror or exc}") from exc
+    cur = _current
+    if cur is not None and stamp in (cur.stamp, _failed):
+        return cur
+    with _lock:
+        if _current is None or stamp not in (_current.stamp, _failed):
+            try:
+                _current = Catalog(_read(path, stamp), stamp, path)
+            except (OSError, ValueError, AttributeError) as exc:     # unreadable, bad JSON, not an object
+                if _current is None:
+                    raise CatalogError(f"Scenario catalog unavailable: {exc}") from exc
+                _failed = stamp
+        return _current
+
+if __name__ == "__main__":
+    import _catalog, contextual_features  # noqa: F401  (registers the indexes with _catalog)
+    for snap in _catalog.prebuild():
+        print(snap or "snapshot not written")
@@ -0,0 +1,207 @@
+"""Shared response writer for every handler.
+
+Compact JSON unless ``?pretty=1``; gzip when the client accepts it and the
+body is at least HTTP_GZIP_MIN_BYTES; always a Content-Length and a strong
+ETag.  Handlers whose output is a pure function of the request can pass a
+``key`` (see request_key) so a repeat request carrying the ETag it got last
+time is answered 304 before any work or serialization happens, and
+send_cached shares the serialized body of such responses across clients
+(RESULTS, keyed on the normalized request).  Batch output (NDJSON, ZIP)
+streams through Stream instead.
+"""
+import os, json, hashlib
+from urllib.parse import urlsplit, parse_qs
+
+from _cache import LRUCache, ResultCache, content_hash
+from _metrics import REGISTRY, current, span
+
+GZIP_MIN     = int(os.environ.get("HTTP_GZIP_MIN_BYTES", 1024))
+STREAM_CHUNK = int(os.environ.get("HTTP_STREAM_CHUNK_BYTES", 64 * 1024))
+_ETAGS       = REGISTRY.watch("etag", LRUCache(int(os.environ.get("HTTP_ETAG_CACHE", 8192))))   # request key → (etag, size)
+RESULTS      = REGISTRY.watch("results", ResultCache(     # normalized request → serialized body
+    int(os.environ.get("HTTP_RESULT_CACHE", 2048)),
+    int(float(os.environ.get("HTTP_RESULT_CACHE_MB", 64)) * (1 << 20)),
+    float(os.environ.get("HTTP_RESULT_CACHE_TTL", 300))))
+
+def query(h):
+    return parse_qs(urlsplit(h.path).query)
+
+def wants_pretty(h):
+    return query(h).get("pretty", ["0"])[0].lower() not in ("0", "false", "no", "")
+
+def request_key(h, endpoint, version, raw):
+    """Fingerprint of a request whose response depends only on these inputs."""
+    return content_hash(endpoint, version, h.path, raw)
+
+def _gzip_ok(h, size):
+    if size < GZIP_MIN:
+        return False
+    for part in h.headers.get("Accept-Encoding", "").lower().split(","):
+        coding, _, q = part.strip().partition(";")
+        if coding.strip() in ("gzip", "*"):
+            return q.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def _etag(base, gz):
+    return f'"{base}-gz"' if gz else f'"{base}"'
+
+def _matches(h, etag):
+    inm = h.headers.get("If-None-Match")
+    if not inm:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+    return "*" in tags or etag in tags
+
+def _timing(h, status, size):
+    """Account status/bytes on the current request and emit Server-Timing."""
+    req = current(h)
+    if req is None:
+        return
+    req.status     = status
+    req.bytes_out += size
+    if req.spans:
+        h.send_header("Server-Timing", req.server_timing())
+
+def _send_304(h, etag):
+    h.send_response(304)
+    h.send_header("ETag", etag)
+    h.send_header("Vary", "Accept-Encoding")
+    _timing(h, 304, 0)
+    h.end_headers()
+
+def not_modified(h, key):
+    """Answer 304 from the ETag memo; True when the handler can stop here."""
+    hit = _ETAGS.get(key) if key else None
+    if hit is None:
+        return False
+    base, size = hit
+    etag = _etag(base, _gzip_ok(h, size))
+    if not _matches(h, etag):
+        return False
+    _send_304(h, etag)
+    return True
+
+def send_bytes(h, body, content_type, status=200, key=None, headers=()):
+    base = hashlib.sha256(body).hexdigest()[:32]
+    gz   = _gzip_ok(h, len(body))
+    etag = _etag(base, gz)
+    if status == 200:
+        if key:
+            _ETAGS.put(key, (base, len(body)))
+        if _matches(h, etag):
+            return _send_304(h, etag)
+    if gz:
+        import gzip
+        with span(h, "compress"):
+            body = gzip.compress(body, 6, mtime=0)
+    h.send_response(status)
+    h.send_header("Content-Type", content_type)
+    h.send_header("Content-Length", str(len(body)))
+    h.send_header("ETag", etag)
+    h.send_header("Vary", "Accept-Encoding")
+    if gz:
+        h.send_header("Content-Encoding", "gzip")
+    for name, value in headers:
+        h.send_header(name, value)
+    _timing(h, status, len(body))
+    h.end_headers()
+    h.wfile.write(body)
+
+def dumps(obj, pretty=False):
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+def send_json(h, obj, status=200, key=None):
+    with span(h, "serialize"):
+        body = dumps(obj, wants_pretty(h))
+    send_bytes(h, body, "application/json; charset=utf-8", status, key)
+
+def send_cached(h, endpoint, version, normalized, build, key=None):
+    """Send ``build()`` as JSON, computed once per normalized request.
+
+    ``normalized`` holds every input the response depends on after
+    normalization; ``version`` is the rules/catalog version it was computed
+    under, so entries from an older one are dropped.  Identical requests in
+    flight at the same time share one computation.
+    """
+    pretty = wants_pretty(h)
+
+    def compute():
+        obj = build()
+        with span(h, "serialize"):
+            return dumps(obj, pretty)
+
+    ckey = content_hash(endpoint, version, pretty, json.dumps(normalized, ensure_ascii=False))
+    body, state = RESULTS.get_or_compute(endpoint, version, ckey, compute)
+    send_bytes(h, body, "application/json; charset=utf-8", 200, key, [("X-Cache", state)])
+
+def send_text(h, text, status=200):
+    send_bytes(h, text.encode(), "text/plain; charset=utf-8", status)
+
+class Stream:
+    """Body writer for a streamed 200 response, file-like enough for zipfile.
+
+    Chunked on HTTP/1.1 keep-alive connections, close-delimited otherwise.
+    Writes are buffered up to STREAM_CHUNK bytes; flush() sends what is
+    buffered as one chunk, close() ends the body.
+    """
+
+    def __init__(self, h, content_type, headers=()):
+        self.h       = h
+        self.chunked = h.protocol_version == "HTTP/1.1" and h.request_version == "HTTP/1.1"
+        self.buf     = bytearray()
+        self.req     = current(h)
+        h.send_response(200)
+        h.send_header("Content-Type", content_type)
+        if self.chunked:
+            h.send_header("Transfer-Encoding", "chunked")
+        else:
+            h.send_header("Connection", "close")
+        for name, value in headers:
+            h.send_header(name, value)
+        _timing(h, 200, 0)
+        h.end_headers()
+
+    def write(self, data):
+        self.buf += data
+        if len(self.buf) >= STREAM_CHUNK:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self.buf:
+            return
+        data, self.buf = bytes(self.buf), bytearray()
+        self.h.wfile.write(b"%x\r\n%s\r\n" % (len(data), data) if self.chunked else data)
+        self.h.wfile.flush()
+        if self.req is not None:
+            self.req.bytes_out += len(data)
+
+    def close(self):
+        self.flush()
+        if self.chunked:
+            self.h.wfile.write(b"0\r\n\r\n")
+
+def send_ndjson(h, records):
+    """Stream one compact JSON line per record as each one is produced."""
+    out = Stream(h, "application/x-ndjson")
+    for rec in records:
+        out.write(dumps(rec) + b"\n")
+        out.flush()
+    out.close()
+
+def send_zip(h, members, filename="modules.zip", date_time=(1980, 1, 1, 0, 0, 0)):
+    """Stream a deflated ZIP of (name, bytes) members as each one is produced.
+
+    Every member carries ``date_time``, so equal members give equal bytes.
+    """
+    import zipfile
+    out = Stream(h, "application/zip", [("Content-Disposition", f'attachment; filename="{filename}"')])
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            info = zipfile.ZipInfo(name, date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zf.writestr(info, data)
+            out.flush()
+    out.close()
@@ -0,0 +1,287 @@
+"""Comment/string-aware VBA lexer shared by the lint rules and the call-graph builder.
+
+``lex(text)`` runs once per module (cached by content hash) and gives:
+
+* ``code``        the source with comments and ``_`` line continuations
+                  blanked, same length, so offsets still index ``text``;
+                  continued newlines become ``\\x0b`` (still ``\\s``, no
+                  longer a line break).  Regex rules run on this view.
+* ``in_string``   whether an offset falls inside a string literal.
+* ``tokens``      lower-cased token stream of ``code`` (built on first use):
+                  identifiers, ``"literals"``, numbers, operators, ``\\n``.
+* ``statements``  (line, tokens) per logical statement; ``:``, ``Then`` and
+                  ``Else`` split statements, labels and line numbers dropped.
+* ``procedures``  Procedure per Sub/Function/Property with its body;
+                  ``nest(body)`` adds the enclosing loops and With depth.
+"""
+import re, os
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import chain
+
+from _cache import LRUCache, content_hash
+
+LEXER_VERSION = "2"
+
+# string literals, comments (which may themselves be continued), Rem
+# statements (at the start of a line or of a statement after ":", Then or
+# Else) and " _" line continuations: everything the code view blanks or
+# must skip
+_MASK_RE  = re.compile(
+    r'(?P<str>"(?:[^"\n]|"")*"?)'
+    r"|(?P<cmt>'(?:[^\n]*[ \t]_\r?\n)*[^\n]*)"
+    r"|(?P<rem>(?:(?<=\n)|(?<=:)|(?<=\Wthen)|(?<=\Welse)|^)[ \t]*(?:\d+[ \t]+)?Rem\b"
+    r"(?:[^\n]*[ \t]_\r?\n)*[^\n]*)"
+    r"|(?P<cont>[ \t]_[ \t]*\r?\n)",
+    re.I,
+)
+_BLANK    = re.compile(r"[^\n]")
+TOKEN_RE  = re.compile(
+    r'"(?:[^"\n]|"")*"?'                       # string literal (kept whole)
+    r"|[^\W\d]\w*\$?"                          # identifier (Left$ etc.)
+    r"|&[ho][0-9a-f]+&?"                       # hex / octal literal
+    r"|\d+(?:\.\d*)?(?:e[+-]?\d+)?[#!@&%^]?|\.\d+"
+    r"|:=|<>|<=|>=|\n|\x0b"
+    r"|[^\s]",
+)
+
+KEYWORDS = frozenset("""
+    addressof and as attribute boolean byref byte byval call case close const currency date decimal
+    declare defbool defbyte defcur defdate defdbl defint deflng deflnglng deflngptr defobj defsng defstr
+    defvar dim do double each else elseif empty end enum eqv erase error event exit explicit false for
+    friend function get global gosub goto if imp implements in input integer is let lib like lock long
+    longlong longptr loop lset me mod new next not nothing null object on open option optional or
+    paramarray preserve print private property ptrsafe public put raiseevent redim rem resume return rset
+    seek select set single static step stop string sub then to true type typeof unlock until variant
+    wend while with withevents write xor
+""".split())
+
+# VBA/Excel built-ins and global members: calls to these are never project calls
+BUILTINS = frozenset("""
+    abs activecell activesheet activeworkbook activewindow application array asc ascw atn callbyname
+    cbool cbyte ccur cdate cdbl cdec cells charts chr chrw cint clng clnglng clngptr columns command
+    cos createobject csng cstr cvar cverr date dateadd datediff datepart dateserial datevalue day
+    debug dir doevents environ eof err error evaluate exp filedatetime filelen filter fix format
+    formatcurrency formatdatetime formatnumber formatpercent freefile getattr getobject hex hour iif
+    inputbox instr instrrev int isarray isdate isempty iserror ismissing isnull isnumeric isobject join
+    kill lbound lcase left len loc lof log ltrim mid minute mkdir month monthname msgbox names now oct
+    range replace rgb right rmdir rnd round rows rtrim second selection sendkeys setattr sgn sheets shell
+    sin space split sqr str strcomp strconv string strreverse switch tab tan thisworkbook time timer
+    timeserial timevalue trim typename ubound ucase val vartype weekday weekdayname workbooks
+    worksheetfunction worksheets year
+""".split()) | {n + "$" for n in "chr format hex lcase left ltrim mid oct right rtrim space str string trim ucase".split()}
+
+PROC_KINDS  = ("sub", "function", "property")
+_SEPARATORS = frozenset(("\n", ":", "then", "else"))
+SCOPES      = ("public", "private", "friend", "global")
+DECLARE     = frozenset(("dim", "static", "redim", "const"))
+
+LOOP_OPEN   = frozenset(("for", "do", "while"))
+
+Procedure = namedtuple("Procedure", "kind name scope line end_line params body")
+
+def is_name(tok):
+    """Identifier token that is not a keyword."""
+    return tok[:1].isalpha() and tok not in KEYWORDS
+
+def declared(st):
+    """Names declared by a Dim/Static/ReDim/Const/Private/Public statement."""
+    names, depth, expect = [], 0, True
+    for t in st[1:]:
+        if t == "(":
+            depth += 1
+        elif t == ")":
+            depth -= 1
+        elif depth == 0:
+            if t == ",":
+                expect = True
+            elif expect and is_name(t):
+                names.append(t)
+                expect = False
+    return names
+
+class Lexed:
+    """One module's lexer output; see the module docstring."""
+
+    def __init__(self, text):
+        self.text     = text
+        starts, ends  = array("l"), array("l")
+
+        def mask(m):
+            if m.lastgroup == "str":
+                starts.append(m.start())
+                ends.append(m.end())
+                return m.group()
+            return _BLANK.sub(" ", m.group()).replace("\n", "\x0b")
+
+        self.code     = _MASK_RE.sub(mask, text)
+        self._sstart  = starts
+        self._send    = ends
+        self._lines   = None
+        self._tokens  = None
+        self._stmts   = None
+        self._procs   = None
+        self._outside = None
+
+    # --- offsets ---------------------------------------------------
+    def in_string(self, pos):
+        i = bisect_right(self._sstart, pos) - 1
+        return i >= 0 and pos < self._send[i]
+
+    @property
+    def line_starts(self):
+        if self._lines is None:
+            self._lines = array("l", [0])
+            self._lines.extend(m.end() for m in re.finditer("\n", self.text))
+        return self._lines
+
+    def line_of(self, pos):
+        """1-based physical line of an offset."""
+        return bisect_right(self.line_starts, pos)
+
+    # --- tokens ----------------------------------------------------
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = TOKEN_RE.findall(self.code.lower())
+        return self._tokens
+
+    @property
+    def statements(self):
+        """[(line, [tokens])] per logical statement, in source order."""
+        if self._stmts is None:
+            self._stmts = list(self._split())
+        return self._stmts
+
+    def _split(self):
+        line, start, cur, bol = 1, 1, [], True     # bol: first statement on its line
+        for t in chain(self.tokens, ("\n",)):     # a final "\n" flushes the last statement
+            if t in _SEPARATORS:
+                if cur:
+                    if bol and cur[0][0].isdigit():          # "10 x = 1": line number
+                        cur = cur[1:]
+                    if cur and not (bol and t == ":" and len(cur) == 1):   # "Label:"
+                        yield start, cur
+                    cur = []
+                if t == "\n":
+                    line += 1
+                bol = t == "\n"
+            elif t == "\x0b":
+                line += 1
+            else:
+                if not cur:
+                    start = line
+                cur.append(t)
+
+    @property
+    def procedures(self):
+        """[Procedure] in source order; an unterminated one runs to the next header."""
+        if self._procs is None:
+            self._procs, self._outside = self._segment()
+        return self._procs
+
+    @property
+    def outside(self):
+        """[(line, tokens)] of module-level statements (declarations, options)."""
+        if self._outside is None:
+            self._procs, self._outside = self._segment()
+        return self._outside
+
+    def _segment(self):
+        procs, outside, open_ = [], [], None
+        for line, st in self.statements:
+            head = _header(st)
+            if head:
+                if open_:
+                    procs.append(Procedure(*open_[:4], line - 1, *open_[4:]))
+                kind, name, scope, params = head
+                open_ = (kind, name, scope, line, params, [])
+            elif st[0] == "end" and len(st) > 1 and st[1] in PROC_KINDS:
+                if open_ and open_[0].split()[0].lower() == st[1]:
+                    procs.append(Procedure(*open_[:4], line, *open_[4:]))
+                    open_ = None
+            elif open_:
+                open_[5].append((line, st))
+            else:
+                outside.append((line, st))
+        if open_:
+            last = self.statements[-1][0] if self.statements else open_[3]
+            procs.append(Procedure(*open_[:4], last, *open_[4:]))
+        return procs, outside
+
+def _header(st):
+    """(kind, name, scope, params) when the statement opens a procedure."""
+    i, scope = 0, "public"
+    if st[0] in SCOPES:
+        scope, i = ("public" if st[0] == "global" else st[0]), 1
+    if i < len(st) and st[i] == "static":
+        i += 1
+    if i + 1 >= len(st) or st[i] not in PROC_KINDS:
+        return None
+    kind = st[i].title()
+    if kind == "Property":
+        if i + 2 >= len(st) or st[i + 1] not in ("get", "let", "set"):
+            return None
+        kind, i = f"Property {st[i + 1].title()}", i + 1
+    name = st[i + 1]
+    if not name[0].isalpha():
+        return None
+    return kind, name, scope, _params(st, i + 2)
+
+def _params(st, i):
+    """Parameter names from the parenthesised list starting at st[i]."""
+    names, depth, expect = [], 0, True
+    for t in st[i:]:
+        if t == "(":
+            depth += 1
+            if depth == 1:
+                continue
+        elif t == ")":
+            depth -= 1
+            if depth == 0:
+                break
+        if depth == 1:
+            if t == ",":
+                expect = True
+            elif expect and is_name(t):
+                names.append(t)
+                expect = False
+    return names
+
+# ----------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------
+LEXED = LRUCache(int(os.environ.get("VBA_LEX_CACHE", 256)))
+
+def lex(text):
+    """Lexer output for ``text``, shared by every caller in the process."""
+    key = content_hash(LEXER_VERSION, text)
+    out = LEXED.get(key)
+    if out is None:
+        out = LEXED.put(key, Lexed(text))
+    return out
+
+def nest(body):
+    """Yield (line, tokens, loops, with_depth) per statement of a procedure body.
+
+    ``loops`` holds the header tokens of every enclosing For/Do/While loop,
+    outermost first; closing statements (Next, Loop, Wend, End With) are
+    consumed.  ``Next j, i`` closes one loop per variable.
+    """
+    loops, withs = [], 0
+    for line, st in body:
+        head = st[0]
+        if head in ("next", "loop", "wend"):
+            for _ in range(st.count(",") + 1 if head == "next" else 1):
+                if loops:
+                    loops.pop()
+            continue
+        if head == "end" and len(st) > 1 and st[1] == "with":
+            withs = max(0, withs - 1)
+            continue
+        yield line, st, tuple(loops), withs
+        if head in LOOP_OPEN:
+            loops.append(st)
+        elif head == "with":
+            withs += 1
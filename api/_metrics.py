@@ -0,0 +1,221 @@
+"""Per-request timing spans, Server-Timing and Prometheus metrics.
+
+Handlers wrap ``do_*`` with ``@instrumented("<endpoint>")`` and mark phases
+with ``with span(self, "parse"):``.  Each span costs two perf_counter() calls
+and a list append; the registry is updated once per request under a lock.
+
+Set EXCELGPT_PROFILE_SLOW_MS to sample the stacks of requests running longer
+than that; when a slow request finishes its sampled stacks go to the profile
+hook (logged by default, replace with ``set_profile_hook``).
+"""
+import os, sys, time, threading, functools
+from collections import Counter
+from contextlib import contextmanager
+
+BUCKETS      = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROFILE_MS   = float(os.environ.get("EXCELGPT_PROFILE_SLOW_MS", 0) or 0)
+PROFILE_TICK = float(os.environ.get("EXCELGPT_PROFILE_TICK_MS", 10)) / 1000
+
+class Request:
+    __slots__ = ("endpoint", "start", "spans", "status", "bytes_in", "bytes_out", "samples")
+
+    def __init__(self, endpoint, bytes_in):
+        self.endpoint  = endpoint
+        self.start     = time.perf_counter()
+        self.spans     = []          # (name, seconds)
+        self.status    = 200
+        self.bytes_in  = bytes_in
+        self.bytes_out = 0
+        self.samples   = None
+
+    def server_timing(self):
+        return ", ".join(f"{n};dur={s * 1000:.2f}" for n, s in self.spans)
+
+class Registry:
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.latency   = {}          # endpoint → [bucket counts..., sum, count]
+        self.requests  = Counter()   # (endpoint, status)
+        self.bytes_in  = Counter()
+        self.bytes_out = Counter()
+        self.span_sum  = Counter()   # (endpoint, span)
+        self.span_cnt  = Counter()
+        self.caches    = {}          # name → cache with stats() (see watch)
+
+    def watch(self, name, cache):
+        """Export ``cache.stats()`` hit/miss counters with every render."""
+        self.caches[name] = cache
+        return cache
+
+    def record(self, req, elapsed):
+        with self.lock:
+            hist = self.latency.setdefault(req.endpoint, [0] * (len(BUCKETS) + 2))
+            for i, le in enumerate(BUCKETS):
+                if elapsed <= le:
+                    hist[i] += 1
+            hist[-2] += elapsed
+            hist[-1] += 1
+            self.requests[(req.endpoint, req.status)] += 1
+            self.bytes_in[req.endpoint]  += req.bytes_in
+            self.bytes_out[req.endpoint] += req.bytes_out
+            for name, secs in req.spans:
+                self.span_sum[(req.endpoint, name)] += secs
+                self.span_cnt[(req.endpoint, name)] += 1
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        out = []
+        with self.lock:
+            out += ["# HELP excelgpt_request_duration_seconds Request latency.",
+                    "# TYPE excelgpt_request_duration_seconds histogram"]
+            for ep, hist in sorted(self.latency.items()):
+                for le, n in zip(BUCKETS, hist):
+                    out.append(f'excelgpt_request_duration_seconds_bucket{{endpoint="{ep}",le="{le}"}} {n}')
+                out.append(f'excelgpt_request_duration_seconds_bucket{{endpoint="{ep}",le="+Inf"}} {hist[-1]}')
+                out.append(f'excelgpt_request_duration_seconds_sum{{endpoint="{ep}"}} {hist[-2]:.6f}')
+                out.append(f'excelgpt_request_duration_seconds_count{{endpoint="{ep}"}} {hist[-1]}')
+            out += ["# HELP excelgpt_requests_total Requests by endpoint and status.",
+                    "# TYPE excelgpt_requests_total counter"]
+            out += [f'excelgpt_requests_total{{endpoint="{ep}",status="{st}"}} {n}'
+                    for (ep, st), n in sorted(self.requests.items())]
+            for metric, counter, help_ in (
+                    ("excelgpt_request_bytes_total", self.bytes_in, "Request body bytes."),
+                    ("excelgpt_response_bytes_total", self.bytes_out, "Response body bytes on the wire.")):
+                out += [f"# HELP {metric} {help_}", f"# TYPE {metric} counter"]
+                out += [f'{metric}{{endpoint="{ep}"}} {n}' for ep, n in sorted(counter.items())]
+            out += ["# HELP excelgpt_span_seconds_total Time spent per request phase.",
+                    "# TYPE excelgpt_span_seconds_total counter"]
+            out += [f'excelgpt_span_seconds_total{{endpoint="{ep}",span="{sp}"}} {s:.6f}'
+                    for (ep, sp), s in sorted(self.span_sum.items())]
+            out += ["# HELP excelgpt_span_count_total Completed spans per request phase.",
+                    "# TYPE excelgpt_span_count_total counter"]
+            out += [f'excelgpt_span_count_total{{endpoint="{ep}",span="{sp}"}} {n}'
+                    for (ep, sp), n in sorted(self.span_cnt.items())]
+            caches = sorted(self.caches.items())
+        out += self._render_caches(caches)
+        return "\n".join(out) + "\n"
+
+    @staticmethod
+    def _render_caches(caches):
+        stats = [(name, cache.stats()) for name, cache in caches]
+        out   = ["# HELP excelgpt_cache_lookups_total Cache lookups by result.",
+                 "# TYPE excelgpt_cache_lookups_total counter"]
+        for name, st in stats:
+            out.append(f'excelgpt_cache_lookups_total{{cache="{name}",result="hit"}} {st["hits"]}')
+            out.append(f'excelgpt_cache_lookups_total{{cache="{name}",result="miss"}} {st["misses"]}')
+        out += ["# HELP excelgpt_cache_entries Entries currently cached.",
+                "# TYPE excelgpt_cache_entries gauge"]
+        out += [f'excelgpt_cache_entries{{cache="{name}"}} {st["size"]}' for name, st in stats]
+
+        # result caches also break their events down by endpoint
+        events = [(name, st["events"]) for name, st in stats if "events" in st]
+        out += ["# HELP excelgpt_result_cache_events_total Result cache hits, misses, coalesced waits, evictions.",
+                "# TYPE excelgpt_result_cache_events_total counter"]
+        out += [f'excelgpt_result_cache_events_total{{cache="{name}",endpoint="{ep}",event="{ev}"}} {n}'
+                for name, evs in events for (ep, ev), n in sorted(evs.items())]
+        out += ["# HELP excelgpt_result_cache_hit_ratio Requests answered without computing (hits and coalesced waits).",
+                "# TYPE excelgpt_result_cache_hit_ratio gauge"]
+        for name, evs in events:
+            for ep in sorted({ep for ep, _ in evs}):
+                served = evs.get((ep, "hit"), 0) + evs.get((ep, "coalesced"), 0)
+                total  = served + evs.get((ep, "miss"), 0)
+                if total:
+                    out.append(f'excelgpt_result_cache_hit_ratio{{cache="{name}",endpoint="{ep}"}} {served / total:.4f}')
+        return out
+
+REGISTRY = Registry()
+
+# ----------------------------------------------------------------
+# Request lifecycle
+# ----------------------------------------------------------------
+def current(h):
+    return getattr(h, "_req", None)
+
+@contextmanager
+def span(h, name):
+    req = current(h)
+    t0  = time.perf_counter()
+    try:
+        yield
+    finally:
+        if req is not None:
+            req.spans.append((name, time.perf_counter() - t0))
+
+def instrumented(endpoint):
+    """Decorator for ``do_*`` methods: one Request per call, recorded on exit."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(self):
+            req = self._req = Request(endpoint, int(self.headers.get("Content-Length", 0) or 0))
+            if PROFILE_MS:
+                _Sampler.watch(req)
+            try:
+                return fn(self)
+            except Exception:
+                req.status = 500
+                raise
+            finally:
+                elapsed = time.perf_counter() - req.start
+                if PROFILE_MS:
+                    _Sampler.unwatch(req, elapsed)
+                REGISTRY.record(req, elapsed)
+        return wrapper
+    return deco
+
+# ----------------------------------------------------------------
+# Opt-in sampling profiler for slow requests
+# ----------------------------------------------------------------
+def _log_profile(endpoint, elapsed, samples):
+    import logging
+    top = "\n".join(f"  {n:5d}  {stack}" for stack, n in samples.most_common(10))
+    logging.getLogger("excelgpt.metrics").warning("slow %s request: %.0f ms, top sampled stacks:\n%s", endpoint, elapsed * 1000, top)
+
+_profile_hook = _log_profile
+
+def set_profile_hook(fn):
+    """``fn(endpoint, elapsed_seconds, Counter[stack → samples])`` for slow requests."""
+    global _profile_hook
+    _profile_hook = fn
+
+class _Sampler:
+    active = {}                 # thread id → Request
+    lock   = threading.Lock()
+    thread = None
+
+    @classmethod
+    def watch(cls, req):
+        with cls.lock:
+            cls.active[threading.get_ident()] = req
+            if cls.thread is None:
+                cls.thread = threading.Thread(target=cls._run, name="profiler", daemon=True)
+                cls.thread.start()
+
+    @classmethod
+    def unwatch(cls, req, elapsed):
+        with cls.lock:
+            cls.active.pop(threading.get_ident(), None)
+        if req.samples and elapsed * 1000 >= PROFILE_MS:
+            _profile_hook(req.endpoint, elapsed, req.samples)
+
+    @classmethod
+    def _run(cls):
+        while True:
+            time.sleep(PROFILE_TICK)
+            now = time.perf_counter()
+            with cls.lock:
+                slow = [(tid, r) for tid, r in cls.active.items() if (now - r.start) * 1000 >= PROFILE_MS]
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            for tid, req in slow:
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 12:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if req.samples is None:
+                    req.samples = Counter()
+                req.samples[" < ".join(stack)] += 1
@@ -0,0 +1,223 @@
+"""Pure-Python VBA source extraction from ``vbaProject.bin`` (MS-CFB + MS-OVBA).
+
+Only the directory, the ``VBA/dir`` stream and each module stream are read;
+nothing else in the compound file is touched.  Decompressed module source is
+cached by a hash of the compressed bytes, so repeat uploads skip the work.
+"""
+import struct
+
+from _cache import LRUCache, content_hash
+
+CFB_MAGIC  = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+ENDOFCHAIN = 0xFFFFFFFE
+FREESECT   = 0xFFFFFFFF
+SOURCES    = LRUCache(2048)
+
+class OVBAError(ValueError):
+    """vbaProject.bin is not a readable compound file / VBA project."""
+
+# ----------------------------------------------------------------
+# 1) Compound file (MS-CFB) reader
+# ----------------------------------------------------------------
+class CompoundFile:
+    def __init__(self, data):
+        if data[:8] != CFB_MAGIC:
+            raise OVBAError("Not an OLE compound file")
+        self.data = memoryview(data)
+        (sect_shift, mini_shift) = struct.unpack_from("<HH", data, 0x1E)
+        (n_fat, first_dir, _, self.cutoff, first_minifat, n_minifat,
+         first_difat, n_difat) = struct.unpack_from("<IIIIIIII", data, 0x2C)
+        self.ssize = 1 << sect_shift
+        self.msize = 1 << mini_shift
+
+        # FAT sector list = 109 header DIFAT slots + DIFAT chain
+        difat = list(struct.unpack_from("<109I", data, 0x4C))
+        sect  = first_difat
+        for _ in range(n_difat):
+            if sect in (ENDOFCHAIN, FREESECT):
+                break
+            per = self.ssize // 4
+            vals = struct.unpack_from(f"<{per}I", data, self._off(sect))
+            difat.extend(vals[:-1])
+            sect = vals[-1]
+        fat = []
+        for s in difat[:n_fat]:
+            fat.extend(struct.unpack_from(f"<{self.ssize // 4}I", data, self._off(s)))
+        self.fat = fat
+
+        self.entries = self._entries(bytes(self._chain(first_dir, self.fat, self.ssize, None)))
+        root = self.entries[0]
+        self.ministream = self._chain(root["start"], self.fat, self.ssize, root["size"])
+        minifat = self._chain(first_minifat, self.fat, self.ssize, None) if n_minifat else b""
+        self.minifat = list(struct.unpack(f"<{len(minifat) // 4}I", minifat))
+
+    def _off(self, sect):
+        return (sect + 1) * self.ssize
+
+    def _chain(self, start, fat, size, length, source=None):
+        src  = self.data if source is None else source
+        base = self.ssize if source is None else 0
+        out  = bytearray()
+        sect = start
+        seen = 0
+        while sect not in (ENDOFCHAIN, FREESECT) and sect < len(fat):
+            off = base + sect * size
+            out += src[off:off + size]
+            sect = fat[sect]
+            seen += 1
+            if seen > len(fat):
+                raise OVBAError("FAT chain loops")
+            if length is not None and len(out) >= length:
+                break
+        return bytes(out[:length] if length is not None else out)
+
+    @staticmethod
+    def _entries(raw):
+        entries = []
+        for off in range(0, len(raw) - 127, 128):
+            nlen = struct.unpack_from("<H", raw, off + 64)[0]
+            entries.append({
+                "name":  raw[off:off + max(nlen - 2, 0)].decode("utf-16-le", "ignore"),
+                "type":  raw[off + 66],
+                "left":  struct.unpack_from("<I", raw, off + 68)[0],
+                "right": struct.unpack_from("<I", raw, off + 72)[0],
+                "child": struct.unpack_from("<I", raw, off + 76)[0],
+                "start": struct.unpack_from("<I", raw, off + 116)[0],
+                "size":  struct.unpack_from("<Q", raw, off + 120)[0] & 0xFFFFFFFF,
+            })
+        return entries
+
+    def _children(self, sid):
+        """All entries in the sibling tree hanging off storage ``sid``."""
+        out, todo = {}, [self.entries[sid]["child"]]
+        while todo:
+            i = todo.pop()
+            if i >= len(self.entries) or i in out.values():
+                continue
+            e = self.entries[i]
+            out[e["name"].lower()] = i
+            todo += [e["left"], e["right"]]
+        return out
+
+    def find(self, path):
+        sid = 0
+        for part in path.split("/"):
+            sid = self._children(sid).get(part.lower())
+            if sid is None:
+                raise OVBAError(f"Stream {path!r} not found")
+        return sid
+
+    def read(self, path):
+        e = self.entries[self.find(path)]
+        if e["size"] < self.cutoff:
+            return self._chain(e["start"], self.minifat, self.msize, e["size"], self.ministream)
+        return self._chain(e["start"], self.fat, self.ssize, e["size"])
+
+# ----------------------------------------------------------------
+# 2) MS-OVBA run-length decompression (2.4.1)
+# ----------------------------------------------------------------
+def decompress(data):
+    if not data or data[0] != 1:
+        raise OVBAError("Bad compressed container signature")
+    out = bytearray()
+    pos = 1
+    n   = len(data)
+    while pos + 2 <= n:
+        header    = data[pos] | data[pos + 1] << 8
+        chunk_end = min(n, pos + (header & 0x0FFF) + 3)
+        pos      += 2
+        if not header & 0x8000:                     # raw 4096-byte chunk
+            out += data[pos:pos + 4096]
+            pos += 4096
+            continue
+        start = len(out)
+        while pos < chunk_end:
+            flags = data[pos]
+            pos  += 1
+            for bit in range(8):
+                if pos >= chunk_end:
+                    break
+                if not flags >> bit & 1:
+                    out.append(data[pos])
+                    pos += 1
+                    continue
+                token  = data[pos] | data[pos + 1] << 8
+                pos   += 2
+                count  = max((len(out) - start - 1).bit_length(), 4)
+                offset = (token >> (16 - count)) + 1
+                length = (token & (0xFFFF >> count)) + 3
+                src    = len(out) - offset
+                if src < start:
+                    raise OVBAError("Copy token points before chunk")
+                if offset >= length:
+                    out += out[src:src + length]
+                else:                               # overlapping run
+                    for k in range(length):
+                        out.append(out[src + k])
+        pos = chunk_end
+    return bytes(out)
+
+# ----------------------------------------------------------------
+# 3) dir stream → modules
+# ----------------------------------------------------------------
+def _dir_modules(dir_bytes):
+    """Yield (name, stream_name, offset, is_class) per module record."""
+    codepage = 1252
+    mod      = None
+    pos, n   = 0, len(dir_bytes)
+    while pos + 6 <= n:
+        rid, size = struct.unpack_from("<HI", dir_bytes, pos)
+        pos += 6
+        if rid == 0x0009:                           # PROJECTVERSION: size field lies
+            size = 6
+        val  = dir_bytes[pos:pos + size]
+        pos += size
+        if rid == 0x0003:
+            codepage = struct.unpack("<H", val)[0]
+        elif rid == 0x0019:
+            mod = {"name": _decode(val, codepage), "stream": None, "offset": 0, "cls": False}
+        elif rid == 0x0047 and mod is not None:
+            mod["name"] = val.decode("utf-16-le", "ignore") or mod["name"]
+        elif rid == 0x001A and mod is not None:
+            mod["stream"] = _decode(val, codepage)
+        elif rid == 0x0032 and mod is not None:
+            mod["stream"] = val.decode("utf-16-le", "ignore") or mod["stream"]
+        elif rid == 0x0031 and mod is not None:
+            mod["offset"] = struct.unpack("<I", val)[0]
+        elif rid == 0x0022 and mod is not None:
+            mod["cls"] = True
+        elif rid == 0x002B and mod is not None:
+            yield mod, codepage
+            mod = None
+
+def _decode(raw, codepage):
+    try:
+        return raw.decode(f"cp{codepage}")
+    except (LookupError, UnicodeDecodeError):
+        return raw.decode("latin-1")
+
+def iter_vba_modules(project_bin):
+    """Yield (file_name, source_text) for every module in a vbaProject.bin.
+
+    Standard modules come out as ``Name.bas``, class/document/form modules as
+    ``Name.cls`` so flow_analyzer.module_key() sees the real module name.
+    """
+    try:
+        cfb  = CompoundFile(project_bin)
+        info = decompress(cfb.read("VBA/dir"))
+    except (struct.error, IndexError) as exc:
+        raise OVBAError("Corrupt vbaProject.bin") from exc
+    for mod, codepage in _dir_modules(info):
+        try:
+            stream = cfb.read("VBA/" + mod["stream"])
+        except (OVBAError, TypeError):
+            continue
+        packed = stream[mod["offset"]:]
+        key    = content_hash(codepage, packed)
+        text   = SOURCES.get(key)
+        if text is None:
+            try:
+                text = SOURCES.put(key, _decode(decompress(packed), codepage))
+            except (OVBAError, IndexError):
+                continue
+        yield mod["name"] + (".cls" if mod["cls"] else ".bas"), text
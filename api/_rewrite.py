@@ -0,0 +1,578 @@
+"""Opt-in performance rewrites for audit_optimize (``rewrite=1``).
+
+``optimize(code, name)`` applies structure-aware transforms to one module
+and returns the optimized text, a unified diff against the input and one
+report entry per candidate site.  Every transform reads the shared lexer's
+statements and only fires when its preconditions hold; otherwise the site
+is reported with ``applied: false`` and the reason, and its lines are left
+exactly as they were.
+
+* ``buffer-cells``  a ``For`` loop (or two nested ones) whose whole body is
+                    one ``[ws.]Cells(r, c)[.Value] = expr`` write indexed by
+                    the loop variables, with declared-variable bounds and a
+                    value that neither reads the sheet nor calls anything:
+                    the values go to a Variant array and the range is
+                    written once.  A run-time error in ``expr`` now leaves
+                    the range untouched instead of half written.
+* ``getrows``       ``Do While Not rs.EOF`` / ``Do Until rs.EOF`` /
+                    ``While Not rs.EOF`` loops that only read fields by
+                    ordinal and end in ``rs.MoveNext``: one ``GetRows`` call
+                    and a ``For`` over the array (the recordset still ends
+                    at EOF).
+* ``app-guard``     Subs that still write cells inside a loop or use
+                    ``.Select``: ScreenUpdating off, plus Calculation manual
+                    when the Sub neither reads the sheet nor calls other
+                    procedures, both restored on every exit and errors
+                    re-raised to the caller.
+"""
+import re
+from collections import Counter
+
+from _lexer import BUILTINS, DECLARE, LOOP_OPEN, SCOPES, declared, is_name, lex, nest
+
+REWRITE_VERSION = "1"
+
+_NUMBER = re.compile(r"\d+$")
+
+# built-ins that neither read the sheet nor change anything
+PURE = frozenset("""
+    abs atn cbool cbyte ccur cdate cdbl cdec chr chrw cint clng clnglng csng cstr cvar date dateadd
+    datediff dateserial day exp fix format hex hour iif instr instrrev int lcase left len log ltrim mid
+    minute month now oct replace right round rtrim second sgn sin space sqr str strcomp string tan time
+    timer trim ucase val weekday year
+""".split()) | {n + "$" for n in "chr format hex lcase left ltrim mid oct right rtrim space str string trim ucase".split()}
+_NILADIC     = frozenset(("date", "now", "time", "timer"))
+_EXPR_WORDS  = frozenset("and or not xor mod eqv imp like true false empty null".split())
+_OPERATORS   = frozenset("+ - * / \\ ^ & = <> < > <= >= ( ) ,".split())
+_BOUND_OPS   = frozenset("+ - * ( )".split())
+SHEET_READS  = frozenset("""
+    cells range value value2 text formula formular1c1 worksheetfunction evaluate activecell
+    selection activesheet usedrange calculate find vlookup hlookup match index
+""".split())
+SHEET_WRITES = frozenset("cells range value value2 formula formular1c1 activecell selection offset".split())
+_SHEET_CALLS = frozenset(("clearcontents", "pastespecial", "copy", "delete", "insert", "autofit"))
+_CONSTANTS   = ("xl", "vb", "mso")
+
+# source-text views of the shapes above (run on the comment-blanked line)
+_FOR_TEXT   = re.compile(r"\s*For\s+(\w+)\s*=\s*(.+?)\s+To\s+(.+?)(?:\s+Step\s+1)?$", re.I)
+_CELLS_TEXT = re.compile(r"(\s*)(?:(\w+)\s*\.\s*)?Cells\s*\(\s*(\w+)\s*,\s*(\w+)\s*\)"
+                         r"(?:\s*\.\s*Value2?\b)?(?=\s*=)", re.I)
+_EOF_TEXT   = re.compile(r"\b(?:Not|Until)\s+(\w+)\s*\.\s*EOF\b", re.I)
+_EXIT_SUB   = re.compile(r"\bExit\s+Sub\b", re.I)
+
+# ----------------------------------------------------------------
+# Token-level shape checks
+# ----------------------------------------------------------------
+def _matching(st, i):
+    """Index of the ")" closing the "(" at st[i], or -1."""
+    depth = 0
+    for j in range(i, len(st)):
+        if st[j] == "(":
+            depth += 1
+        elif st[j] == ")":
+            depth -= 1
+            if depth == 0:
+                return j
+    return -1
+
+def _top_eq(st):
+    """Index of the first "=" outside parentheses, or -1."""
+    depth = 0
+    for i, t in enumerate(st):
+        if t == "(":
+            depth += 1
+        elif t == ")":
+            depth -= 1
+        elif t == "=" and depth == 0:
+            return i
+    return -1
+
+def _for(st):
+    """(var, low, high) tokens of ``For v = low To high [Step 1]``, else None."""
+    if len(st) < 5 or st[0] != "for" or st[2] != "=" or "to" not in st or not is_name(st[1]):
+        return None
+    to   = st.index("to")
+    high = st[to + 1:]
+    if "step" in high:
+        s = high.index("step")
+        if high[s + 1:] != ["1"]:
+            return None
+        high = high[:s]
+    return st[1], st[3:to], high
+
+def _closes(st, *names):
+    """``Next`` closing the loops over ``names`` (innermost first); a bare Next closes one."""
+    if st[0] != "next":
+        return False
+    rest = st[1:]
+    if not rest:
+        return len(names) == 1
+    return rest[0::2] == list(names) and all(t == "," for t in rest[1::2])
+
+def _cells_write(st):
+    """(qualifier, row, col, value tokens) for ``[q.]Cells(r, c)[.Value|.Value2] = v``.
+
+    None when the statement is not a Cells value write; a string reason when
+    it is one that cannot be buffered.
+    """
+    i = 0
+    if st[0] == "." and st[1:2] == ["cells"]:
+        return "target is qualified by a With block"
+    if len(st) > 2 and st[1] == "." and st[2] == "cells" and is_name(st[0]):
+        i = 2
+    if st[i] != "cells" or st[i + 1:i + 2] != ["("]:
+        return None
+    close = _matching(st, i + 1)
+    if close < 0:
+        return None
+    j = close + 1
+    if st[j:j + 1] == ["."]:
+        if st[j + 1:j + 2] not in (["value"], ["value2"]):
+            return None
+        j += 2
+    if st[j:j + 1] != ["="]:
+        return None
+    args = st[i + 2:close]
+    if len(args) != 3 or args[1] != ",":
+        return "Cells index is not a plain variable or number"
+    return (st[0] if i else None), args[0], args[2], st[j + 1:]
+
+def _bound(tokens, known):
+    """Side-effect-free loop bound: numbers, declared variables and + - * ( )."""
+    for k, t in enumerate(tokens):
+        nxt = tokens[k + 1] if k + 1 < len(tokens) else ""
+        if not (_NUMBER.match(t) or t in _BOUND_OPS or t in known and nxt not in ("(", ".")):
+            return False
+    return bool(tokens)
+
+def _pure(tokens, known):
+    """Expression that neither reads the sheet nor calls a procedure."""
+    for k, t in enumerate(tokens):
+        nxt = tokens[k + 1] if k + 1 < len(tokens) else ""
+        if t[0] in '"0123456789' or t[0] in ".&" and len(t) > 1 or t in _OPERATORS or t in _EXPR_WORDS:
+            continue
+        if t in PURE and (nxt == "(" or t in _NILADIC):
+            continue
+        if t in known and nxt != ".":
+            continue
+        return False
+    return True
+
+def _eof_loop(st):
+    """Recordset name of ``Do While Not rs.EOF`` / ``Do Until rs.EOF`` / ``While Not rs.EOF``."""
+    if len(st) == 6 and st[:3] == ["do", "while", "not"] and st[4:] == [".", "eof"]:
+        rs = st[3]
+    elif len(st) == 5 and st[:2] in (["do", "until"], ["while", "not"]) and st[3:] == [".", "eof"]:
+        rs = st[2]
+    else:
+        return None
+    return rs if is_name(rs) else None
+
+def _field_reads(st, rs):
+    """Number of ``rs(n)`` / ``rs.Fields(n)[.Value]`` reads, or a reason when rs is used otherwise."""
+    n, i = 0, 0
+    while i < len(st):
+        if st[i] != rs:
+            i += 1
+            continue
+        if i and st[i - 1] == ".":
+            return f"a member named {rs} is used in the loop"
+        j = i + 1
+        if st[j:j + 2] == [".", "fields"]:
+            j += 2
+        if not (st[j:j + 1] == ["("] and j + 2 < len(st) and _NUMBER.match(st[j + 1]) and st[j + 2] == ")"):
+            return f"{rs} is used other than by field ordinal"
+        j += 3
+        if st[j:j + 2] == [".", "value"]:
+            j += 2
+        elif not (i and (st[i - 1] in _OPERATORS and st[i - 1] not in ("(", ",") or st[i - 1] in _EXPR_WORDS)):
+            return "a field is passed as an object (read .Value to rewrite it)"
+        n += 1
+        i = j
+    return n
+
+def _writes_sheet(st):
+    """Assignment to a cell/range property, or a range method that changes the sheet."""
+    if any(t in _SHEET_CALLS for t in st):
+        return True
+    if st[0] != "." and not is_name(st[0]):
+        return False
+    eq = _top_eq(st)
+    return eq > 0 and any(t in SHEET_WRITES for t in st[:eq])
+
+def _reads_sheet(st):
+    if st[0] in ("set", "let"):
+        st = st[1:]
+    if st and (st[0] == "." or st[0] == "for" or is_name(st[0])):
+        st = st[_top_eq(st) + 1:]
+    return any(t in SHEET_READS for t in st)
+
+def _calls(st, known):
+    """True when the statement may run another procedure."""
+    prev = ""
+    for t in st:
+        if t == "call" or (is_name(t) and prev not in (".", "as", "new", "goto") and t not in known
+                           and t not in BUILTINS and not t.startswith(_CONSTANTS)):
+            return True
+        prev = t
+    return False
+
+def _p(text):
+    return text if re.fullmatch(r"[\w.]+", text) else f"({text})"
+
+def _size(lo, hi):
+    if _NUMBER.match(lo) and _NUMBER.match(hi):
+        return str(int(hi) - int(lo) + 1)
+    return hi if lo == "1" else f"{_p(hi)} - {_p(lo)} + 1"
+
+def _offset(var, lo):
+    if _NUMBER.match(lo):
+        d = 1 - int(lo)
+        return var if d == 0 else f"{var} + {d}" if d > 0 else f"{var} - {-d}"
+    return f"{var} - {_p(lo)} + 1"
+
+# ----------------------------------------------------------------
+# One module: lines, lexer view, queued edits and the report
+# ----------------------------------------------------------------
+class _Module:
+    def __init__(self, text):
+        self.lx     = lex(text)
+        self.lines  = text.split("\n")
+        self.used   = {t for t in self.lx.tokens if t[:1].isalpha()}
+        self.count  = Counter(line for line, _ in self.lx.statements)
+        self.edits  = []           # (start, end, new lines) over 0-based physical lines
+        self.report = []
+        self.shared = set()
+        for _, st in self.lx.outside:
+            if st[0] in DECLARE or st[0] in SCOPES:
+                self.shared.update(declared(st))
+
+    # --- lines -----------------------------------------------------
+    def continued(self, n):
+        """Physical line ``n`` (1-based) ends in a ``_`` continuation."""
+        starts = self.lx.line_starts
+        return 0 < n < len(starts) and self.lx.code[starts[n] - 1] == "\x0b"
+
+    def simple(self, n):
+        """Line ``n`` holds exactly one statement and is not part of a continued one."""
+        return self.count[n] == 1 and not self.continued(n) and not self.continued(n - 1)
+
+    def code_line(self, n):
+        """Line ``n`` of the comment-blanked view (same offsets as the text), right-stripped."""
+        starts = self.lx.line_starts
+        end    = starts[n] - 1 if n < len(starts) else len(self.lx.code)
+        return self.lx.code[starts[n - 1]:end].rstrip()
+
+    def indent(self, n):
+        line = self.lines[n - 1]
+        return line[:len(line) - len(line.lstrip())]
+
+    def fresh(self, base):
+        """A name not used anywhere in the module."""
+        name, n = base, 1
+        while name.lower() in self.used:
+            n += 1
+            name = f"{base}{n}"
+        self.used.add(name.lower())
+        return name
+
+    def known(self, proc):
+        """Declared variables visible in ``proc``: module-level, parameters, Dim/Static/Const."""
+        names = self.shared.union(proc.params)
+        for _, st in proc.body:
+            if st[0] in DECLARE:
+                names.update(declared(st))
+        return names
+
+    # --- edits -----------------------------------------------------
+    def fits(self, edits):
+        for s, e, _ in edits:
+            for s2, e2, _ in self.edits:
+                if max(s, s2) < min(e, e2) or s == e and s2 < s < e2 or s2 == e2 and s < s2 < e:
+                    return False
+        return True
+
+    def apply(self):
+        out = list(self.lines)
+        for s, e, new in sorted(self.edits, key=lambda x: (x[0], x[1]), reverse=True):
+            out[s:e] = new
+        return "\n".join(out)
+
+    def note(self, transform, proc, line, applied, text):
+        self.report.append({"transform": transform, "proc": proc.name, "line": line,
+                            "applied": applied, ("detail" if applied else "reason"): text})
+
+    # --- buffer-cells ----------------------------------------------
+    def buffer_cells(self, proc, known):
+        """Buffer Cells writes in simple For loops; returns the lines rewritten."""
+        done, reasons = set(), {}
+        for k, (line, st) in enumerate(proc.body):
+            if st[0] != "for" or line in done:
+                continue
+            res = self._buffer_at(proc.body, k, known)
+            if res is None:
+                continue
+            wline, outcome = res
+            if isinstance(outcome, str):
+                reasons[wline] = outcome            # the innermost attempt wins
+            else:
+                done.update(outcome)
+                self.note("buffer-cells", proc, line, True,
+                          "Cells writes collected in an array and written to the range at once")
+        for line, st, loops, _ in nest(proc.body):
+            if loops and line not in done and _cells_write(st) is not None:
+                self.note("buffer-cells", proc, line, False,
+                          reasons.get(line, "not the only statement of one or two nested For loops"))
+        return done
+
+    def _buffer_at(self, body, k, known):
+        loops, w = [_for(body[k][1])], k + 1
+        if loops[0] is None:
+            return None
+        if w < len(body) and _for(body[w][1]):
+            loops.append(_for(body[w][1]))
+            w += 1
+        if w >= len(body):
+            return None
+        wline, wst = body[w]
+        target = _cells_write(wst)
+        if target is None:
+            return None
+        if isinstance(target, str):
+            return wline, target
+
+        names = [v for v, _, _ in loops]
+        rest  = body[w + 1:w + 1 + len(loops)]
+        if rest and _closes(rest[0][1], *reversed(names)):
+            close = rest[:1]
+        elif len(rest) == len(loops) and all(_closes(st, v) for (_, st), v in zip(rest, reversed(names))):
+            close = rest
+        else:
+            return wline, "not the only statement of one or two nested For loops"
+
+        qual, row, col, value = target
+        if len(loops) == 2:
+            if {row, col} != set(names):
+                return wline, "Cells indexes are not the two loop variables"
+        else:
+            if (row, col).count(names[0]) != 1:
+                return wline, "Cells index does not use the loop variable"
+            fixed = col if row == names[0] else row
+            if not (_NUMBER.match(fixed) or fixed in known):
+                return wline, "fixed Cells index is not a declared variable or number"
+        outside = known - set(names)
+        if not all(_bound(b, outside) for _, lo, hi in loops for b in (lo, hi)):
+            return wline, "loop bounds are not numbers or declared variables independent of the loops"
+        if not _pure(value, known):
+            return wline, "value may read the sheet or call a procedure"
+        if qual and qual not in known and qual != "activesheet":
+            return wline, "Cells qualifier is not a declared worksheet variable"
+        lines = [l for l, _ in body[k:w]] + [wline] + [l for l, _ in close]
+        if not all(self.simple(l) for l in lines):
+            return wline, "loop shares its lines with other statements"
+
+        fors = [_FOR_TEXT.match(self.code_line(l)) for l in lines[:len(loops)]]
+        wm   = _CELLS_TEXT.match(self.code_line(wline))
+        if not all(fors) or not wm:
+            return wline, "could not map the loop back to its source text"
+        bounds = {m.group(1).lower(): (m.group(2), m.group(3)) for m in fors}
+        if any(_NUMBER.match(lo) and _NUMBER.match(hi) and int(hi) < int(lo) for lo, hi in bounds.values()):
+            return wline, "loop never runs"
+
+        def dim(text):
+            if text.lower() in bounds:
+                lo, hi = bounds[text.lower()]
+                return _size(lo, hi), _offset(text, lo), lo, hi
+            return "1", "1", text, text
+
+        buf   = self.fresh("cellBuf")
+        rows, ri, r1, r2 = dim(wm.group(3))
+        cols, ci, c1, c2 = dim(wm.group(4))
+        guard = " And ".join(f"{_p(hi)} >= {_p(lo)}" for lo, hi in bounds.values()
+                             if not (_NUMBER.match(lo) and _NUMBER.match(hi)))
+        iff   = f"If {guard} Then " if guard else ""
+        q     = f"{wm.group(2)}." if wm.group(2) else ""
+        prop  = "Value2" if re.search(r"Value2\s*$", wm.group(0), re.I) else "Value"
+        text  = self.lines[wline - 1]
+        ind   = self.indent(lines[0])
+        new   = [f"{ind}Dim {buf} As Variant", f"{ind}{iff}ReDim {buf}(1 To {rows}, 1 To {cols})"]
+        for l in range(lines[0], lines[-1] + 1):
+            new.append(text[:wm.end(1)] + f"{buf}({ri}, {ci})" + text[wm.end():] if l == wline
+                       else self.lines[l - 1])
+        new.append(f"{ind}{iff}{q}Range({q}Cells({r1}, {c1}), {q}Cells({r2}, {c2})).{prop} = {buf}")
+
+        edit = (lines[0] - 1, lines[-1], new)
+        if not self.fits([edit]):
+            return wline, "overlaps another rewrite"
+        self.edits.append(edit)
+        return wline, set(range(lines[0], lines[-1] + 1))
+
+    # --- getrows ---------------------------------------------------
+    def getrows(self, proc):
+        for k, (line, st) in enumerate(proc.body):
+            rs = _eof_loop(st)
+            if rs is not None:
+                reason = self._getrows_at(proc.body, k, rs)
+                self.note("getrows", proc, line, reason is None,
+                          reason or "recordset loop reads one GetRows array instead of moving row by row")
+
+    def _getrows_at(self, body, k, rs):
+        closer, depth, m = ("wend" if body[k][1][0] == "while" else "loop"), 0, None
+        for j in range(k + 1, len(body)):
+            head = body[j][1][0]
+            if head in LOOP_OPEN:
+                depth += 1
+            elif head in ("next", "loop", "wend"):
+                if depth == 0:
+                    m = j
+                    break
+                depth -= body[j][1].count(",") + 1 if head == "next" else 1
+        if m is None or body[m][1] != [closer]:
+            return "loop is unterminated or tests a condition at its end"
+        inner = body[k + 1:m]
+        if not inner or inner[-1][1] != [rs, ".", "movenext"]:
+            return f"loop does not end with {rs}.MoveNext"
+        reads = 0
+        for _, st in inner[:-1]:
+            if st[0] in ("exit", "goto", "gosub", "resume", "return", "stop") or st == ["end"]:
+                return "loop body can leave the loop early"
+            n = _field_reads(st, rs)
+            if isinstance(n, str):
+                return n
+            reads += n
+        if not reads:
+            return "loop reads no fields"
+        first, move, last = body[k][0], inner[-1][0], body[m][0]
+        if not all(self.simple(l) for l in (first, move, last)):
+            return "loop header or MoveNext shares its line with other statements"
+
+        hm = _EOF_TEXT.search(self.code_line(first))
+        if not hm:
+            return "could not map the loop back to its source text"
+        rs_t   = hm.group(1)
+        rows   = self.fresh(f"{rs_t}Rows")
+        row    = self.fresh(f"{rs_t}Row")
+        field  = re.compile(rf"(?<![.\w]){re.escape(rs)}\s*(?:\.\s*Fields\s*)?\(\s*(\d+)\s*\)(?:\s*\.\s*Value\b)?", re.I)
+        starts = self.lx.line_starts
+        ind    = self.indent(first)
+        new    = [f"{ind}Dim {rows} As Variant, {row} As Long",
+                  f"{ind}If Not {rs_t}.EOF Then",
+                  f"{ind}    {rows} = {rs_t}.GetRows()",
+                  f"{ind}    For {row} = 0 To UBound({rows}, 2)"]
+        found  = 0
+        for l in range(first + 1, last):
+            if l == move:
+                continue
+            text, out, pos = self.lines[l - 1], [], 0
+            for fm in field.finditer(self.code_line(l)):
+                if self.lx.in_string(starts[l - 1] + fm.start()):
+                    continue
+                out += [text[pos:fm.start()], f"{rows}({fm.group(1)}, {row})"]
+                pos  = fm.end()
+                found += 1
+            text = "".join(out) + text[pos:]
+            new.append("    " + text if text.strip() else text)
+        new += [f"{ind}    Next {row}", f"{ind}End If"]
+        if found != reads:
+            return "could not map every field read back to its source text"
+
+        edit = (first - 1, last, new)
+        if not self.fits([edit]):
+            return "overlaps another rewrite"
+        self.edits.append(edit)
+        return None
+
+    # --- app-guard -------------------------------------------------
+    def app_guard(self, proc, known, buffered):
+        trigger = False
+        for line, st, loops, _ in nest(proc.body):
+            if loops and line not in buffered and _writes_sheet(st) or "selection" in st \
+                    or "select" in st and st[st.index("select") - 1] == ".":
+                trigger = True
+                break
+        if not trigger:
+            return
+        reason = self._guard(proc, known)
+        if reason:
+            self.note("app-guard", proc, proc.line, False, reason)
+
+    def _guard(self, proc, known):
+        if proc.kind != "Sub":
+            return "Functions and Properties may run from worksheet formulas"
+        body = [st for _, st in proc.body]
+        if any("screenupdating" in st or "calculation" in st for st in body):
+            return "procedure already sets ScreenUpdating or Calculation"
+        if any(st[:2] == ["on", "error"] or st[0] == "resume" for st in body):
+            return "procedure has its own error handling"
+        if any(st == ["end"] or st[0] == "stop" for st in body):
+            return "procedure can halt with End or Stop"
+        end = proc.end_line
+        if self.count[proc.line] != 1 or not self.simple(end) or \
+                not re.match(r"\s*End\s+Sub\b", self.code_line(end), re.I):
+            return "procedure header or End Sub shares its line with other statements"
+
+        head = proc.line
+        while self.continued(head):
+            head += 1
+        for line, st in proc.body:                  # after the leading declarations
+            if st[0] not in DECLARE or not self.simple(line):
+                break
+            head = line
+        calc   = not any(_reads_sheet(st) or _calls(st, known) for st in body if st[0] not in DECLARE)
+        label  = self.fresh("RestoreApp")
+        screen = self.fresh("prevScreenUpdating")
+        calc_v = self.fresh("prevCalculation") if calc else None
+        ind    = self.indent(proc.body[0][0]) if proc.body else "    "
+
+        starts, exits = self.lx.line_starts, []
+        for l in range(head + 1, end):
+            text, out, pos = self.lines[l - 1], [], 0
+            for em in _EXIT_SUB.finditer(self.code_line(l)):
+                if not self.lx.in_string(starts[l - 1] + em.start()):
+                    out += [text[pos:em.start()], f"GoTo {label}"]
+                    pos  = em.end()
+            if out:
+                exits.append((l - 1, l, ["".join(out) + text[pos:]]))
+
+        top = [f"{ind}Dim {screen} As Boolean" + (f", {calc_v} As Long" if calc else ""),
+               f"{ind}{screen} = Application.ScreenUpdating"]
+        if calc:
+            top.append(f"{ind}{calc_v} = Application.Calculation")
+        top += [f"{ind}On Error GoTo {label}", f"{ind}Application.ScreenUpdating = False"]
+        if calc:
+            top.append(f"{ind}Application.Calculation = xlCalculationManual")
+        bottom = [f"{label}:"]
+        if calc:
+            bottom.append(f"{ind}Application.Calculation = {calc_v}")
+        bottom += [f"{ind}Application.ScreenUpdating = {screen}",
+                   f"{ind}If Err.Number <> 0 Then Err.Raise Err.Number, Err.Source, Err.Description"]
+        edits = [(head, head, top), (end - 1, end - 1, bottom)] + exits
+        if not self.fits(edits):
+            return "overlaps another rewrite"
+        self.edits += edits
+        self.note("app-guard", proc, proc.line, True,
+                  ("ScreenUpdating off and Calculation manual" if calc else
+                   "ScreenUpdating off (Calculation left automatic: the Sub reads the sheet or calls "
+                   "other procedures)") +
+                  f"; restored at {label}" + (f", {len(exits)} Exit Sub rerouted there" if exits else ""))
+        return None
+
+# ----------------------------------------------------------------
+# Entry point
+# ----------------------------------------------------------------
+def optimize(code, name="Module"):
+    """Rewrite one module; returns {optimizedCode, diff, rewrites}."""
+    import difflib
+    text = "\n".join(code.splitlines())
+    mod  = _Module(text)
+    for proc in mod.lx.procedures:
+        known    = mod.known(proc)
+        buffered = mod.buffer_cells(proc, known)
+        mod.getrows(proc)
+        mod.app_guard(proc, known, buffered)
+    new  = mod.apply()
+    diff = "\n".join(difflib.unified_diff(text.split("\n"), new.split("\n"),
+                                          f"a/{name}", f"b/{name}", lineterm=""))
+    if code.endswith(("\n", "\r")):
+        new += "\n"
+    return {"optimizedCode": new, "diff": diff, "rewrites": mod.report}
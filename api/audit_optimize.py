@@ -1,142 +1,599 @@
 from http.server import BaseHTTPRequestHandler
-import json, re, textwrap
+import os, json, re
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import chain
+from urllib.parse import urlsplit, parse_qs
+
+from _cache import content_hash
+from _lexer import LEXER_VERSION, lex, nest
+from _metrics import instrumented, span
+from _http import not_modified, request_key, send_cached, send_json, send_ndjson
+# _rewrite, _ovba and (POST only) _archive are imported where they are used: cold start
 
 # ----------------------------------------------------------------
-# 1) LINT RULES  (regex → message & fix)
+# 1) LINT RULES  (regex → message & fix; cost = relative weight of one execution)
 # ----------------------------------------------------------------
 RULES = [
     # implicit variable (Option Explicit missing OR undeclared dim)
     {
         "pattern": r"\bFor\s+(\w+)\s*=",
         "message": "Loop variable '{0}' is implicit. Add Dim {0} As Long.",
-        "fix": "Add “Option Explicit” and declare variables."
+        "fix": "Add “Option Explicit” and declare variables.",
+        "cost": 1
     },
     {
         "pattern": r"\bCells?\(.+?\)\s*=",
         "message": "Cell‑by‑cell write. Buffer Range to Variant.",
-        "fix": "Read Range.Value2 to Variant, process in memory, write back once."
+        "fix": "Read Range.Value2 to Variant, process in memory, write back once.",
+        "cost": 10
     },
     {
         "pattern": r"\.Select\b|\bSelection\.",
         "message": "Use of .Select / Selection slows code.",
-        "fix": "Work directly with Range objects (e.g. ws.Range(…))."
+        "fix": "Work directly with Range objects (e.g. ws.Range(…)).",
+        "cost": 20
     },
     {
         "pattern": r"Application\.ScreenUpdating\s*=\s*True",
         "message": "ScreenUpdating turned on mid‑macro.",
-        "fix": "Only re‑enable at the very end."
+        "fix": "Only re‑enable at the very end.",
+        "cost": 5
     },
     {
         "pattern": r"On\s+Error\s+Resume\s+Next",
         "message": "Blind error suppression.",
-        "fix": "Use structured handler or test Err.Number."
+        "fix": "Use structured handler or test Err.Number.",
+        "cost": 0
     },
     {
         "pattern": r"\bDo\s+While\s+Not\s+(.+?)\.EOF",
         "message": "DAO/ADODB recordset loop; consider GetRows for speed.",
-        "fix": "Use rs.GetRows to bulk‑load to array."
+        "fix": "Use rs.GetRows to bulk‑load to array.",
+        "cost": 50
     },
     {
         "pattern": r"\bApplication\.Calculate\b",
         "message": "Full recalculation call; consider CalculateFullRebuild only if necessary.",
-        "fix": "Limit to affected Range.Calculate where possible."
+        "fix": "Limit to affected Range.Calculate where possible.",
+        "cost": 100
     },
     {
         "pattern": r"ActiveWorkbook\.Save",
         "message": "Saving workbook mid‑macro can freeze UI.",
-        "fix": "Buffer changes; save once at end or use AutoSave off‑peak."
+        "fix": "Buffer changes; save once at end or use AutoSave off‑peak.",
+        "cost": 200
     },
     {
         "pattern": r"DoEvents\(\)",
         "message": "Frequent DoEvents in tight loops slows performance.",
-        "fix": "Throttle with counter, or remove when batch processing."
+        "fix": "Throttle with counter, or remove when batch processing.",
+        "cost": 20
     },
     {
         "pattern": r"\bVariant\b\s*=",
         "message": "Variant used explicitly; specify concrete type for speed.",
-        "fix": "Use Long, Double, String, etc."
+        "fix": "Use Long, Double, String, etc.",
+        "cost": 1
     },
     {
         "pattern": r"\bWorksheetFunction\.([A-Za-z]+)\(",
         "message": "WorksheetFunction call in loops is slow.",
-        "fix": "Port math into VBA or call once on whole range."
+        "fix": "Port math into VBA or call once on whole range.",
+        "cost": 10
     },
     {
         "pattern": r"\bVLookup\(",
         "message": "VLookup in VBA loops is slow.",
-        "fix": "Use Dictionary or INDEX/MATCH on entire arrays."
+        "fix": "Use Dictionary or INDEX/MATCH on entire arrays.",
+        "cost": 30
     },
     {
         "pattern": r"^\s*Public\s+",
         "flags": re.MULTILINE,
         "message": "Public scope—review necessity; many modules don’t need it.",
-        "fix": "Change to Private unless accessed externally."
+        "fix": "Change to Private unless accessed externally.",
+        "cost": 0
     },
     {
         "pattern": r"CreateObject\(\"Scripting\.Dictionary\"",
         "message": "Dictionary created late‑bound—use early binding.",
-        "fix": "Add reference 'Microsoft Scripting Runtime' and use New Scripting.Dictionary."
+        "fix": "Add reference 'Microsoft Scripting Runtime' and use New Scripting.Dictionary.",
+        "cost": 2
     }
 ]
 
 # ----------------------------------------------------------------
-# 2) Handler
+# 2) Rule engine  (all RULES → one compiled scanner, built at import)
+# ----------------------------------------------------------------
+_PATTERN_TOKEN = re.compile(r"\\.|\[\^?\]?(?:\\.|[^\]\\])*\]|\{\d*,?\d*\}\??|[*+?]\??|\(\?P?<?[\w=!:]*>?|.", re.S)
+_QUANTIFIER    = re.compile(r"[*+?]|\{")
+
+def _line_scoped(pattern):
+    """``pattern`` with every ``\\s`` pinned to the line (``[^\\S\\n]``).
+
+    Only escapes outside character classes are rewritten; ``\\s`` inside a
+    class cannot be narrowed in place, so it is rejected.
+    """
+    out = []
+    for tok in _PATTERN_TOKEN.findall(pattern):
+        if tok.startswith("[") and r"\s" in re.findall(r"\\.", tok):
+            raise ValueError(f"Rule pattern {pattern!r}: write [^\\S\\n] instead of \\s inside a character class")
+        out.append(r"[^\S\n]" if tok == r"\s" else tok)
+    return "".join(out)
+
+def _alternatives(pattern):
+    """Top-level alternatives of ``pattern`` as [(token, quantifier)]; a group is one "(" token."""
+    toks  = _PATTERN_TOKEN.findall(pattern)
+    alts  = [[]]
+    depth = 0
+    for i, tok in enumerate(toks):
+        if tok == ")":
+            depth -= 1
+        elif not depth and tok == "|":
+            alts.append([])
+        elif not depth and not _QUANTIFIER.match(tok):
+            quant = toks[i + 1] if i + 1 < len(toks) and _QUANTIFIER.match(toks[i + 1]) else ""
+            alts[-1].append((tok, quant))
+        depth += tok.startswith("(")
+    return alts
+
+def _literal(tok):
+    """The character a token matches literally, else None."""
+    if len(tok) == 2 and tok[0] == "\\" and not tok[1].isalnum():
+        return tok[1]
+    return tok if len(tok) == 1 and tok not in ".^$(" else None
+
+def _optional(quant):
+    return quant[:1] in ("?", "*") or quant.startswith(("{0", "{,"))
+
+def _anchors(pattern, alts=None):
+    """Longest literal every match of each top-level alternative must contain."""
+    anchors = []
+    for alt in alts or _alternatives(pattern):
+        runs = [""]
+        for tok, quant in alt:
+            char = _literal(tok)
+            if char and not _optional(quant):
+                runs[-1] += char
+            if quant or not char:
+                runs.append("")
+        anchors.append(max(runs, key=len))
+    if not all(anchors):
+        raise ValueError(f"Rule pattern {pattern!r} has no literal anchor")
+    return anchors
+
+def _heads(pattern, alts=None):
+    """Characters a match can start with ("^" for a line start), or None when unknown."""
+    heads = set()
+    for alt in alts or _alternatives(pattern):
+        tok, quant = next(((t, q) for t, q in alt if t not in (r"\b", r"\B")), ("", ""))
+        char = _literal(tok)
+        if tok == "^":
+            heads.add("^")
+        elif char and not _optional(quant):
+            heads.update((char.lower(), char.upper()))
+        else:
+            return None
+    return heads
+
+class RuleEngine:
+    """Single-pass scanner reporting every rule hit on every line.
+
+    Each rule becomes an optional lookahead, so several rules starting at the
+    same offset are all captured; a leading gate keeps the scan in C for
+    offsets where nothing matches.  Rules are line-scoped, so ``\\s`` may not
+    cross a newline once the whole module is scanned at once.
+
+    The gate is still tried at every offset, so a case-insensitive search
+    for the rules' literal anchors (``For``, ``Cell``, ``.Select`` …) first
+    picks out the lines where a rule can match at all, and only runs of
+    those lines are scanned.
+
+    The scan runs on the lexer's code view: comments are blanked, ``_``
+    continuations join their lines, and hits starting inside a string
+    literal are dropped (a rule may still read a literal it starts before,
+    e.g. ``CreateObject("Scripting.Dictionary")``).
+    """
+
+    def __init__(self, rules):
+        self.rules  = rules
+        flags       = re.MULTILINE
+        pats        = []
+        anchors     = set()
+        heads       = set()
+        for rule in rules:
+            flags |= rule.get("flags", 0)
+            pats.append(_line_scoped(rule["pattern"]))
+            alts   = _alternatives(rule["pattern"])
+            anchors.update(_anchors(rule["pattern"], alts))
+            head   = _heads(rule["pattern"], alts)
+            heads  = None if heads is None or head is None else heads | head
+        guard = ""
+        if heads:
+            chars = "".join(re.escape(c) for c in sorted(heads - {"^"}))
+            guard = f"(?=[{chars}]" + ("|^)" if "^" in heads else ")")
+        gate  = "|".join(f"(?:{p})" for p in pats)
+        tails = "".join(f"(?:(?=(?P<r{i}>{p})))?" for i, p in enumerate(pats))
+        self.regex  = re.compile(f"{guard}(?={gate}){tails}", flags)
+        anchor      = "|".join(re.escape(a.lower()) for a in sorted(anchors))
+        self.anchor = re.compile(anchor)           # searched in the lowercased code
+        # (group index of the wrapper, number of inner groups) per rule; the
+        # wrappers are numbered in order, so the gaps give the inner counts
+        # without compiling every rule a second time
+        index       = self.regex.groupindex
+        bounds      = [index[f"r{i}"] for i in range(len(pats))] + [self.regex.groups + 1]
+        self._slots = [(g, bounds[i + 1] - g - 1) for i, g in enumerate(bounds[:-1])]
+
+    def _spans(self, code):
+        """(start, end) of each run of consecutive lines holding an anchor."""
+        low = code.lower()
+        if len(low) == len(code):                   # lower() never shrinks, so 1:1
+            code, anchor = low, self.anchor
+        else:                                       # lowercasing would shift offsets
+            anchor = re.compile(self.anchor.pattern, re.I)
+        start = end = None
+        m = anchor.search(code)
+        while m:
+            lo = code.rfind("\n", 0, m.start()) + 1
+            hi = code.find("\n", m.end())
+            hi = len(code) if hi == -1 else hi
+            if end is not None and lo > end + 1:
+                yield start, end
+                start = None
+            if start is None:
+                start = lo
+            end = hi
+            m   = anchor.search(code, hi)
+        if start is not None:
+            yield start, end
+
+    def scan(self, lexed):
+        """Yield (line_no, rule, groups) for every hit, ordered by line then rule."""
+        hits = {}
+        code = lexed.code
+        for start, end in self._spans(code):
+            for m in self.regex.finditer(code, start, end):
+                if lexed.in_string(m.start()):
+                    continue
+                ln     = lexed.line_of(m.start())
+                groups = m.groups()
+                for idx, (g, n) in enumerate(self._slots):
+                    if groups[g-1] is not None and (ln, idx) not in hits:
+                        hits[(ln, idx)] = groups[g : g + n]
+        for ln, idx in sorted(hits):
+            yield ln, self.rules[idx], hits[(ln, idx)]
+
+
+ENGINE        = RuleEngine(RULES)
+RULES_VERSION = content_hash(LEXER_VERSION, json.dumps(RULES, sort_keys=True, default=str))
+
+# ----------------------------------------------------------------
+# 3) Audit one module
+# ----------------------------------------------------------------
+def audit(code, annotate=True, trace=None, extra=None):
+    """Run every rule over one module; returns the response dict.
+
+    ``trace`` is the handler whose request collects the timing spans;
+    ``extra(line, rule)`` returns fields to merge into each finding.
+    """
+    lines   = code.splitlines()
+    issues  = []
+
+    # run rules (one pass, every hit on every line)
+    with span(trace, "rules"):
+        for ln, rule, groups in ENGINE.scan(lex("\n".join(lines))):
+            msg = rule["message"].format(*groups)
+            issues.append({
+                "line": ln,
+                "message": msg,
+                "suggestion": rule["fix"],
+                **(extra(ln, rule) if extra else {})
+            })
+            if annotate:
+                lines[_statement_end(lines, ln - 1)] += f"    ' 🔍 ISSUE: {msg}"
+
+    # build checklist (top 5 unique suggestions)
+    checklist = []
+    seen_fix  = set()
+    for iss in issues:
+        if iss["suggestion"] and iss["suggestion"] not in seen_fix:
+            checklist.append("• " + iss["suggestion"])
+            seen_fix.add(iss["suggestion"])
+        if len(checklist) >= 5:
+            break
+
+    out = {
+        "findings": issues,
+        "todo": checklist or ["Looks solid! No common issues found."]
+    }
+    if annotate:
+        with span(trace, "annotate"):
+            out = {"annotatedCode": "\n".join(lines), **out}
+    return out
+
+def _statement_end(lines, i):
+    """Last physical line of the statement starting at lines[i] (after any `` _`` continuations)."""
+    while i + 1 < len(lines) and lines[i].rstrip().endswith((" _", "\t_")):
+        i += 1
+    return i
+
+def _truthy(v):
+    return str(v).lower() not in ("0", "false", "no", "off")
+
 # ----------------------------------------------------------------
+# 4) Loop-aware cost model  (analysis=cost)
+# ----------------------------------------------------------------
+LOOP_TRIPS  = int(os.environ.get("VBA_LOOP_TRIPS", 100))   # assumed iterations when bounds are unknown
+MAX_TRIPS   = 10 ** 6
+MAX_CALLS   = 10 ** 12
+WITH_FACTOR = 0.8        # member access inside With reuses the resolved object
+
+def _number(toks):
+    """Value of a literal such as ['10'] or ['-', '1'], else None."""
+    sign = 1
+    if len(toks) == 2 and toks[0] == "-":
+        sign, toks = -1, toks[1:]
+    if len(toks) != 1:
+        return None
+    try:
+        return sign * float(toks[0].rstrip("#!@&%^"))
+    except ValueError:
+        return None
+
+def trips(header):
+    """Estimated iterations of a loop from its header tokens (literal For bounds, else LOOP_TRIPS)."""
+    if header[0] == "for" and "=" in header and "to" in header:
+        eq, to = header.index("="), header.index("to")
+        rest   = header[to + 1:]
+        step   = rest.index("step") if "step" in rest else len(rest)
+        lo, hi = _number(header[eq + 1:to]), _number(rest[:step])
+        inc    = _number(rest[step + 1:]) if step < len(rest) else 1
+        if None not in (lo, hi, inc) and inc:
+            return int(min(max((hi - lo) / inc + 1, 1), MAX_TRIPS))
+    return LOOP_TRIPS
+
+class CostModel:
+    """Relative cost of every finding across a project.
+
+    cost = rule weight × trips of the enclosing loops (× WITH_FACTOR inside a
+    With block) × how often the procedure runs per top-level call.  The
+    last factor comes from flow_analyzer's call graph: a call site nested
+    ``d`` loops deep multiplies the callee by LOOP_TRIPS ** d, propagated
+    callers-first (recursion adds nothing).
+    """
+
+    def __init__(self, modules, trace=None):
+        from flow_analyzer import link, parse_module
+        from _callgraph import CallGraphIndex
+        # one normalised text per module, so audit() and parse_module share the lexer cache
+        self.modules = [(name, "\n".join(code.splitlines())) for name, code in modules]
+        with span(trace, "callgraph"):
+            partials = [parse_module(name, code) for name, code in self.modules]
+            graph, effects, hot, depths = defaultdict(set), defaultdict(set), set(), {}
+            link(partials, graph, effects, hot, depths)
+            index = CallGraphIndex(graph)
+            calls = [1] * len(index.nodes)
+            for members in reversed(index.comps):          # callers before callees
+                for u in members:
+                    for v in index.adj[u]:
+                        if index.comp[v] != index.comp[u]:
+                            m = calls[u] * LOOP_TRIPS ** depths.get((index.nodes[u], index.nodes[v]), 0)
+                            calls[v] = max(calls[v], min(m, MAX_CALLS))
+        self.calls = dict(zip(index.nodes, calls))
+        self.keys  = [p["module"] for p in partials]
+
+    def _statements(self, lx, module):
+        """Sorted statement lines and (proc, loop multiplier, depth, in With) per line."""
+        lines, info = [], []
+        for proc in lx.procedures:
+            node = f"{module}.{proc.name}"
+            lines.append(proc.line)
+            info.append((node, 1, 0, 0))
+            for line, _, loops, withs in nest(proc.body):
+                mult = 1
+                for header in loops:
+                    mult *= trips(header)
+                lines.append(line)
+                info.append((node, mult, len(loops), withs))
+            lines.append(proc.end_line + 1)                # module level again
+            info.append((None, 1, 0, 0))
+        return lines, info
+
+    def audit(self, annotate=True, trace=None):
+        """Yield (name, audit record with costed findings and per-module hotspots)."""
+        for (name, code), module in zip(self.modules, self.keys):
+            lines, info = self._statements(lex(code), module)
+
+            def extra(ln, rule):
+                i = bisect_right(lines, ln) - 1
+                node, mult, depth, withs = info[i] if i >= 0 else (None, 1, 0, 0)
+                cost = rule.get("cost", 1) * mult * (WITH_FACTOR if withs else 1) * self.calls.get(node, 1)
+                return {"proc": node, "loopDepth": depth, "cost": round(cost, 2)}
+
+            rec = audit(code, annotate, trace, extra)
+            rec["hotspots"] = self.rank(rec["findings"])
+            yield name, rec
+
+    def rank(self, findings, top=10, per_proc=5):
+        """Procedures by total finding cost, each with its costliest findings."""
+        procs = {}
+        for f in findings:
+            if f["cost"] and f["proc"]:
+                h = procs.setdefault(f["proc"], {"proc": f["proc"], "cost": 0,
+                                                 "callMultiplier": self.calls.get(f["proc"], 1),
+                                                 "findings": []})
+                h["cost"] += f["cost"]
+                h["findings"].append(f)
+        total  = sum(h["cost"] for h in procs.values()) or 1
+        ranked = sorted(procs.values(), key=lambda h: (-h["cost"], h["proc"]))[:top]
+        for h in ranked:
+            h["share"]    = round(100 * h["cost"] / total, 1)
+            h["cost"]     = round(h["cost"], 2)
+            h["findings"] = [{k: f[k] for k in ("line", "message", "loopDepth", "cost")}
+                             for f in sorted(h["findings"], key=lambda f: (-f["cost"], f["line"]))[:per_proc]]
+        return ranked
+
+# ----------------------------------------------------------------
+# 5) Handler
+# ----------------------------------------------------------------
+def _module_list(modules):
+    """[(name, code)] from a JSON ``modules`` array; ValueError on a malformed entry."""
+    if not isinstance(modules, list) or not modules:
+        raise ValueError("modules must be a non-empty list of {name, code} objects or code strings")
+    out = []
+    for i, m in enumerate(modules, start=1):
+        name, code = (m.get("name", f"module{i}"), m.get("code")) if isinstance(m, dict) else (f"module{i}", m)
+        if not isinstance(code, str) or not isinstance(name, str):
+            raise ValueError(f"modules[{i - 1}] needs a string 'code' (and 'name', if given)")
+        out.append((name, code))
+    return out
+
 class handler(BaseHTTPRequestHandler):
-    def _json(self, obj, status=200):
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(obj, indent=2).encode())
+    def _json(self, obj, status=200, key=None):
+        send_json(self, obj, status, key)
+
+    def _rewrites(self, name, code, rewrite):
+        if not rewrite:
+            return {}
+        from _rewrite import optimize
+        with span(self, "rewrite"):
+            return optimize(code, name)
+
+    def _ndjson(self, modules, annotate, analysis="", rewrite=False):
+        """Stream one compact JSON record per module as each audit finishes.
+
+        The first module (and in cost mode the whole project) is read before
+        the 200 goes out, so archive errors found there get a 413/400; later
+        ones arrive as an {"error"} record.
+        """
+        from _archive import NO_MODULES, ArchiveLimitError
+        from _ovba import OVBAError
+        try:
+            first = next(modules, None)
+            if first is None:
+                return self._json({"error": NO_MODULES}, 400)
+            modules = chain((first,), modules)
+            # cost mode needs the whole project's call graph first; the last
+            # record ranks hotspots across every module
+            model = CostModel(list(modules), self) if analysis == "cost" else None
+        except ArchiveLimitError as exc:
+            return self._json({"error": str(exc)}, 413)
+        except OVBAError as exc:
+            return self._json({"error": f"Invalid vbaProject.bin: {exc}"}, 400)
+
+        def records():
+            if model is None:
+                try:
+                    for name, code in modules:
+                        yield {"module": name, **audit(code, annotate), **self._rewrites(name, code, rewrite)}
+                except (ArchiveLimitError, OVBAError) as exc:
+                    yield {"error": str(exc)}
+                return
+            findings = []
+            for (name, code), (_, rec) in zip(model.modules, model.audit(annotate, self)):
+                findings += rec["findings"]
+                yield {"module": name, **rec, **self._rewrites(name, code, rewrite)}
+            yield {"project": {"hotspots": model.rank(findings)}}
+        send_ndjson(self, records())
+
+    def _archive(self, spool, annotate, analysis, rewrite):
+        """NDJSON batch over a spooled ZIP / workbook."""
+        import zipfile
+        from _archive import ArchiveLimitError, check_zip, iter_modules
+        with spool:
+            try:
+                zf = zipfile.ZipFile(spool)
+            except Exception:
+                return self._json({"error": "Invalid ZIP format"}, 400)
+            try:
+                check_zip(zf)
+            except ArchiveLimitError as exc:
+                return self._json({"error": str(exc)}, 413)
+            return self._ndjson(iter_modules(zf), annotate, analysis, rewrite)
 
     # ---------- POST ----------
+    @instrumented("audit_optimize")
     def do_POST(self):
-        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+        length = int(self.headers.get("Content-Length", 0)) or 0
+        query  = parse_qs(urlsplit(self.path).query)
+        ann    = _truthy(query.get("includeAnnotatedCode", ["1"])[0])
+        mode   = query.get("analysis", [""])[0].lower()
+        rw     = _truthy(query.get("rewrite", ["0"])[0])
+
+        from _archive import LIMITS, ArchiveLimitError, is_zip_upload, spool_base64_text, spool_body
+
+        # --- batch: raw ZIP upload (same layout flow_analyzer accepts)
+        if is_zip_upload(self.headers.get("Content-Type", "").lower()):
+            try:
+                with span(self, "decode"):
+                    spool = spool_body(self.rfile, length)
+            except ArchiveLimitError as exc:
+                return self._json({"error": str(exc)}, 413)
+            return self._archive(spool, ann, mode, rw)
+
+        if length > LIMITS.max_upload:
+            return self._json({"error": f"Upload exceeds {LIMITS.max_upload} bytes"}, 413)
+        with span(self, "read"):
+            raw = self.rfile.read(length)
+        key = request_key(self, "audit", RULES_VERSION, raw)
+        if not_modified(self, key):
+            return
+        usage = {"error": "POST JSON {code:'VBA text'} or {modules:[{name,code}]}"}
         try:
-            body = json.loads(raw or "{}")
-            code = body["code"]  # original VBA text
+            with span(self, "parse"):
+                body = json.loads(raw or "{}")
+            ann  = _truthy(body.get("includeAnnotatedCode", ann))
+            mode = str(body.get("analysis", mode)).lower()
+            rw   = _truthy(body.get("rewrite", rw))
         except Exception:
-            return self._json({"error": "POST JSON {code:'VBA text'}"}, 400)
-
-        lines   = code.splitlines()
-        issues  = []
-        flagged = set()
-
-        # run rules
-        for ln, line in enumerate(lines, start=1):
-            for rule in RULES:
-                flags = rule.get("flags", 0)
-                m = re.search(rule["pattern"], line, flags)
-                if m:
-                    key = (rule["pattern"], ln)   # avoid duplicates same line
-                    if key in flagged:
-                        continue
-                    flagged.add(key)
-                    msg = rule["message"].format(*m.groups())
-                    issues.append({
-                        "line": ln,
-                        "message": msg,
-                        "suggestion": rule["fix"]
-                    })
-                    lines[ln-1] += f"    ' 🔍 ISSUE: {msg}"
-                    break
-
-        # build checklist (top 5 unique suggestions)
-        checklist = []
-        seen_fix  = set()
-        for iss in issues:
-            if iss["suggestion"] and iss["suggestion"] not in seen_fix:
-                checklist.append("• " + iss["suggestion"])
-                seen_fix.add(iss["suggestion"])
-            if len(checklist) >= 5:
-                break
-
-        self._json({
-            "annotatedCode": "\n".join(lines),
-            "findings": issues,
-            "todo": checklist or ["Looks solid! No common issues found."]
-        })
+            return self._json(usage, 400)
+
+        # --- batch: JSON array of modules or zipBase64
+        if "modules" in body:
+            try:
+                mods = _module_list(body["modules"])
+            except ValueError as exc:
+                return self._json({"error": str(exc)}, 400)
+            return self._ndjson(iter(mods), ann, mode, rw)
+        if "zipBase64" in body:
+            # the JSON is already parsed for the options; decode the archive
+            # chunk by chunk into a spool rather than one more full copy
+            try:
+                if not isinstance(body["zipBase64"], str):
+                    raise ValueError("zipBase64 is not a string")
+                with span(self, "decode"):
+                    spool = spool_base64_text(body["zipBase64"], "zipBase64")
+            except ValueError:
+                return self._json({"error": "Invalid JSON with 'zipBase64'"}, 400)
+            return self._archive(spool, ann, mode, rw)
+
+        code = body.get("code")  # original VBA text
+        if not isinstance(code, str):
+            return self._json(usage, 400)
+
+        # the same code re-audited after unrelated saves is served from the
+        # shared result cache; line endings do not change the result
+        code = "\n".join(code.splitlines()) + ("\n" if code.endswith(("\n", "\r")) else "")
+        cost    = mode == "cost"
+        version = RULES_VERSION
+        if rw:
+            from _rewrite import REWRITE_VERSION
+            version = content_hash(RULES_VERSION, REWRITE_VERSION)
+        send_cached(self, "audit_optimize", version, (code, ann, cost, rw),
+                    lambda: self._audit(code, ann, cost, rw), key)
+
+    def _audit(self, code, annotate, cost, rewrite):
+        if cost:
+            _, rec = next(CostModel([("module", code)], self).audit(annotate, self))
+        else:
+            rec = audit(code, annotate, self)
+        return {**rec, **self._rewrites("Module", code, rewrite)}
 
     # ---------- GET ----------
+    @instrumented("audit_optimize")
     def do_GET(self):
-        self._json({"hint": "POST JSON {code:'<paste VBA code>'} to audit"})
+        self._json({"hint": "POST JSON {code:'<paste VBA code>'} to audit, "
+                            "or {modules:[...]} / a ZIP upload for NDJSON batch mode; "
+                            "add analysis:'cost' (or ?analysis=cost) for loop-aware costs and ranked hotspots, "
+                            "rewrite:true (or ?rewrite=1) for the optimized module and a unified diff"})
@@ -1,5 +1,12 @@
 from http.server import BaseHTTPRequestHandler
-import json, re
+import json, re, math, heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+
+from _catalog import PREWARM, CatalogError, catalog, register
+from _http import not_modified, request_key, send_cached, send_json
+from _metrics import instrumented, span
 
 # ────────────────────────────────────────────────────────────────
 def _normalize(text: str) -> str:
@@ -8,146 +15,282 @@ def _normalize(text: str) -> str:
 
 
 # ----------------------------------------------------------------
-# 1) Expert playbook of Excel/VBA scenarios
+# 1) Expert playbook + generic hints live in the shared catalog
+#    (data/catalog.json → "scenarios", "genericHints"; see _catalog.py)
+#
+# 2) Keyword index (built once per catalog version)
 # ----------------------------------------------------------------
-SCENARIOS = {
-    "pivot": [
-        {
-            "match": ["pivot", "calculated field", "grouping", "pivot table"],
-            "title": "Use PivotCache to refresh without flicker",
-            "description": (
-                "When looping or frequent refreshes, call .PivotCache.Refresh "
-                "instead of pt.RefreshTable to avoid UI lag."
-            ),
-            "reference": None,
-            "tip": "Dim pc As PivotCache: Set pc = pt.PivotCache: pc.Refresh"
-        },
-        {
-            "match": ["field", "calculated field", "formula"],
-            "title": "Insert calculated fields programmatically",
-            "description": (
-                "Use .CalculatedFields.Add to add or update formulas in code."
-            ),
-            "reference": None,
-            "tip": 'pt.CalculatedFields.Add "Margin", "=Revenue-Cost", True'
-        }
-    ],
-
-    # ----------  USERFORMS  ----------
-    "userform": [
-        {
-            "match": ["multipage", "tabs", "multi page"],
-            "title": "MultiPage for tabbed sections",
-            "description": "Group related inputs into tabs to keep large forms compact.",
-            "reference": "Microsoft Forms 2.0 Object Library",
-            "tip": "Insert → ActiveX → MultiPage"
-        },
-        {
-            "match": ["calendar", "date", "monthview"],
-            "title": "MonthView control for date picking",
-            "description": "Native calendar UI avoids manual date validation.",
-            "reference": "MSCOMCT2.OCX",
-            "tip": "Register MSCOMCT2, then Tools → Additional Controls → MonthView"
-        },
-        {
-            "match": ["events", "broadcast", "notify", "scripting.dictionary"],
-            "title": "Broadcast custom events via WithEvents Dictionary",
-            "description": "Raise events from models and let multiple forms listen loosely.",
-            "reference": "Microsoft Scripting Runtime",
-            "tip": "Private WithEvents mBus As Scripting.Dictionary"
-        }
-    ],
-
-    # ----------  PERFORMANCE  ----------
-    "performance": [
-        {
-            "match": ["loops", "long", "recalc"],
-            "title": "Manual calculation during long loops",
-            "description": "Set Application.Calculation = xlCalculationManual, restore after.",
-            "reference": None,
-            "tip": "Application.Calculation = xlCalculationManual"
-        },
-        {
-            "match": ["screen", "flicker"],
-            "title": "Disable ScreenUpdating & PageBreaks",
-            "description": "Reduces UI churn by ~90 % on big sheets.",
-            "reference": None,
-            "tip": "With Application: .ScreenUpdating=False: ActiveSheet.DisplayPageBreaks=False"
-        }
-    ],
-
-    # ----------  CHARTS  ----------
-    "charts": [
-        {
-            "match": ["export", "pdf", "print"],
-            "title": "One‑line PDF export",
-            "description": "Use Chart.ExportAsFixedFormat to skip the Print dialog.",
-            "reference": None,
-            "tip": "ActiveChart.ExportAsFixedFormat xlTypePDF, \"C:\\Temp\\Chart.pdf\""
-        },
-        {
-            "match": ["animate", "ani", "smooth"],
-            "title": "Flicker‑free animation (DISPOFF/DISPON)",
-            "description": "Call legacy XLM to suppress redraw between frames.",
-            "reference": None,
-            "tip": "Application.ExecuteExcel4Macro \"DISPOFF\" : … : Application.ExecuteExcel4Macro \"DISPON\""
-        }
-    ]
-}
+class KeywordIndex:
+    """All scenario / hint keywords behind one compiled scanner.
+
+    The keywords are folded into a trie-shaped regex inside a lookahead, so
+    one C-level pass reports the longest keyword starting at each offset;
+    shorter keywords matching at that offset are prefixes of it and come
+    from a table filled in while building the trie.  Substring semantics
+    match the old ``k in ctx``.
+
+    As in BM25Index, scenarios are numbered topic by topic in catalog order,
+    so a topic is a doc-id range, and all postings share one flat doc-id
+    array.  The regex is kept as source and compiled on first use, so a
+    pickled index is a few large arrays and loads quickly.
+    """
+
+    def __init__(self, scenarios, hints):
+        self.docs     = _Docs(scenarios)
+        self.ranges   = self.docs.ranges
+        self.hints    = {}          # keyword → hint text (catalog order)
+        postings      = {}
+        for d, rec in enumerate(chain.from_iterable(scenarios.values())):
+            for kw in {_normalize(k) for k in rec["match"]} - {""}:
+                postings.setdefault(kw, []).append(d)
+        # keyword → row; row r's sorted doc ids are ids[offsets[r]:offsets[r + 1]]
+        self.terms, self.ids, self.offsets = _flatten(postings)
+        for kw, hint in hints.items():
+            self.hints[_normalize(kw)] = hint
+
+        trie = {}
+        self.prefixes = {}          # keyword → shorter keywords that prefix it (if any)
+        for kw in sorted(set(self.terms) | set(self.hints)):
+            node, seen = trie, []
+            for i, ch in enumerate(kw):
+                if "" in node:
+                    seen.append(kw[:i])
+                node = node.setdefault(ch, {})
+            node[""] = True
+            if seen:
+                self.prefixes[kw] = seen
+        self.pattern = f"(?=({_trie_pattern(trie)}))" if trie else "(?!)"
+        self._regex  = None
+
+    def __getstate__(self):
+        return {**self.__dict__, "_regex": None}
+
+    def hits(self, ctx):
+        """Every keyword occurring anywhere in the normalized context."""
+        if self._regex is None:
+            self._regex = re.compile(self.pattern)
+        found = set()
+        for m in self._regex.finditer(ctx):
+            kw = m.group(1)
+            if kw not in found:
+                found.add(kw)
+                found.update(self.prefixes.get(kw, ()))
+        return found
+
+    def rank(self, found, topic=None):
+        """Scenarios hit by ``found``, best first.
+
+        Ranked by number of distinct matched keywords, then their total
+        length (longer phrases are more specific), then catalog order.
+        """
+        if topic is not None and topic not in self.ranges:
+            return []
+        lo, hi = self.ranges.get(topic, (0, len(self.docs)))
+        ids    = self.ids
+        scores = {}
+        for kw in found:
+            row = self.terms.get(kw)
+            if row is None:
+                continue
+            i, j = self.offsets[row], self.offsets[row + 1]
+            if topic is not None:
+                i, j = bisect_left(ids, lo, i, j), bisect_left(ids, hi, i, j)
+            for d in ids[i:j]:
+                n, width = scores.get(d, (0, 0))
+                scores[d] = (n + 1, width + len(kw))
+        ranked = sorted(scores, key=lambda d: (-scores[d][0], -scores[d][1], d))
+        return [self.docs[d] for d in ranked]
+
+    def hint(self, found):
+        """First generic-hint keyword (catalog order) present in ``found``."""
+        return next((k for k in self.hints if k in found), None)
+
+
+class _Docs:
+    """Doc id → rec, with doc ids running topic by topic in catalog order.
+
+    Holds the catalog's own per-topic sequences rather than a flat copy, so
+    a pickled index refers to one sequence per topic (see _catalog.py).
+    """
+
+    def __init__(self, scenarios):
+        self.groups = list(scenarios.values())
+        self.starts = array("I")
+        self.ranges = {}            # topic → (first doc id, last + 1)
+        n = 0
+        for topic, recs in scenarios.items():
+            self.starts.append(n)
+            self.ranges[topic] = (n, n + len(recs))
+            n += len(recs)
+        self.size = n
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, d):
+        g = bisect_right(self.starts, d) - 1
+        return self.groups[g][d - self.starts[g]]
+
+def _flatten(postings):
+    """{term: row}, the concatenated doc ids and the row offsets for {term: [doc id]}."""
+    terms, ids, offsets = {}, array("I"), array("I", [0])
+    for term, docs in postings.items():
+        terms[term] = len(terms)
+        ids.extend(docs)
+        offsets.append(len(ids))
+    return terms, ids, offsets
+
+def _trie_pattern(node):
+    """Regex for a char trie; greedy optionals make it prefer the longest keyword."""
+    alts = [re.escape(ch) + _trie_pattern(sub) for ch, sub in node.items() if ch]
+    if not alts:
+        return ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    return f"(?:{body})?" if "" in node else body
+
+
+INDEX_VERSION = 2      # layout of the pickled KeywordIndex / BM25Index (see _catalog.py)
+
+register("keywords", INDEX_VERSION, lambda c: KeywordIndex(c.scenarios, c.hints))
+register("bm25",     INDEX_VERSION, lambda c: BM25Index(c.scenarios))
+
+def keyword_index():
+    return catalog().derived("keywords")
 
 # ----------------------------------------------------------------
-# 2) Generic keyword → hint map (fallback)
+# 3) BM25 relevance index (opt-in ranking mode)
 # ----------------------------------------------------------------
-GENERIC_HINTS = {
-    "pivot":      "Use PivotCache.Refresh and CalculatedFields.Add for dynamic fields.",
-    "userform":   "Try MultiPage for tabs and MonthView for date inputs.",
-    "chart":      "Chart.ExportAsFixedFormat makes instant PDFs; DISPOFF cuts flicker.",
-    "performance":"Turn off ScreenUpdating and switch calc to Manual inside loops."
-}
+TOKEN_RE  = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and are as at be by for from how i in into is it my of on or "
+                      "the this to use using want we with you".split())
+
+def _tokens(text):
+    return [t for t in TOKEN_RE.findall(_normalize(text)) if t not in STOPWORDS]
+
+class BM25Index:
+    """Okapi BM25 over match keywords (counted twice), title and description.
+
+    Every posting stores its final BM25 term weight, so a query is only a
+    sum of precomputed floats over the postings of its terms.  Documents are
+    numbered topic by topic, so a topic filter is a doc-id range and each
+    sorted posting list is sliced with bisect instead of filtered.  All
+    posting lists share flat id / weight arrays (see KeywordIndex).
+    """
+
+    def __init__(self, scenarios, k1=1.2, b=0.75):
+        self.docs   = _Docs(scenarios)
+        self.ranges = self.docs.ranges
+        tfs         = []
+        for rec in chain.from_iterable(scenarios.values()):
+            words = _tokens(" ".join(rec["match"])) * 2
+            words += _tokens(rec.get("title") or "") + _tokens(rec.get("description") or "")
+            tf = {}
+            for w in words:
+                tf[w] = tf.get(w, 0) + 1
+            tfs.append((tf, len(words)))
+
+        n     = len(self.docs) or 1
+        avgdl = sum(dl for _, dl in tfs) / n or 1.0
+        df    = {}
+        for tf, _ in tfs:
+            for w in tf:
+                df[w] = df.get(w, 0) + 1
+        idf = {w: math.log(1 + (n - c + 0.5) / (c + 0.5)) for w, c in df.items()}
+
+        postings, weights = {}, {}
+        for d, (tf, dl) in enumerate(tfs):
+            norm = k1 * (1 - b + b * dl / avgdl)
+            for w, f in tf.items():
+                postings.setdefault(w, []).append(d)
+                weights.setdefault(w, []).append(idf[w] * f * (k1 + 1) / (f + norm))
+        self.terms, self.ids, self.offsets = _flatten(postings)
+        self.weights = array("d")
+        for w in self.terms:
+            self.weights.extend(weights[w])
+
+    def top(self, text, k=5, topic=None):
+        """Best ``k`` (score, rec) pairs for free text, optionally within one topic."""
+        lo, hi = self.ranges.get(topic, (0, len(self.docs)))
+        ids, weights = self.ids, self.weights
+        scores = {}
+        get    = scores.get
+        for w in set(_tokens(text)):
+            row = self.terms.get(w)
+            if row is None:
+                continue
+            i, j = self.offsets[row], self.offsets[row + 1]
+            if topic in self.ranges:
+                i, j = bisect_left(ids, lo, i, j), bisect_left(ids, hi, i, j)
+            for d, s in zip(ids[i:j], weights[i:j]):
+                scores[d] = get(d, 0.0) + s
+        best = heapq.nlargest(k, scores.items(), key=lambda x: (x[1], -x[0]))
+        return [(round(s, 4), self.docs[d]) for d, s in best]
+
+def bm25_index():
+    return catalog().derived("bm25")
+
+if PREWARM:
+    try:
+        keyword_index()
+        bm25_index()
+    except CatalogError:
+        pass                # each request answers 503 until the catalog can be read
 
 # ----------------------------------------------------------------
-# 3) HTTP handler
+# 4) HTTP handler
 # ----------------------------------------------------------------
 class handler(BaseHTTPRequestHandler):
-    def _json(self, obj, status=200):
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(obj, indent=2).encode())
+    def _json(self, obj, status=200, key=None):
+        send_json(self, obj, status, key)
 
     # ---------- POST ----------
+    @instrumented("contextual_features")
     def do_POST(self):
         length = int(self.headers.get("Content-Length", 0))
-        data   = json.loads(self.rfile.read(length) or "{}")
+        raw    = self.rfile.read(length)
+        try:
+            stamp = catalog().stamp
+        except CatalogError as exc:
+            return self._json({"error": str(exc)}, 503)
+        key    = request_key(self, "contextual", stamp, raw)
+        if not_modified(self, key):
+            return
+        with span(self, "parse"):
+            data = json.loads(raw or "{}")
 
         ctx   = _normalize(data.get("context", ""))
         stype = _normalize(data.get("type", "general"))
+        bm25  = data.get("rank") == "bm25"
+        limit = data.get("maxItems", 5)
+        send_cached(self, "contextual_features", stamp, (ctx, stype, bm25, limit),
+                    lambda: self._recommend(ctx, stype, bm25, limit), key)
 
-        matches = [
-            rec for rec in SCENARIOS.get(stype, [])
-            if any(k in ctx for k in rec["match"])
-        ]
+    def _recommend(self, ctx, stype, bm25, limit):
+        with span(self, "match"):
+            index   = keyword_index()
+            found   = index.hits(ctx)
 
-        # fallback scan across all topics
-        if not matches:
-            for rules in SCENARIOS.values():
-                for rec in rules:
-                    if any(k in ctx for k in rec["match"]):
-                        matches.append(rec)
-                        break
-                if matches: break
-
-        # generic hint fallback
-        if not matches:
-            for kw, hint in GENERIC_HINTS.items():
-                if kw in ctx:
+            # BM25 mode: top-k by relevance, "type" filters only if it is a topic
+            if bm25:
+                matches = [{**rec, "score": score}
+                           for score, rec in bm25_index().top(ctx, limit, stype)]
+            else:
+                matches = index.rank(found, stype)
+
+                # fallback: best matches across all topics
+                if not matches:
+                    matches = index.rank(found)
+
+            # generic hint fallback
+            if not matches:
+                kw = index.hint(found)
+                if kw:
                     matches.append({
                         "title": f"General tip for '{kw}' tasks",
-                        "description": hint,
+                        "description": index.hints[kw],
                         "reference": None,
                         "tip": None
                     })
-                    break
 
         # final "need more detail"
         if not matches:
@@ -158,11 +301,13 @@ class handler(BaseHTTPRequestHandler):
                 "tip": None
             })
 
-        self._json({
+        return {
             "topic": stype,
-            "recommendations": matches[: data.get("maxItems", 5)]
-        })
+            "recommendations": matches[:limit]
+        }
 
     # ---------- GET ----------
+    @instrumented("contextual_features")
     def do_GET(self):
-        self._json({"hint": "POST JSON {context:'build XYZ', type:'charts'...} for recommendations"})
+        self._json({"hint": "POST JSON {context:'build XYZ', type:'charts'...} for recommendations; "
+                            "add rank:'bm25' for relevance-ranked results with scores"})
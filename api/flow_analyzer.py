@@ -1,98 +1,322 @@
 from http.server import BaseHTTPRequestHandler
-import json, base64, io, zipfile, re
-from collections import defaultdict
-
-# ----- Regexes for code analysis -----
-PROC_RE   = re.compile(r"^\s*(Public |Private )?(Sub|Function)\s+([A-Za-z0-9_]+)", re.I | re.M)
-CALL_RE   = re.compile(r"\bCall\s+([A-Za-z0-9_]+)|\b([A-Za-z0-9_]+)\s*\(", re.I)
-RANGE_RE  = re.compile(r"\bRange\(\"([A-Z0-9:]+)\"\)|Cells?\(", re.I)
-CTRL_RE   = re.compile(r"\.(Top|Left|Visible|Enabled|Caption)\b", re.I)
-ERROR_RE  = re.compile(r"On\s+Error\s+(Resume\s+Next|GoTo)", re.I)
-
-def parse_module(name, text, graph, effects, hotspots):
-    funcs = {m.group(3).lower(): m.start() for m in PROC_RE.finditer(text)}
-    for fname, start in funcs.items():
-        block = text[start:]
-        end   = block.find("End Sub")
-        if end == -1: end = block.find("End Function")
-        block = block[: end if end != -1 else None]
-
-        for c1, c2 in CALL_RE.findall(block):
-            called = (c1 or c2).strip().lower()
-            if called and called not in funcs:
-                graph[fname].add(called)
-
-        if RANGE_RE.search(block): effects[fname].add("Reads/writes cells")
-        if CTRL_RE.search(block): effects[fname].add("Touches form controls")
-        if "FileSystemObject" in block: effects[fname].add("File system access")
-        if ERROR_RE.search(block): hotspots.add(fname)
+import os, threading
+from collections import defaultdict, deque
+from itertools import chain, islice
+from urllib.parse import urlsplit
 
-class handler(BaseHTTPRequestHandler):
-    def _json(self, obj, status=200):
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(obj, indent=2).encode())
+from _archive import NO_MODULES, iter_modules, open_upload
+from _cache import DiskStore, LRUCache, content_hash
+from _callgraph import CallGraphIndex
+from _http import send_json
+from _metrics import instrumented, span
+from _lexer import BUILTINS, DECLARE, KEYWORDS, LEXER_VERSION, SCOPES, declared, is_name, lex, nest
 
-    def do_POST(self):
-        content_type = self.headers.get("Content-Type", "").lower()
-        zip_bytes = None
-
-        # --- Option 1: zipBase64 via JSON
-        if "application/json" in content_type:
-            try:
-                data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0))
-                if "zipBase64" not in data:
-                    raise ValueError("Missing 'zipBase64'")
-                zip_bytes = base64.b64decode(data["zipBase64"])
-            except Exception:
-                return self._json({"error": "Invalid JSON with 'zipBase64'"}, 400)
-
-        # --- Option 2: raw ZIP file upload
-        elif "application/zip" in content_type:
-            zip_bytes = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+# ----- Call/effect extraction over the shared lexer's statements -----
+CTRL_PROPS = frozenset(("top", "left", "visible", "enabled", "caption"))
+CELL_NAMES = frozenset(("cell", "cells"))
+NAME_AFTER = frozenset(("as", "new", "goto", "gosub", "resume", "is", "typeof"))   # a type or a label follows
+
+def module_key(name):
+    """'src/Module1.bas' → 'module1' (the VBA module name, lower-cased)."""
+    return name.replace("\\", "/").rsplit("/", 1)[-1].rsplit(".", 1)[0].lower()
+
+def _assigns(st, i):
+    """True when st[i:] is ``(...) = ...`` (an indexed assignment, not a call)."""
+    depth = 0
+    for t in st[i:]:
+        if t == "(":
+            depth += 1
+        elif t == ")":
+            depth -= 1
+        elif depth == 0:
+            return t == "="
+    return False
 
+def _scan(st, local, info):
+    """Add one statement's calls, weak refs, effects and error handling to ``info``."""
+    calls, refs, effects = info["calls"], info["refs"], info["effects"]
+    n, head, first = len(st), st[0], 0
+
+    # statement-level call forms: "Call X ...", "X args", "X(args)", "X"
+    if head == "call":
+        if n > 1 and is_name(st[1]):
+            qual = n > 3 and st[2] == "." and is_name(st[3])
+            calls.add(f"{st[1]}.{st[3]}" if qual else st[1])
+            first = 4 if qual else 2
+    elif is_name(head) and head not in BUILTINS and head not in local:
+        nxt = st[1] if n > 1 else ""
+        if nxt not in ("=", ".", ":=", "as") and not (nxt == "(" and _assigns(st, 1)):
+            calls.add(head)
+        first = 1
+
+    skip = False
+    for j in range(first, n):
+        t = st[j]
+        c = t[0]
+        if c == '"':
+            if "filesystemobject" in t:
+                effects.add("File system access")
+            continue
+        if not c.isalpha():
+            continue
+        nxt = st[j + 1] if j + 1 < n else ""
+        if t in CELL_NAMES and nxt == "(" or t == "range" and nxt == "(" and j + 2 < n and st[j + 2][0] == '"':
+            effects.add("Reads/writes cells")
+        if t == "filesystemobject":
+            effects.add("File system access")
+        if j and st[j - 1] == ".":
+            if t in CTRL_PROPS:
+                effects.add("Touches form controls")
+            q = st[j - 2] if j > 1 else ""
+            if is_name(q) and (j < 3 or st[j - 3] != ".") and q not in local and q not in BUILTINS:
+                calls.add(f"{q}.{t}")                   # Module.Proc (link drops non-modules)
+            elif nxt == "(" or j == 2 and nxt != "=":
+                refs.add(t)                             # obj.Method: only if it is a project proc
+            continue
+        if t in KEYWORDS:
+            if t == "on" and nxt == "error" and j + 2 < n and st[j + 2] in ("resume", "goto"):
+                info["hotspot"] = True
+            skip = t in NAME_AFTER
+            continue
+        if skip:
+            skip = False
+            continue
+        if t in BUILTINS or t in local or nxt == ":=":
+            continue
+        if nxt == "(":
+            calls.add(t)
         else:
-            return self._json({"error": "Expected zipBase64 (JSON) or ZIP file upload"}, 400)
+            refs.add(t)                                 # bare name: a call only if it is a proc
+
+def parse_module(name, text):
+    """Per-module partial result: {proc: {calls, refs, loops, effects, hotspot, public}}.
+
+    Works on the shared lexer's statements, so comments and string literals
+    never produce calls, and continued lines are one statement.  ``calls``
+    are explicit (``Call X``, ``X args``, ``X(...)``, ``Module.X``) and kept
+    unresolved for link(); ``refs`` are bare names and object members that
+    only count when they name a project procedure.  Keywords, built-ins and
+    declared variables/arrays (so indexers) are never calls.  ``loops``
+    maps a called name to the deepest For/Do/While nesting of its call sites.
+    """
+    lx     = lex(text)
+    shared = set()
+    for _, st in lx.outside:
+        if st[0] in DECLARE or st[0] in SCOPES:
+            shared.update(declared(st))
+
+    procs = {}
+    for proc in lx.procedures:
+        info  = procs.setdefault(proc.name, {"calls": set(), "refs": set(), "loops": {},
+                                             "effects": set(), "hotspot": False, "public": False})
+        info["public"] |= proc.scope != "private"
+        local = shared.union(proc.params)
+        for _, st in proc.body:
+            if st[0] in DECLARE:
+                local.update(declared(st))
+        for _, st, loops, _ in nest(proc.body):
+            if st[0] in DECLARE:
+                continue
+            if not loops:
+                _scan(st, local, info)
+                continue
+            # inside a loop: note how deep each call made here sits
+            site = {"calls": set(), "refs": set(), "effects": info["effects"], "hotspot": False}
+            _scan(st, local, site)
+            info["calls"] |= site["calls"]
+            info["refs"]  |= site["refs"]
+            info["hotspot"] |= site["hotspot"]
+            depth = len(loops)
+            for called in site["calls"] | site["refs"]:
+                if info["loops"].get(called, 0) < depth:
+                    info["loops"][called] = depth
+        info["refs"].discard(proc.name)     # "Total = Total + x" reads the return value
+    return {"module": module_key(name), "procs": procs}
+
+# ----- Parallel parsing (process pool for big archives) -----
+WORKERS              = int(os.environ.get("FLOW_WORKERS", 0)) or os.cpu_count() or 1
+PARALLEL_MIN_MODULES = int(os.environ.get("FLOW_PARALLEL_MIN_MODULES", 32))
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """The shared pool, created on first use.
+
+    Workers never fork from this process: under server.py another thread may
+    hold a cache lock at that moment, and a forked child would deadlock on it.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool  = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+# ----- Incremental cache (module text hash → partial) -----
+PARSER_VERSION = "4"
+PARTIALS       = LRUCache(int(os.environ.get("FLOW_CACHE_SIZE", 4096)))
+DISK           = DiskStore(os.environ["FLOW_CACHE_DIR"]) if os.environ.get("FLOW_CACHE_DIR") else None
+
+def _lookup(items, stats):
+    """Yield (name, text, key, cached partial or None) per module."""
+    for name, text in items:
+        key  = content_hash(PARSER_VERSION, LEXER_VERSION, module_key(name), text)
+        part = PARTIALS.get(key)
+        if part is None and DISK is not None:
+            part = DISK.get(key)
+            if part is not None:
+                PARTIALS.put(key, part)
+        stats["hits" if part is not None else "misses"] += 1
+        yield name, text, key, part
 
-        try:
-            zf = zipfile.ZipFile(io.BytesIO(zip_bytes))
-        except Exception:
-            return self._json({"error": "Invalid ZIP format"}, 400)
+def _store(key, part):
+    PARTIALS.put(key, part)
+    if DISK is not None:
+        DISK.put(key, part)
+    return part
 
-        # --- Read .bas modules from zip ---
-        modules = {}
-        for name in zf.namelist():
-            if name.lower().endswith(".bas"):
-                modules[name] = zf.read(name).decode("utf-8", "ignore")
+def _parse_serial(entries):
+    for name, text, key, part in entries:
+        yield part if part is not None else _store(key, parse_module(name, text))
 
-        if not modules:
-            return self._json({"error": "No .bas files found in ZIP"}, 400)
+def cached_partial(name, text, stats):
+    """One module's partial from the cache, parsed (and stored) on a miss."""
+    return next(_parse_serial(_lookup(((name, text),), stats)))
+
+def _parse_parallel(entries):
+    """parse_module over a pool, in input order, with a bounded in-flight window."""
+    pool    = _get_pool()
+    pending = deque()
+    for name, text, key, part in entries:
+        pending.append((key, part if part is not None else pool.submit(parse_module, name, text)))
+        if len(pending) >= 2 * WORKERS:
+            yield _resolve(*pending.popleft())
+    while pending:
+        yield _resolve(*pending.popleft())
+
+def _resolve(key, part):
+    return part if isinstance(part, dict) else _store(key, part.result())
+
+def parse_modules(items, stats=None):
+    """Partials for every (name, text), in order; parallel past the threshold.
+
+    Unchanged modules come straight from the cache; only misses are parsed.
+    Small inputs (or single-core hosts, or platforms without process
+    support) stay on the serial path; both produce identical partials.
+    """
+    stats   = stats if stats is not None else {"hits": 0, "misses": 0}
+    entries = _lookup(items, stats)
+    head    = list(islice(entries, PARALLEL_MIN_MODULES))
+    if WORKERS < 2 or len(head) < PARALLEL_MIN_MODULES:
+        return list(_parse_serial(chain(head, entries)))
+    try:
+        _get_pool()
+    except (OSError, NotImplementedError, ImportError):
+        return list(_parse_serial(chain(head, entries)))
+    return list(_parse_parallel(chain(head, entries)))
+
+def link(partials, graph, effects, hotspots, depths=None):
+    """Merge per-module partials into graph/effects/hotspots keyed 'module.proc'.
+
+    A call resolves to the caller's own module first, then to any public
+    procedure of that name elsewhere; anything else (built-ins, externals)
+    stays a bare name as before.  ``Module.Proc`` resolves to that module
+    only; a qualifier that is not a module is an object, so the member is
+    treated like a weak ref, which links only to project procedures.
+    ``depths``, when given, receives {(caller, callee): loop depth} for
+    edges whose call site sits inside a loop.
+    """
+    public  = defaultdict(list)
+    modules = {}
+    for part in partials:
+        modules[part["module"]] = part["procs"]
+        for proc, info in part["procs"].items():
+            if info["public"]:
+                public[proc].append(f"{part['module']}.{proc}")
+
+    for part in partials:
+        mod = part["module"]
+        own = part["procs"]
+
+        def resolve(called, weak):
+            qual, _, member = called.rpartition(".")
+            if qual:
+                if qual in modules:
+                    return (called,) if member in modules[qual] else ()
+                called, weak = member, True
+            if called in own:
+                return (f"{mod}.{called}",)
+            return public.get(called) or (() if weak else (called,))
+
+        for proc, info in own.items():
+            node  = f"{mod}.{proc}"
+            edges = graph[node]
+            loops = info.get("loops", {})
+            for names, weak in ((info["calls"], False), (info.get("refs", ()), True)):
+                for called in names:
+                    targets = resolve(called, weak)
+                    edges.update(targets)
+                    if depths is not None and called in loops:
+                        for t in targets:
+                            key = (node, t)
+                            depths[key] = max(depths.get(key, 0), loops[called])
+            effects[node] |= info["effects"]
+            if info["hotspot"]:
+                hotspots.add(node)
+
+class handler(BaseHTTPRequestHandler):
+    def _json(self, obj, status=200, key=None):
+        send_json(self, obj, status, key)
+
+    @instrumented("flow_analyzer")
+    def do_POST(self):
+        partials = None
+        with open_upload(self) as zf:
+            if zf is None:
+                return
+            # --- Parse modules one at a time; each text is dropped after parsing
+            stats = {"hits": 0, "misses": 0}
+            with span(self, "parse"):
+                partials = parse_modules(iter_modules(zf), stats)
+        if partials is None:                    # an archive error was answered on the way out
+            return
+        if not partials:
+            return self._json({"error": NO_MODULES}, 400)
 
         # --- Analyze ---
         graph    = defaultdict(set)
         effects  = defaultdict(set)
         hotspots = set()
 
-        for mname, mtext in modules.items():
-            parse_module(mname, mtext, graph, effects, hotspots)
+        with span(self, "link"):
+            link(partials, graph, effects, hotspots)
+
+        # --- Graph analytics (?entry=mod.proc&reach=mod.proc&top=N) ---
+        with span(self, "analytics"):
+            analytics = CallGraphIndex(graph).summary_from_query(urlsplit(self.path).query, effects, hotspots)
 
         story = []
         for proc, calls in graph.items():
-            story.append(f"{proc}() ➜ calls: {', '.join(calls) or '—'}")
+            story.append(f"{proc}() ➜ calls: {', '.join(sorted(calls)) or '—'}")
             if effects[proc]:
-                story.append(f"    side-effects: {', '.join(effects[proc])}")
+                story.append(f"    side-effects: {', '.join(sorted(effects[proc]))}")
             if proc in hotspots:
                 story.append("    ⚠️ On Error handler detected — review this block.")
 
         self._json({
-            "callGraph": {k: list(v) for k, v in graph.items()},
-            "effects": {k: list(v) for k, v in effects.items()},
-            "errorHotspots": list(hotspots),
-            "storyboard": "\n".join(story)
+            "callGraph": {k: sorted(v) for k, v in graph.items()},
+            "effects": {k: sorted(v) for k, v in effects.items()},
+            "errorHotspots": sorted(hotspots),
+            "storyboard": "\n".join(story),
+            "analytics": analytics,
+            "cache": stats
         })
 
+    @instrumented("flow_analyzer")
     def do_GET(self):
         self._json({
-            "hint": "POST zipBase64 as JSON or upload ZIP (Content-Type: application/zip)"
+            "hint": "POST zipBase64 as JSON or upload a ZIP of exported modules "
+                    "or an .xlsm/.xlam workbook (Content-Type: application/zip)"
         })
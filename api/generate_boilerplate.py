@@ -1,98 +1,225 @@
 from http.server import BaseHTTPRequestHandler
-import json, textwrap, datetime
+import os, re, json, textwrap, datetime
+
+from _cache import LRUCache, content_hash
+from _http import not_modified, request_key, send_json, send_zip
+from _metrics import instrumented, span
+
+TEMPLATE_VERSION = "1"
+STAMP_FORMAT     = "%Y-%m-%d %H:%M UTC"
+MAX_BATCH        = int(os.environ.get("BOILERPLATE_MAX_BATCH", 500))
+RENDERED         = LRUCache(int(os.environ.get("BOILERPLATE_CACHE", 1024)))   # spec (+ stamp) → result
+
+def clock():
+    """Generation time for the header stamp; requests can pin it with ``generatedAt``."""
+    return datetime.datetime.now(datetime.timezone.utc)
 
 def _dbg(label: str) -> str:
     return f'    Debug.Print "{label}"; Timer'
 
+# ------------ templates (dedented once at import; filled per spec) ------------
+_BLANK = re.compile(r"^[ \t]+$", re.MULTILINE)   # dedent() blanks whitespace-only lines; so do we
+
+T_STEP = textwrap.dedent("""\
+    Public Sub {proc}()
+        {dbg}
+        ' TODO: {todo}
+    End Sub\n""")
+
+T_ERROR = textwrap.dedent("""\
+    Public Sub HandleError(ByVal proc As String, ByVal errObj As ErrObject)
+        Debug.Print \"[ERROR]\", proc, errObj.Number, errObj.Description
+        MsgBox \"Error \" & errObj.Number & \" in \" & proc & vbCrLf & errObj.Description, vbExclamation
+    End Sub\n""")
+
+T_EVENTS = textwrap.dedent("""\
+    Public Sub wb_Open():  'Workbook_Open stub : End Sub
+    Public Sub ws_Change(ByVal Target As Range):  'Worksheet_Change stub : End Sub\n""")
+
+T_HELPER = textwrap.dedent("""\
+    Public Function {name}_Helper() As Boolean
+        On Error GoTo ErrHandler
+        {dbg_start}
+
+        ' …logic…
+
+        {dbg_end}
+        {name}_Helper = True
+    Done:
+        Exit Function
+    ErrHandler:
+        {on_err}
+        {name}_Helper = False
+        Resume Done
+    End Function\n""")
+
+def _fill(template, **values):
+    return _BLANK.sub("", template.format(**values))
+
+# ------------ one module ------------
+SPEC_FIELDS = ("moduleName", "moduleType", "steps", "headerComment", "includeDebugPrint", "includeErrorHandler")
+
+def render(req, now=None):
+    """{code, todo} for one module spec; memoized on the spec (and the stamp when it is used)."""
+    spec  = {k: req[k] for k in SPEC_FIELDS if k in req}
+    stamp = (now or clock()).strftime(STAMP_FORMAT) if spec.get("headerComment") else ""
+    key   = content_hash(TEMPLATE_VERSION, json.dumps(spec, sort_keys=True), stamp)
+    out   = RENDERED.get(key)
+    if out is None:
+        out = RENDERED.put(key, _render(req["moduleName"], spec, stamp))
+    return out
+
+def _render(name, req, stamp):
+    mtype  = req.get("moduleType", "helper").lower()
+    steps  = req.get("steps", [])
+    hdr    = req.get("headerComment", "")
+    dbgOn  = req.get("includeDebugPrint", False)
+    errOn  = req.get("includeErrorHandler", True)
+
+    header = f"'{hdr}\n'Generated: {stamp}\n\n" if hdr else ""
+    out    = [header + "Option Explicit\n"]
+
+    if mtype == "sequence":
+        out.append(f"'=====  SEQUENCE MODULE: {name}  ======\n")
+        for s in steps:
+            out.append(_fill(T_STEP, proc=s.replace(" ", ""), dbg=_dbg(s) if dbgOn else "", todo=s.lower()))
+        out.append("Public Sub Run()\n")
+        for s in steps: out.append(f"    {s.replace(' ', '')}\n")
+        out.append("End Sub\n")
+
+    elif mtype == "settings":
+        out.append("'=====  SETTINGS MODULE  ======\n")
+        out.append("Public Const APP_TITLE As String = \"MyWorkbook\"\n")
+
+    elif mtype == "error":
+        out.append("'=====  CENTRAL ERROR HANDLER  ======\n")
+        out.append(T_ERROR)
+
+    elif mtype == "events":
+        out.append("'=====  EVENT STUBS  ======\n")
+        out.append(T_EVENTS)
+
+    else:  # helper
+        out.append(f"'=====  HELPER MODULE: {name}  ======\n")
+        onErr = f'HandleError "{name}_Helper", Err' if errOn else 'MsgBox Err.Description'
+        out.append(_fill(T_HELPER, name=name, on_err=onErr,
+                         dbg_start=_dbg('start') if dbgOn else '', dbg_end=_dbg('end') if dbgOn else ''))
+
+    # ------------ guidance ------------
+    todo = []
+    if mtype == "sequence":
+        todo += [
+            f"• Call {name}.Run from a controller sub or Workbook_Open.",
+            "• Replace each step stub with real code."
+        ]
+    if errOn and mtype != "error":
+        todo.append("• Add or verify a central error‑handler module exists (moduleType='error').")
+    if dbgOn:
+        todo.append("• Open Immediate Window (Ctrl+G) to watch Debug.Print output.")
+    if not todo:
+        todo.append("• Insert this module and hook it where needed.")
+
+    return {"code": "\n".join(out), "todo": todo}
+
+# ------------ batch ------------
+_IDENT = re.compile(r"[A-Za-z][A-Za-z0-9_]{0,30}")
+
+def _generated_at(value):
+    """Pinned generation time from an ISO 8601 string (UTC unless it says otherwise)."""
+    at = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return (at if at.tzinfo else at.replace(tzinfo=datetime.timezone.utc)).astimezone(datetime.timezone.utc)
+
+_FIELD_TYPES = {"moduleType": str, "headerComment": str, "includeDebugPrint": bool, "includeErrorHandler": bool}
+
+def _check_fields(spec):
+    """ValueError unless every optional spec field that is present has the type _render expects."""
+    name = spec["moduleName"]
+    for field, kind in _FIELD_TYPES.items():
+        if field in spec and not isinstance(spec[field], kind):
+            raise ValueError(f"{name}: {field} must be a {kind.__name__}")
+    steps = spec.get("steps", [])
+    if not isinstance(steps, list) or not all(isinstance(s, str) for s in steps):
+        raise ValueError(f"{name}: steps must be a list of strings")
+
+def _batch_specs(specs):
+    """Validated specs with identical duplicates dropped; ValueError on a bad or clashing one.
+
+    Every field is checked here because the ZIP members render lazily,
+    after the 200 headers are out, when a bad spec can no longer get a 400.
+    """
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("modules must be a non-empty list of module specs")
+    if len(specs) > MAX_BATCH:
+        raise ValueError(f"at most {MAX_BATCH} modules per batch")
+    seen = {}
+    for spec in specs:
+        name = spec.get("moduleName") if isinstance(spec, dict) else None
+        if not isinstance(name, str) or not _IDENT.fullmatch(name):
+            raise ValueError(f"moduleName {name!r} is not a valid VBA module name")
+        _check_fields(spec)
+        prev = seen.setdefault(name.lower(), spec)
+        if prev is not spec and prev != spec:
+            raise ValueError(f"moduleName {name!r} is used by two different specs")
+    return list(seen.values())
+
+def _members(specs, now):
+    """(path, bytes) per module in the src/<Name>.bas layout flow_analyzer reads, then todo.txt."""
+    todo = []
+    for spec in specs:
+        name = spec["moduleName"]
+        out  = render(spec, now)
+        yield f"src/{name}.bas", f'Attribute VB_Name = "{name}"\n{out["code"]}'.encode()
+        todo += [f"{name}:"] + [f"  {t}" for t in out["todo"]]
+    yield "todo.txt", ("\n".join(todo) + "\n").encode()
+
 class handler(BaseHTTPRequestHandler):
-    def _json(self, obj, status=200):
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(obj, indent=2).encode())
+    def _json(self, obj, status=200, key=None):
+        send_json(self, obj, status, key)
 
     # ---------- POST ----------
+    @instrumented("generate_boilerplate")
     def do_POST(self):
-        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0))
-
-        name   = req["moduleName"]
-        mtype  = req.get("moduleType", "helper").lower()
-        steps  = req.get("steps", [])
-        hdr    = req.get("headerComment", "")
-        dbgOn  = req.get("includeDebugPrint", False)
-        errOn  = req.get("includeErrorHandler", True)
-
-        stamp  = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-        header = f"'{hdr}\n'Generated: {stamp}\n\n" if hdr else ""
-        out    = [header + "Option Explicit\n"]
-
-        # ------------ templates ------------
-        if mtype == "sequence":
-            out.append(f"'=====  SEQUENCE MODULE: {name}  ======\n")
-            for s in steps:
-                proc = s.replace(" ", "")
-                out.append(textwrap.dedent(f"""\
-                    Public Sub {proc}()
-                        {_dbg(s) if dbgOn else ''}
-                        ' TODO: {s.lower()}
-                    End Sub\n"""))
-            out.append("Public Sub Run()\n")
-            for s in steps: out.append(f"    {s.replace(' ', '')}\n")
-            out.append("End Sub\n")
-
-        elif mtype == "settings":
-            out.append("'=====  SETTINGS MODULE  ======\n")
-            out.append("Public Const APP_TITLE As String = \"MyWorkbook\"\n")
-
-        elif mtype == "error":
-            out.append("'=====  CENTRAL ERROR HANDLER  ======\n")
-            out.append(textwrap.dedent("""\
-                Public Sub HandleError(ByVal proc As String, ByVal errObj As ErrObject)
-                    Debug.Print \"[ERROR]\", proc, errObj.Number, errObj.Description
-                    MsgBox \"Error \" & errObj.Number & \" in \" & proc & vbCrLf & errObj.Description, vbExclamation
-                End Sub\n"""))
-
-        elif mtype == "events":
-            out.append("'=====  EVENT STUBS  ======\n")
-            out.append(textwrap.dedent("""\
-                Public Sub wb_Open():  'Workbook_Open stub : End Sub
-                Public Sub ws_Change(ByVal Target As Range):  'Worksheet_Change stub : End Sub\n"""))
-
-        else:  # helper
-            out.append(f"'=====  HELPER MODULE: {name}  ======\n")
-            out.append(textwrap.dedent(f"""\
-                Public Function {name}_Helper() As Boolean
-                    On Error GoTo ErrHandler
-                    {_dbg('start') if dbgOn else ''}
-
-                    ' …logic…
-
-                    {_dbg('end') if dbgOn else ''}
-                    {name}_Helper = True
-                Done:
-                    Exit Function
-                ErrHandler:
-                    {'HandleError \"' + name + '_Helper\", Err' if errOn else 'MsgBox Err.Description'}
-                    {name}_Helper = False
-                    Resume Done
-                End Function\n"""))
-
-        # ------------ guidance ------------
-        todo = []
-        if mtype == "sequence":
-            todo += [
-                f"• Call {name}.Run from a controller sub or Workbook_Open.",
-                "• Replace each step stub with real code."
-            ]
-        if errOn and mtype != "error":
-            todo.append("• Add or verify a central error‑handler module exists (moduleType='error').")
-        if dbgOn:
-            todo.append("• Open Immediate Window (Ctrl+G) to watch Debug.Print output.")
-        if not todo:
-            todo.append("• Insert this module and hook it where needed.")
-
-        self._json({"code": "\n".join(out), "todo": todo})
+        with span(self, "read"):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+        with span(self, "parse"):
+            req = json.loads(raw)
+        now = None
+        if req.get("generatedAt"):
+            try:
+                now = _generated_at(req["generatedAt"])
+            except ValueError:
+                return self._json({"error": "generatedAt must be an ISO 8601 timestamp"}, 400)
+        # output is a pure function of the request unless a stamp comes from the clock
+        pure = now is not None or not any(
+            isinstance(s, dict) and s.get("headerComment") for s in req.get("modules", [req]))
+        key  = request_key(self, "boilerplate", TEMPLATE_VERSION, raw) if pure else None
+
+        if "modules" not in req:
+            if not_modified(self, key):
+                return
+            with span(self, "render"):
+                obj = render(req, now)
+            return self._json(obj, key=key)
+
+        # --- batch: every spec against the compiled templates
+        try:
+            specs = _batch_specs(req["modules"])
+        except ValueError as exc:
+            return self._json({"error": str(exc)}, 400)
+        fmt = str(req.get("format", "zip")).lower()
+        if fmt == "json":
+            if not_modified(self, key):
+                return
+            with span(self, "render"):
+                mods = [{"moduleName": s["moduleName"], **render(s, now)} for s in specs]
+            return self._json({"modules": mods}, key=key)
+        with span(self, "render"):
+            stamp = (now or clock()).timetuple()[:6]
+            send_zip(self, _members(specs, now), "modules.zip", max(stamp, (1980, 1, 1, 0, 0, 0)))
 
     # ---------- GET ----------
+    @instrumented("generate_boilerplate")
     def do_GET(self):
-        self._json({"hint": "POST JSON {moduleName:'MyModule'} to generate boilerplate"})
+        self._json({"hint": "POST JSON {moduleName:'MyModule'} to generate boilerplate, or "
+                            "{modules:[{moduleName,...}, ...]} for a ZIP of .bas files "
+                            "(format:'json' for JSON; generatedAt:'<ISO 8601>' pins the header stamp)"})
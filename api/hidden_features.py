@@ -1,48 +1,50 @@
 from http.server import BaseHTTPRequestHandler
 import json
 
+from _catalog import PREWARM, CatalogError, catalog
+from _http import not_modified, request_key, send_cached, send_json, send_text
+from _metrics import instrumented, span
+
+if PREWARM:
+    try:
+        catalog()
+    except CatalogError:
+        pass                # each request answers 503 until the catalog can be read
+
 class handler(BaseHTTPRequestHandler):
+    @instrumented("hidden_features")
     def do_POST(self):
         content_length = int(self.headers['Content-Length'])
         body = self.rfile.read(content_length)
         try:
-            data = json.loads(body)
+            stamp = catalog().stamp
+        except CatalogError as exc:
+            return send_json(self, {"error": str(exc)}, 503)
+        key = request_key(self, "hidden", stamp, body)
+        if not_modified(self, key):
+            return
+        try:
+            with span(self, "parse"):
+                data = json.loads(body)
         except json.JSONDecodeError:
             data = {}
 
         topic = data.get("topic", "").lower()
         max_items = data.get("maxItems", 5)
 
-        # Hidden features database
-        GEMS = {
-            "charts": [
-                "Use Chart.ExportAsFixedFormat for PDF export.",
-                "ApplyDataLabels with xlDataLabelsShowValue to show values.",
-                "Use XLM macro DISPOFF/DISPON to animate charts without flicker."
-            ],
-            "userforms": [
-                "MonthView control is in MSCOMCT2.OCX — register it, then enable via Tools > Additional Controls.",
-                "Set ScrollBars = fmScrollBarsBoth for scrollable/resizable forms.",
-                "Use WithEvents with Scripting.Dictionary to trigger custom UI events."
-            ],
-            "performance": [
-                "Disable DisplayPageBreaks during long operations for better speed.",
-                "Use Application.Calculation = xlCalculationManual inside loops.",
-                "Batch-read/write with Variant = Range.Value2 instead of cell-by-cell."
-            ]
-        }
-
-        gems = GEMS.get(topic, ["No hidden features available for this topic."])
-        gems = gems[:max_items]
-
-        # Response
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({"gems": gems}).encode())
+        # Response (shared across identical topic / maxItems requests)
+        send_cached(self, "hidden_features", stamp, (topic, max_items),
+                    lambda: self._lookup(topic, max_items), key)
+
+    def _lookup(self, topic, max_items):
+        # Hidden features database (shared catalog, reloaded when the file changes)
+        GEMS = catalog().gems
+
+        with span(self, "lookup"):
+            gems = GEMS.get(topic, ["No hidden features available for this topic."])
+            gems = list(gems[:max_items])
+        return {"gems": gems}
 
+    @instrumented("hidden_features")
     def do_GET(self):
-        self.send_response(200)
-        self.send_header("Content-Type", "text/plain")
-        self.end_headers()
-        self.wfile.write(b"This endpoint expects a POST request with a topic (e.g. 'charts').")
+        send_text(self, "This endpoint expects a POST request with a topic (e.g. 'charts').")
@@ -0,0 +1,10 @@
+from http.server import BaseHTTPRequestHandler
+
+from _http import send_bytes
+from _metrics import REGISTRY
+
+class handler(BaseHTTPRequestHandler):
+    """Prometheus scrape target for the handlers living in this process."""
+
+    def do_GET(self):
+        send_bytes(self, REGISTRY.render().encode(), "text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,107 @@
+from http.server import BaseHTTPRequestHandler
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import chain
+from urllib.parse import urlsplit
+
+from _archive import NO_MODULES, ArchiveLimitError, iter_modules, open_upload
+from _ovba import OVBAError
+from _callgraph import CallGraphIndex, analytics_query
+from _http import send_json, send_ndjson
+from _lexer import lex
+from _metrics import instrumented, span
+from audit_optimize import audit
+from flow_analyzer import cached_partial, link, module_key
+
+# ----------------------------------------------------------------
+# One pass per module: lex once, then the flow partial and the lint
+# findings both read that lexer output
+# ----------------------------------------------------------------
+def analyze_module(name, text, stats):
+    """(partial, per-module record) for one module; findings carry their proc and graph node."""
+    text   = "\n".join(text.splitlines())
+    key    = module_key(name)
+    procs  = lex(text).procedures
+    part   = cached_partial(name, text, stats)
+    starts = [p.line for p in procs]
+
+    def owner(ln, rule):
+        i = bisect_right(starts, ln) - 1
+        if i < 0 or ln > procs[i].end_line:
+            return {"proc": None, "node": None}
+        return {"proc": procs[i].name, "node": f"{key}.{procs[i].name}"}
+
+    lint  = audit(text, annotate=False, extra=owner)
+    count = defaultdict(int)
+    for f in lint["findings"]:
+        count[f["node"]] += 1
+    rows = {}
+    for p in procs:                          # Property Get/Let/Set share one node
+        node = f"{key}.{p.name}"
+        info = part["procs"][p.name]
+        row  = rows.setdefault(node, {"name": p.name, "node": node, "kind": p.kind, "line": p.line,
+                                      "endLine": p.end_line, "public": info["public"],
+                                      "effects": sorted(info["effects"]),
+                                      "errorHotspot": info["hotspot"], "findings": count[node]})
+        row["endLine"] = max(row["endLine"], p.end_line)
+    return part, {"module": name, "node": key, "procedures": list(rows.values()),
+                  "findings": lint["findings"], "todo": lint["todo"]}
+
+class handler(BaseHTTPRequestHandler):
+    def _json(self, obj, status=200, key=None):
+        send_json(self, obj, status, key)
+
+    @instrumented("project_analysis")
+    def do_POST(self):
+        # same inputs as flow_analyzer: zipBase64 via JSON, or a raw ZIP / workbook upload
+        with open_upload(self) as zf:
+            if zf is None:
+                return
+            modules = iter_modules(zf)
+            first   = next(modules, None)           # archive errors surface before streaming starts
+            if first is None:
+                return self._json({"error": NO_MODULES}, 400)
+            send_ndjson(self, self._records(first, modules))
+
+    def _records(self, first, modules):
+        """One record per module as it is analyzed, then the linked project record."""
+        stats, partials, nodes = {"hits": 0, "misses": 0}, [], defaultdict(int)
+        try:
+            for name, text in chain((first,), modules):
+                with span(self, "analyze"):
+                    part, rec = analyze_module(name, text, stats)
+                partials.append(part)
+                for f in rec["findings"]:
+                    nodes[f["node"] or rec["node"]] += 1
+                yield rec
+        except (ArchiveLimitError, OVBAError) as exc:
+            yield {"error": str(exc)}
+            return
+
+        graph, effects, hotspots = defaultdict(set), defaultdict(set), set()
+        with span(self, "link"):
+            link(partials, graph, effects, hotspots)
+
+        # --- graph analytics (?entry=mod.proc&reach=mod.proc&top=N), as flow_analyzer
+        query = urlsplit(self.path).query
+        with span(self, "analytics"):
+            analytics = CallGraphIndex(graph).summary_from_query(query, effects, hotspots)
+        top    = analytics_query(query)[2]
+        ranked = sorted(nodes.items(), key=lambda kv: (-kv[1], kv[0]))[:top]
+        yield {"project": {
+            "modules": len(partials),
+            "callGraph": {k: sorted(v) for k, v in graph.items()},
+            "errorHotspots": sorted(hotspots),
+            "analytics": analytics,
+            "lint": {"findings": sum(nodes.values()), "topNodes": [{"node": n, "findings": c} for n, c in ranked]},
+            "cache": stats,
+        }}
+
+    @instrumented("project_analysis")
+    def do_GET(self):
+        self._json({
+            "hint": "POST zipBase64 as JSON or upload a ZIP of exported modules or an .xlsm/.xlam "
+                    "workbook; streams NDJSON: one record per module (procedures, side effects, "
+                    "error hotspots, lint findings by procedure and call-graph node), then the "
+                    "project call graph and analytics"
+        })
@@ -0,0 +1,105 @@
+"""Cold-start benchmark: import-to-first-response time per endpoint, with a budget.
+
+    python bench/coldstart.py                 # 5 fresh interpreters per case
+    python bench/coldstart.py --prewarm       # same, with EXCELGPT_PREWARM=1
+    python bench/coldstart.py --budget 40     # override every budget (ms)
+
+Each case runs in a fresh ``python -S`` process that imports http.server
+first (the handler base class, a fixed cost of the platform), then times
+importing the endpoint module and serving one request in-process.  The
+median of ``import + first response`` is checked against the case's budget;
+any case over budget makes the run exit 1.  Budgets sit about 1.5-2x above
+quiet-machine medians so load on a shared runner does not fail the gate;
+tests/test_coldstart.py runs the same check under pytest.
+"""
+import argparse, json, os, statistics, subprocess, sys
+
+API = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+
+# endpoint, method, body → budget (ms) for handler import + first response
+CASES = [
+    ("audit_optimize",       "GET",  "",                                                           18),
+    ("audit_optimize",       "POST", '{"code":"Sub A()\\nFor i = 1 To 9\\nCells(i, 1) = i\\nNext\\nEnd Sub"}', 20),
+    ("flow_analyzer",        "GET",  "",                                                           15),
+    ("contextual_features",  "POST", '{"context":"refresh the pivot chart","type":"pivot"}',       20),
+    ("contextual_features",  "POST", '{"context":"refresh the pivot chart","rank":"bm25"}',        22),
+    ("hidden_features",      "POST", '{"topic":"charts"}',                                         15),
+    ("generate_boilerplate", "POST", '{"moduleName":"Report","moduleType":"sequence","steps":["Load"]}', 15),
+    ("project_analysis",     "GET",  "",                                                           25),
+    ("metrics",              "GET",  "",                                                           12),
+]
+
+# Runs in the child.  Only modules http.server already loaded are used here,
+# so nothing the endpoint imports lazily is preloaded by the harness.
+CHILD = r"""
+import sys, time, io
+t0 = time.perf_counter()
+import http.server, http.client, json
+t1 = time.perf_counter()
+sys.path.insert(0, {api!r})
+mod = __import__({name!r})
+t2 = time.perf_counter()
+body = {body!r}.encode()
+h = mod.handler.__new__(mod.handler)
+h.headers = http.client.parse_headers(io.BytesIO(
+    b"Content-Type: application/json\r\nContent-Length: %d\r\n\r\n" % len(body)))
+h.rfile, h.wfile = io.BytesIO(body), io.BytesIO()
+h.path, h.command, h.request_version = "/", {method!r}, "HTTP/1.1"
+h.requestline, h.client_address, h.close_connection = "", ("cold", 0), True
+h.log_message = lambda *a: None
+getattr(h, "do_" + {method!r})()
+t3 = time.perf_counter()
+status = int(h.wfile.getvalue().split(None, 2)[1])
+print(json.dumps({{"base": t1 - t0, "import": t2 - t1, "first": t3 - t2, "status": status,
+                  "modules": len(sys.modules)}}))
+"""
+
+def measure(name, method, body, env):
+    src = CHILD.format(api=os.path.abspath(API), name=name, method=method, body=body)
+    out = subprocess.run([sys.executable, "-S", "-c", src], env=env, check=True,
+                         capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+def child_env(prewarm=False):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="")
+    env.pop("EXCELGPT_PREWARM", None)
+    if prewarm:
+        env["EXCELGPT_PREWARM"] = "1"
+    return env
+
+def run_case(name, method, body, env, runs=5):
+    """Median ms {base, import, first, total} and the child's module count; exits on an HTTP error."""
+    measure(name, method, body, env)                  # compile .pyc files outside the timing
+    results = [measure(name, method, body, env) for _ in range(runs)]
+    if any(r["status"] >= 400 for r in results):
+        sys.exit(f"{name} {method}: HTTP {results[0]['status']}")
+    med = {k: statistics.median(r[k] for r in results) * 1e3 for k in ("base", "import", "first")}
+    med["total"] = med["import"] + med["first"]
+    return med, results[0]["modules"]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--runs", type=int, default=5, help="fresh interpreters per case")
+    ap.add_argument("--prewarm", action="store_true", help="set EXCELGPT_PREWARM=1 in the children")
+    ap.add_argument("--budget", type=float, default=0, help="override every budget (ms)")
+    args = ap.parse_args()
+
+    env  = child_env(args.prewarm)
+    over = []
+    for name, method, body, budget in CASES:
+        budget     = args.budget or budget
+        med, nmods = run_case(name, method, body, env, args.runs)
+        total      = med["total"]
+        flag       = "OVER" if total > budget else "ok"
+        print(f"{name:21s} {method:4s}  http.server {med['base']:6.1f} ms | import {med['import']:6.1f} ms"
+              f" + first {med['first']:6.1f} ms = {total:6.1f} ms  (budget {budget:g}, "
+              f"{nmods} modules)  {flag}")
+        if total > budget:
+            over.append(f"{name} {method}: {total:.1f} ms > {budget:g} ms")
+    if over:
+        print("\nOVER BUDGET:\n  " + "\n  ".join(over), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Benchmark: contextual_features keyword index vs. the original linear scan,
+plus BM25 top-k latency and index cold start (build vs. snapshot load).
+
+    python bench/contextual_matcher.py --scenarios 50000 --queries 2000
+
+At 50k scenarios building the keyword and BM25 indexes takes ~1.1 s and
+~3.1 s; loading their snapshots ~45 ms and ~30 ms.  The keyword regex
+still compiles on the first query (~0.7 s).
+"""
+import argparse, os, random, re, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+sys.path.insert(0, os.path.dirname(__file__))
+import corpus  # noqa: E402
+from _catalog import Catalog, _read_index, _write_index  # noqa: E402
+from contextual_features import INDEX_VERSION, BM25Index, KeywordIndex, _normalize  # noqa: E402
+
+WORDS = corpus.WORDS
+
+def make_catalog(n, seed=0):
+    return corpus.catalog(n, seed)["scenarios"]
+
+def make_queries(n, seed=1, miss=False):
+    """Random contexts; ``miss`` ones share no keyword, forcing the full fallback scan."""
+    rnd   = random.Random(seed)
+    words = [w.upper()[::-1] for w in WORDS] if miss else WORDS
+    return [_normalize(" ".join(rnd.choice(words) + str(rnd.randrange(97)) for _ in range(rnd.randrange(5, 40))))
+            for _ in range(n)]
+
+def legacy(scenarios, ctx, stype):
+    """The pre-index algorithm: scan the topic, then every topic."""
+    matches = [rec for rec in scenarios.get(stype, []) if any(k in ctx for k in rec["match"])]
+    if not matches:
+        for rules in scenarios.values():
+            for rec in rules:
+                if any(k in ctx for k in rec["match"]):
+                    matches.append(rec)
+                    break
+            if matches: break
+    return matches
+
+def timed(fn, queries):
+    t0 = time.perf_counter()
+    out = [fn(q) for q in queries]
+    return (time.perf_counter() - t0) / len(queries) * 1e6, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenarios", type=int, default=5000)
+    ap.add_argument("--queries", type=int, default=1000)
+    args = ap.parse_args()
+
+    catalog = make_catalog(args.scenarios)
+    t0      = time.perf_counter()
+    index   = KeywordIndex(catalog, {})
+    index.hits("")                                   # compiles the keyword regex
+    build   = (time.perf_counter() - t0) * 1e3
+    print(f"catalog={args.scenarios} queries={args.queries} index build={build:.1f} ms")
+
+    def indexed(q):
+        found = index.hits(q)
+        return index.rank(found, "topic7") or index.rank(found)
+
+    for label, miss in (("hits", False), ("misses", True)):
+        queries     = make_queries(args.queries, miss=miss)
+        us_old, old = timed(lambda q: legacy(catalog, q, "topic7"), queries)
+        us_new, new = timed(indexed, queries)
+        # every legacy hit is also found (ordering differs by design)
+        agree = sum({id(r) for r in a} <= {id(r) for r in b} for a, b in zip(old, new))
+        print(f"[{label}] legacy scan : {us_old:10.1f} us/query")
+        print(f"[{label}] keyword idx : {us_new:10.1f} us/query  ({us_old / max(us_new, 1e-9):.1f}x)"
+              f"  agree={agree}/{len(queries)}")
+
+    t0   = time.perf_counter()
+    bm25 = BM25Index(catalog)
+    print(f"bm25 build={(time.perf_counter() - t0) * 1e3:.1f} ms")
+    queries = make_queries(args.queries)
+    us_all, _ = timed(lambda q: bm25.top(q, 5), queries)
+    us_top, _ = timed(lambda q: bm25.top(q, 5, "topic7"), queries)
+    print(f"[bm25] all topics : {us_all:10.1f} us/query")
+    print(f"[bm25] one topic  : {us_top:10.1f} us/query")
+
+    # cold start: what a fresh process pays for each index
+    with tempfile.TemporaryDirectory() as tmp:
+        cat = Catalog({"scenarios": catalog}, (0, 0), os.path.join(tmp, "catalog.json"))
+        for name, build in (("keywords", lambda c: KeywordIndex(c.scenarios, c.hints)),
+                            ("bm25", lambda c: BM25Index(c.scenarios))):
+            t0    = time.perf_counter()
+            built = build(cat)
+            t1    = time.perf_counter()
+            _write_index(cat, name, INDEX_VERSION, built)
+            t2    = time.perf_counter()
+            _read_index(cat, name, INDEX_VERSION)
+            t3    = time.perf_counter()
+            size  = os.path.getsize(os.path.join(tmp, f"catalog.json.{name}.pickle")) >> 10
+            print(f"[cold {name:8}] build {(t1 - t0) * 1e3:8.1f} ms  snapshot write {(t2 - t1) * 1e3:8.1f} ms"
+                  f"  load {(t3 - t2) * 1e3:8.1f} ms  ({size} KiB)")
+        re.purge()
+        t0 = time.perf_counter()
+        _read_index(cat, "keywords", INDEX_VERSION).hits("")
+        print(f"[cold keywords] load + first query {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Deterministic synthetic VBA corpus for the benchmarks.
+
+    python bench/corpus.py --modules 200 --lines 500 -o project.zip
+
+Every module is a run of procedures built from a fixed set of shapes that
+exercise the audit rules and the flow parser: nested For loops writing
+``Cells(...)``, ``On Error`` blocks, Select/Activate, recordset loops,
+Dictionary use and calls.  Procedure *k* of module *m* calls procedure
+*k+1* (and the first procedure of module *m+1*), so projects contain call
+chains as deep as the project is large.  The same (seed, sizes) always
+produce byte-identical output.
+"""
+import argparse, io, random, zipfile
+
+def _proc_name(m, k):
+    return f"M{m}_Proc{k}"
+
+def _body(rnd, m, k, last):
+    """A list of VBA lines for one procedure body."""
+    out  = []
+    nxt  = _proc_name(m, k + 1) if not last else None
+    shape = rnd.randrange(6)
+    if shape == 0:
+        out += ["    Dim i As Long, j As Long",
+                f"    For i = 1 To {rnd.randrange(10, 5000)}",
+                f"        For j = 1 To {rnd.randrange(2, 40)}",
+                "            Cells(i, j).Value = i * j",
+                "        Next j",
+                "    Next i"]
+    elif shape == 1:
+        out += ["    On Error GoTo ErrHandler",
+                f'    Range("A{rnd.randrange(1, 99)}").Select',
+                "    Selection.Value = Application.WorksheetFunction.Sum(Range(\"B1:B100\"))",
+                "    Exit Sub",
+                "ErrHandler:",
+                '    MsgBox Err.Description']
+    elif shape == 2:
+        out += ["    On Error Resume Next",
+                "    Dim rs As Object",
+                '    Set rs = CreateObject("ADODB.Recordset")',
+                "    Do While Not rs.EOF",
+                "        Cells(rs.AbsolutePosition, 1) = rs.Fields(0).Value",
+                "        rs.MoveNext",
+                "    Loop"]
+    elif shape == 3:
+        out += ['    Dim d As Object',
+                '    Set d = CreateObject("Scripting.Dictionary")',
+                "    Dim v As Variant",
+                "    v = Application.VLookup(1, Range(\"A1:C100\"), 2, False)",
+                "    DoEvents()",
+                "    Application.Calculate"]
+    elif shape == 4:
+        out += ["    Application.ScreenUpdating = False",
+                f"    Sheets(\"Data{rnd.randrange(9)}\").Activate",
+                "    ActiveSheet.Range(\"A1\").Value = Now",
+                "    Application.ScreenUpdating = True"]
+    else:
+        out += [f"    ' plain arithmetic {rnd.random():.6f}",
+                "    Dim total As Double",
+                f"    total = total + {rnd.randrange(1000)}"]
+    if nxt:
+        out.append(f"    Call {nxt}")
+    return out
+
+def module(m, lines, modules=1, seed=0):
+    """One module of roughly ``lines`` lines; calls chain into module m+1."""
+    rnd   = random.Random(seed * 1_000_003 + m)
+    out   = ["Attribute VB_Name = \"Module%d\"" % m, "Option Explicit", ""]
+    k     = 0
+    while len(out) < lines:
+        kind = "Function" if rnd.random() < 0.2 else "Sub"
+        scope = "Private " if rnd.random() < 0.3 else "Public "
+        out.append(f"{scope}{kind} {_proc_name(m, k)}()")
+        body = _body(rnd, m, k, last=len(out) + 12 >= lines)
+        if k == 0 and m + 1 < modules:
+            body.append(f"    Call {_proc_name(m + 1, 0)}")
+        out += body
+        out += [f"End {kind}", ""]
+        k += 1
+    return "\n".join(out) + "\n"
+
+def project(modules, lines, seed=0):
+    """``modules`` modules of ``lines`` lines each, as [(filename, text)]."""
+    return [(f"src/Module{m}.bas", module(m, lines, modules, seed)) for m in range(modules)]
+
+def project_zip(modules, lines, seed=0):
+    """The project packed as ZIP bytes (deflated, like a real export)."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, text in project(modules, lines, seed):
+            zf.writestr(name, text)
+    return buf.getvalue()
+
+WORDS = ("pivot chart userform loop range cell sheet table field formula export "
+         "calendar date event dictionary recalc screen flicker array filter sort "
+         "lookup query power refresh slicer ribbon addin macro module class").split()
+
+def catalog(scenarios, seed=0):
+    """A contextual_features catalog (data/catalog.json layout) of ``scenarios`` records."""
+    rnd    = random.Random(seed)
+    topics = {}
+    for i in range(scenarios):
+        kws = {" ".join(rnd.sample(WORDS, rnd.choice((1, 1, 2)))) + str(i % 97) for _ in range(4)}
+        topics.setdefault(f"topic{i % 50}", []).append(
+            {"match": sorted(kws), "title": f"Scenario {i} " + " ".join(rnd.sample(WORDS, 3)),
+             "description": " ".join(rnd.sample(WORDS, 8)), "reference": None, "tip": None})
+    gems = {f"topic{t}": [f"Gem {t}.{g} " + " ".join(rnd.sample(WORDS, 4)) for g in range(20)]
+            for t in range(50)}
+    return {"version": 1, "scenarios": topics, "genericHints": {w: f"Hint about {w}" for w in WORDS},
+            "gems": gems}
+
+def queries(n, seed=1):
+    """Free-text contexts of 5–40 words, most sharing keywords with catalog()."""
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(WORDS) + str(rnd.randrange(97)) for _ in range(rnd.randrange(5, 40)))
+            for _ in range(n)]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--modules", type=int, default=10)
+    ap.add_argument("--lines", type=int, default=500, help="lines per module")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("-o", "--output", default="corpus.zip")
+    args = ap.parse_args()
+    data = project_zip(args.modules, args.lines, args.seed)
+    with open(args.output, "wb") as fh:
+        fh.write(data)
+    print(f"{args.output}: {args.modules} modules x {args.lines} lines, {len(data)} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Endpoint benchmark suite: drives every handler in-process on a synthetic corpus.
+
+    python bench/endpoints.py                      # small preset, compare to baseline
+    python bench/endpoints.py --preset large       # up to 1M lines / 5,000 modules
+    python bench/endpoints.py --save-baseline      # record this machine's numbers
+    python bench/endpoints.py --only flow          # scenarios whose name contains "flow"
+
+Each scenario runs ``--repeat`` timed requests (after one warm-up), then one
+more under tracemalloc for peak memory.  Reported: p50/p99 latency,
+throughput (source lines/s for code endpoints, requests/s otherwise) and
+peak MiB.  Results are compared with bench/baseline.json (keyed by preset
+and scenario); a p50 or peak-memory regression beyond ``--tolerance`` makes
+the run exit 1.  Baselines are machine-specific: re-record them with
+--save-baseline on the machine that runs the comparison.
+"""
+import argparse, base64, http.client, io, json, os, statistics, sys, tempfile, time, tracemalloc
+
+HERE     = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "baseline.json")
+sys.path.insert(0, HERE)
+import corpus  # noqa: E402
+
+#   audit: lines in one module; flow: (modules, lines/module); catalog: scenarios
+PRESETS = {
+    "small":  {"audit": 100,     "batch": (20, 200),   "flow": (10, 100),    "catalog": 1_000,   "queries": 200},
+    "medium": {"audit": 10_000,  "batch": (200, 500),  "flow": (200, 500),   "catalog": 20_000,  "queries": 1_000},
+    "large":  {"audit": 100_000, "batch": (1000, 200), "flow": (5000, 200),  "catalog": 100_000, "queries": 2_000},
+}
+
+# ----------------------------------------------------------------
+# In-process driver
+# ----------------------------------------------------------------
+class _Sink:
+    """wfile stand-in: keeps the status line, counts the rest."""
+
+    def __init__(self):
+        self.head, self.size = b"", 0
+
+    def write(self, data):
+        if len(self.head) < 16:
+            self.head += bytes(data[:16])
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    closed = False
+
+def drive(mod, body=b"", content_type="application/json", path="/", method="POST"):
+    """Run one request through ``mod.handler``; returns (status, response bytes)."""
+    cls = mod.handler
+    h   = cls.__new__(cls)
+    raw = f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+    h.headers          = http.client.parse_headers(io.BytesIO(raw))
+    h.rfile            = io.BytesIO(body)
+    h.wfile            = _Sink()
+    h.path             = path
+    h.command          = method
+    h.request_version  = h.protocol_version = "HTTP/1.1"
+    h.requestline      = f"{method} {path} HTTP/1.1"
+    h.client_address   = ("bench", 0)
+    h.close_connection = True
+    h.log_message      = lambda *a: None
+    getattr(h, "do_" + method)()
+    return int(h.wfile.head.split()[1]), h.wfile.size
+
+# ----------------------------------------------------------------
+# Scenarios: name → (module, [request bodies], content type, path, lines per request)
+# ----------------------------------------------------------------
+def scenarios(preset, workdir):
+    p = PRESETS[preset]
+    # the catalog must be in place before contextual/hidden features import _catalog
+    cat = os.path.join(workdir, "catalog.json")
+    with open(cat, "w", encoding="utf-8") as fh:
+        json.dump(corpus.catalog(p["catalog"]), fh)
+    os.environ["EXCELGPT_CATALOG"]      = cat
+    os.environ["EXCELGPT_SNAPSHOT_DIR"] = workdir
+    sys.path.insert(0, os.path.join(HERE, "..", "api"))
+    import audit_optimize, contextual_features, flow_analyzer, generate_boilerplate, hidden_features, project_analysis
+    from _http import RESULTS
+
+    code          = corpus.module(0, p["audit"])
+    bmods, blines = p["batch"]
+    fmods, flines = p["flow"]
+    batch         = json.dumps({"modules": [{"name": n, "code": t} for n, t in corpus.project(bmods, blines)],
+                                "includeAnnotatedCode": False}).encode()
+    flow_zip      = corpus.project_zip(fmods, flines)
+    ctx           = [json.dumps({"context": q, "type": "topic7"}).encode() for q in corpus.queries(p["queries"])]
+    ctx_bm25      = [json.dumps({"context": q, "rank": "bm25"}).encode() for q in corpus.queries(p["queries"])]
+    gems          = [json.dumps({"topic": f"topic{i % 60}"}).encode() for i in range(p["queries"])]
+    boiler        = [json.dumps({"moduleName": f"Mod{i}", "moduleType": t, "steps": ["Load data", "Build report"],
+                                 "includeDebugPrint": True}).encode()
+                     for i, t in enumerate(("helper", "sequence", "error", "events", "settings") * 40)]
+    boiler_zip    = json.dumps({"modules": [json.loads(b) for b in boiler[:40]],
+                                "generatedAt": "2026-01-01T00:00:00Z"}).encode()
+    json_t, zip_t = "application/json", "application/zip"
+
+    def flow_cold():
+        flow_analyzer.PARTIALS.clear()
+
+    def uncached():                      # measure the computation, not the shared result cache
+        RESULTS.clear()
+
+    return flow_analyzer, {
+        "audit_single":        (audit_optimize, [json.dumps({"code": code}).encode()], json_t, "/", p["audit"], uncached),
+        "audit_single_cached": (audit_optimize, [json.dumps({"code": code}).encode()], json_t, "/", p["audit"], None),
+        "audit_batch_ndjson":  (audit_optimize, [batch], json_t, "/", bmods * blines, None),
+        "flow_zip_cold":       (flow_analyzer, [flow_zip], zip_t, "/", fmods * flines, flow_cold),
+        "flow_zip_warm":       (flow_analyzer, [flow_zip], zip_t, "/", fmods * flines, None),
+        "flow_zip_b64":        (flow_analyzer, [json.dumps({"zipBase64": base64.b64encode(flow_zip).decode()}).encode()],
+                                json_t, "/", fmods * flines, None),
+        "project_zip":         (project_analysis, [flow_zip], zip_t, "/", fmods * flines, None),
+        "contextual_keywords": (contextual_features, ctx, json_t, "/", 0, uncached),
+        "contextual_bm25":     (contextual_features, ctx_bm25, json_t, "/", 0, uncached),
+        "hidden_features":     (hidden_features, gems, json_t, "/", 0, uncached),
+        "boilerplate":         (generate_boilerplate, boiler, json_t, "/", 0, None),
+        "boilerplate_zip":     (generate_boilerplate, [boiler_zip], json_t, "/", 0, None),
+    }
+
+# ----------------------------------------------------------------
+# Measurement
+# ----------------------------------------------------------------
+def _pct(samples, q):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+def run(mod, bodies, ctype, path, lines, before, repeat):
+    """Time ``repeat`` passes over ``bodies``; one extra traced pass for peak memory."""
+    def once(body):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        status, _ = drive(mod, body, ctype, path)
+        if status != 200:
+            raise SystemExit(f"{mod.__name__}: HTTP {status}")
+        return time.perf_counter() - t0
+
+    once(bodies[0])                                   # warm-up (imports, indexes, pool)
+    lat = [once(b) for _ in range(repeat) for b in bodies]
+    tracemalloc.start()
+    once(bodies[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    total = sum(lat)
+    return {
+        "requests":   len(lat),
+        "p50_ms":     round(statistics.median(lat) * 1e3, 3),
+        "p99_ms":     round(_pct(lat, 0.99) * 1e3, 3),
+        "throughput": round((lines * len(lat) if lines else len(lat)) / total, 1),
+        "unit":       "lines/s" if lines else "req/s",
+        "peak_mib":   round(peak / 2**20, 2),
+    }
+
+def compare(preset, results, tolerance):
+    """Regressions against the stored baseline, as printable strings."""
+    try:
+        with open(BASELINE, encoding="utf-8") as fh:
+            base = json.load(fh).get(preset, {})
+    except FileNotFoundError:
+        return None
+    bad = []
+    for name, r in results.items():
+        ref = base.get(name)
+        if not ref:
+            continue
+        for metric in ("p50_ms", "peak_mib"):
+            limit = ref[metric] * (1 + tolerance)
+            # sub-millisecond / sub-MiB figures are noise-dominated; give them an absolute floor
+            if r[metric] > max(limit, ref[metric] + 0.5):
+                bad.append(f"{name}: {metric} {r[metric]} > baseline {ref[metric]} (+{tolerance:.0%})")
+    return bad
+
+def save_baseline(preset, results):
+    try:
+        with open(BASELINE, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        data = {}
+    data[preset] = {n: {"p50_ms": r["p50_ms"], "peak_mib": r["peak_mib"]} for n, r in results.items()}
+    with open(BASELINE, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--preset", choices=PRESETS, default="small")
+    ap.add_argument("--repeat", type=int, default=5, help="timed passes per scenario")
+    ap.add_argument("--only", default="", help="run scenarios whose name contains this")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed regression (0.25 = 25%%)")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        flow, table = scenarios(args.preset, workdir)
+        results = {}
+        try:
+            for name, (mod, bodies, ctype, path, lines, before) in table.items():
+                if args.only not in name:
+                    continue
+                results[name] = r = run(mod, bodies, ctype, path, lines, before, args.repeat)
+                if not args.json:
+                    print(f"{name:22s} p50 {r['p50_ms']:10.2f} ms  p99 {r['p99_ms']:10.2f} ms  "
+                          f"{r['throughput']:>12,.1f} {r['unit']:7s}  peak {r['peak_mib']:8.2f} MiB", flush=True)
+        finally:
+            if flow._pool is not None:
+                flow._pool.shutdown(cancel_futures=True)
+
+    if args.json:
+        print(json.dumps({args.preset: results}, indent=2))
+    if args.save_baseline:
+        save_baseline(args.preset, results)
+        print(f"baseline [{args.preset}] written to {os.path.relpath(BASELINE)}")
+        return 0
+    bad = compare(args.preset, results, args.tolerance)
+    if bad is None:
+        print("no baseline yet; record one with --save-baseline")
+        return 0
+    if bad:
+        print("\nREGRESSIONS:\n  " + "\n  ".join(bad), file=sys.stderr)
+        return 1
+    print(f"\nno regressions against baseline [{args.preset}] (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Self-hosting entry point: every api/*.py handler behind one HTTP/1.1 server.
+
+    python server.py --port 8000 --threads 32 --heavy-workers 4 --cpu-workers 8
+
+* HTTP/1.1 keep-alive (idle connections dropped after --keepalive seconds).
+  Body bytes a handler leaves unread are drained (up to DRAIN_MAX) before
+  the next request; past that the connection is closed.  A handler that
+  fails after its status line went out (a streamed 200) gets its
+  connection dropped instead of a 500 page inside the body.
+* A bounded connection pool: past --threads + --backlog connections the
+  server answers 503 straight from the accept loop.
+* CPU-heavy endpoints (--heavy, default flow_analyzer and project_analysis)
+  run in their own lane of --heavy-workers slots plus --heavy-queue
+  waiters, so a big ZIP upload gets a fast 503 instead of starving cheap
+  lookups like hidden_features.
+* --cpu-workers sizes flow_analyzer's process pool (FLOW_WORKERS).
+* SIGTERM / SIGINT stop accepting, let in-flight requests finish (up to
+  --drain seconds) and shut the process pool down.
+"""
+import argparse, importlib, logging, os, signal, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit
+
+API_DIR   = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api")
+ENDPOINTS = ("audit_optimize", "contextual_features", "flow_analyzer",
+             "generate_boilerplate", "hidden_features", "metrics", "project_analysis")
+log       = logging.getLogger("excelgpt")
+
+BUSY = (b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+        b"Retry-After: 1\r\nConnection: close\r\nContent-Length: 27\r\n\r\n"
+        b'{"error":"Server too busy"}')
+
+DRAIN_MAX = 64 * 1024   # unread request body discarded to keep a connection alive
+
+class Busy(Exception):
+    pass
+
+class Body:
+    """Request body reader that stops at Content-Length and knows what is left unread."""
+
+    def __init__(self, raw, length):
+        self.raw  = raw
+        try:
+            self.left = max(0, int(length or 0))
+        except ValueError:
+            self.left = 0
+        self.bad  = length is not None and not str(length).strip().isdigit()
+
+    def read(self, n=-1):
+        n    = self.left if n is None or n < 0 else min(n, self.left)
+        data = self.raw.read(n) if n else b""
+        self.left -= len(data)
+        if len(data) < n:
+            self.left = 0
+            self.bad  = True       # peer hung up mid-body
+        return data
+
+    def drain(self, limit):
+        """Discard the unread rest of the body; False when the connection cannot be reused."""
+        if self.bad or self.left > limit:
+            return False
+        while self.left:
+            self.read(min(self.left, 16 * 1024))
+        return not self.bad
+
+class Lane:
+    """``workers`` concurrent slots plus at most ``queue`` waiters; beyond that, Busy."""
+
+    def __init__(self, workers, queue):
+        self.slots    = threading.BoundedSemaphore(workers)
+        self.capacity = workers + queue
+        self.count    = 0
+        self.lock     = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            if self.count >= self.capacity:
+                raise Busy
+            self.count += 1
+        self.slots.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.slots.release()
+        with self.lock:
+            self.count -= 1
+
+class Router(BaseHTTPRequestHandler):
+    """Dispatches each request on a keep-alive connection to the endpoint's handler."""
+
+    protocol_version = "HTTP/1.1"
+    routes = {}         # name → handler class
+    lanes  = {}         # name → Lane (heavy endpoints only)
+
+    def _dispatch(self):
+        name = urlsplit(self.path).path.strip("/").removeprefix("api/").removesuffix(".py")
+        cls  = self.routes.get(name)
+        if cls is None:
+            self._discard()
+            return self.send_error(404, f"Unknown endpoint; try /api/{{{','.join(self.routes)}}}")
+        if not hasattr(cls, "do_" + self.command):
+            self._discard()
+            return self.send_error(405)
+        lane = self.lanes.get(name)
+        try:
+            if lane is None:
+                return self._run(cls)
+            with lane:
+                return self._run(cls)
+        except Busy:
+            self._discard()
+            self.close_connection = True
+            self.wfile.write(BUSY)
+
+    def _discard(self):
+        # closing on unread body bytes makes the kernel send RST, which can
+        # destroy a refusal the client has not read yet
+        Body(self.rfile, self.headers.get("Content-Length")).drain(DRAIN_MAX)
+
+    def _run(self, cls):
+        h = cls.__new__(cls)
+        h.__dict__.update(self.__dict__)
+        h.protocol_version = self.protocol_version
+        h.log_message      = self.log_message
+        h.rfile            = body = Body(self.rfile, self.headers.get("Content-Length"))
+        started            = []
+
+        def send_response(code, message=None, _send=h.send_response):
+            started.append(code)
+            _send(code, message)
+        h.send_response = send_response
+
+        try:
+            getattr(h, "do_" + self.command)()
+        except Exception:
+            log.exception("%s %s failed", self.command, self.path)
+            # once a status line is out (e.g. a streamed 200) the only honest
+            # signal left is dropping the connection mid-body
+            if not started and not h.wfile.closed:
+                try:
+                    h.send_error(500)
+                except OSError:
+                    pass
+            self.close_connection = True
+        finally:
+            self.close_connection = self.close_connection or h.close_connection
+            # unread body bytes would be parsed as the next request
+            if not self.close_connection and not body.drain(DRAIN_MAX):
+                self.close_connection = True
+
+    do_GET = do_POST = do_HEAD = _dispatch
+
+    def log_message(self, fmt, *args):
+        log.info("%s - %s", self.address_string(), fmt % args)
+
+class Server(HTTPServer):
+    """HTTPServer whose connections run on a bounded thread pool."""
+
+    allow_reuse_address = True
+    daemon_threads      = True
+
+    def __init__(self, addr, threads, backlog):
+        super().__init__(addr, Router)
+        self.pool    = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="conn")
+        self.pending = threading.BoundedSemaphore(threads + backlog)
+
+    def process_request(self, request, client_address):
+        if not self.pending.acquire(blocking=False):
+            try:
+                request.sendall(BUSY)
+            except OSError:
+                pass
+            return self.shutdown_request(request)
+        self.pool.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.pending.release()
+
+def build(args):
+    if args.cpu_workers:
+        os.environ["FLOW_WORKERS"] = str(args.cpu_workers)
+    # long-lived process: build catalog indexes now rather than on the first request
+    os.environ.setdefault("EXCELGPT_PREWARM", "1")
+    sys.path.insert(0, API_DIR)
+    Router.routes  = {n: importlib.import_module(n).handler for n in ENDPOINTS}
+    Router.lanes   = {n: Lane(args.heavy_workers, args.heavy_queue) for n in args.heavy}
+    Router.timeout = args.keepalive
+    return Server((args.host, args.port), args.threads, args.backlog)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    ap.add_argument("--threads", type=int, default=32, help="connection worker threads")
+    ap.add_argument("--backlog", type=int, default=64, help="connections queued beyond --threads")
+    ap.add_argument("--keepalive", type=float, default=5.0, help="idle keep-alive timeout (s)")
+    ap.add_argument("--heavy", nargs="*", default=["flow_analyzer", "project_analysis"], choices=ENDPOINTS)
+    ap.add_argument("--heavy-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    ap.add_argument("--heavy-queue", type=int, default=4)
+    ap.add_argument("--cpu-workers", type=int, default=0, help="flow_analyzer process pool size")
+    ap.add_argument("--drain", type=float, default=30.0, help="graceful shutdown budget (s)")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    server = build(args)
+
+    def stop(signum, _frame):
+        log.info("signal %s: draining", signum)
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    log.info("serving %s on http://%s:%d", ", ".join(Router.routes), args.host, args.port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        done = threading.Thread(target=server.pool.shutdown, kwargs={"wait": True}, daemon=True)
+        done.start()
+        done.join(args.drain)
+        flow = sys.modules.get("flow_analyzer")
+        if flow is not None and flow._pool is not None:
+            flow._pool.shutdown(wait=False, cancel_futures=True)
+        log.info("stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import gzip, http.client, io, os, sys
+
+import pytest
+
+# the handlers import their helpers as top-level modules (Vercel runs api/ as the root)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+class Response:
+    """A parsed in-process response: status, headers and the (de-chunked, gunzipped) body."""
+
+    def __init__(self, raw):
+        head, _, body = raw.partition(b"\r\n\r\n")
+        status, _, rest = head.partition(b"\r\n")
+        self.raw     = raw
+        self.status  = int(status.split()[1])
+        self.headers = http.client.parse_headers(io.BytesIO(rest + b"\r\n\r\n"))
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = self._dechunk(body)
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        self.body = body
+
+    @staticmethod
+    def _dechunk(data):
+        out = bytearray()
+        while True:
+            size, _, data = data.partition(b"\r\n")
+            n = int(size, 16)
+            if not n:
+                return bytes(out)
+            out += data[:n]
+            data = data[n + 2:]
+
+def drive(mod, body=b"", headers=None, path="/", method="POST"):
+    """Run one request through ``mod.handler`` without a socket; returns a Response."""
+    cls  = mod.handler
+    h    = cls.__new__(cls)
+    head = {"Content-Type": "application/json", "Content-Length": str(len(body)), **(headers or {})}
+    raw  = "".join(f"{k}: {v}\r\n" for k, v in head.items()) + "\r\n"
+    h.headers          = http.client.parse_headers(io.BytesIO(raw.encode()))
+    h.rfile            = io.BytesIO(body)
+    h.wfile            = io.BytesIO()
+    h.path             = path
+    h.command          = method
+    h.request_version  = h.protocol_version = "HTTP/1.1"
+    h.requestline      = f"{method} {path} HTTP/1.1"
+    h.client_address   = ("test", 0)
+    h.close_connection = True
+    h.log_message      = lambda *a: None
+    getattr(h, "do_" + method)()
+    return Response(h.wfile.getvalue())
+
+@pytest.fixture(name="drive")
+def drive_fixture():
+    return drive
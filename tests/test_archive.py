@@ -0,0 +1,138 @@
+import base64, io, json, zipfile
+
+import pytest
+
+import _archive
+from _archive import ArchiveLimitError, Limits, check_zip, iter_modules, spool_base64_field, spool_base64_text, spool_body
+
+PAYLOAD = bytes(range(256)) * 3 + b"\xff\xfe"          # 770 bytes: base64 ends in "=="
+
+def body(encoded, field="zipBase64", before='{"name": "x.zip", '):
+    return (before + f'"{field}": "{encoded}"' + ', "tail": 1}').encode()
+
+def decode(raw, field="zipBase64", limits=_archive.LIMITS):
+    return spool_base64_field(io.BytesIO(raw), len(raw), field, limits).read()
+
+@pytest.fixture(params=[1, 2, 3, 5, 7, 64])
+def chunk(request, monkeypatch):
+    """Run with tiny read chunks so every escape, key and quote lands on a boundary."""
+    monkeypatch.setattr(_archive, "CHUNK", request.param)
+    return request.param
+
+# ----------------------------------------------------------------
+# spool_base64_field
+# ----------------------------------------------------------------
+def test_plain_value(chunk):
+    assert decode(body(base64.b64encode(PAYLOAD).decode())) == PAYLOAD
+
+def test_json_escapes_split_across_chunks(chunk):
+    b64 = base64.encodebytes(PAYLOAD).decode()                 # MIME style: a "\n" every 76 chars
+    raw = json.dumps({"pad": "p" * chunk, "zipBase64": b64}).encode()
+    assert b"\\n" in raw
+    assert decode(raw) == PAYLOAD
+    assert decode(raw.replace(b"/", b"\\/")) == PAYLOAD        # "\/" is a legal JSON escape
+    assert decode(raw.replace(b"\\n", b"\\r\\n")) == PAYLOAD
+
+def test_key_split_across_chunks_and_whitespace(chunk):
+    raw = b'{\n  "other": "zipBase64",\n  "zipBase64"  :\t"' + base64.b64encode(PAYLOAD) + b'"\n}'
+    assert decode(raw) == PAYLOAD
+
+def test_unpadded_value(chunk):
+    assert decode(body(base64.b64encode(PAYLOAD).decode().rstrip("="))) == PAYLOAD
+
+def test_only_the_top_level_key_counts(chunk):
+    decoy = base64.b64encode(b"decoy").decode()
+    raw   = json.dumps({"note": f'say "zipBase64": "{decoy}" \\ and "',
+                        "zipBase64Old": decoy,
+                        "nested": {"zipBase64": decoy, "list": [{"zipBase64": decoy}, "zipBase64"]},
+                        "label": "zipBase64",
+                        "zipBase64": base64.b64encode(PAYLOAD).decode()}).encode()
+    assert decode(raw) == PAYLOAD
+
+def test_field_far_into_the_body(chunk):
+    raw = json.dumps({"pad": "x\\\"" * (16 * 1024), "zipBase64": base64.b64encode(PAYLOAD).decode()})
+    assert decode(raw.encode()) == PAYLOAD
+
+def test_escaped_key():
+    assert decode(b'{"zip\\u0042ase64": "' + base64.b64encode(PAYLOAD) + b'"}') == PAYLOAD
+
+@pytest.mark.parametrize("raw", [
+    b'{"modules": []}',
+    b'{"zipBase64": 1}',
+    b'{"zipBase64": {"zipBase64": "AAAA"}}',
+    b'{"a": {"zipBase64": "AAAA"}}',
+    b'["zipBase64", "AAAA"]',
+    b'[{"zipBase64": "AAAA"}]',
+    b'{"a": "\\"zipBase64\\": \\"AAAA"}',
+], ids=["absent", "not-a-string", "object-value", "nested", "array", "in-array", "in-a-string"])
+def test_missing_field(raw):
+    with pytest.raises(ValueError, match="Missing 'zipBase64'"):
+        decode(raw)
+
+def test_bad_base64(chunk):
+    with pytest.raises(ValueError, match="Bad base64"):
+        decode(body("QUJDR"))                                   # one dangling sextet
+
+def test_upload_limit():
+    raw = body("AAAA")
+    with pytest.raises(ArchiveLimitError):
+        decode(raw, limits=Limits(max_upload=len(raw) - 1))
+
+# ----------------------------------------------------------------
+# spool_base64_text
+# ----------------------------------------------------------------
+def test_base64_text_across_chunks(chunk):
+    text = json.loads(json.dumps(base64.encodebytes(PAYLOAD).decode()))      # "\n" already unescaped
+    assert spool_base64_text(text, "zipBase64").read() == PAYLOAD
+    assert spool_base64_text(text.replace("=", ""), "zipBase64").read() == PAYLOAD
+
+def test_base64_text_rejects_bad_input(chunk):
+    with pytest.raises(ValueError, match="Bad base64 in 'zipBase64'"):
+        spool_base64_text("QUJDR", "zipBase64")
+
+# ----------------------------------------------------------------
+# spool_body
+# ----------------------------------------------------------------
+def test_spool_body_rolls_over_to_disk(chunk):
+    data = PAYLOAD * 4
+    out  = spool_body(io.BytesIO(data + b"trailing"), len(data), Limits(spool_bytes=100))
+    assert out._rolled and out.read() == data
+
+def test_spool_body_stops_at_short_body():
+    assert spool_body(io.BytesIO(b"abc"), 10).read() == b"abc"
+
+def test_spool_body_limit():
+    with pytest.raises(ArchiveLimitError, match="Upload exceeds 2 bytes"):
+        spool_body(io.BytesIO(b"abc"), 3, Limits(max_upload=2))
+
+# ----------------------------------------------------------------
+# check_zip / iter_modules
+# ----------------------------------------------------------------
+def make_zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return zipfile.ZipFile(io.BytesIO(buf.getvalue()))
+
+@pytest.mark.parametrize("members, limits, message", [
+    ({f"m{i}.bas": b"x" for i in range(4)}, Limits(max_members=3), "more than 3 members"),
+    ({"big.bas": b"\0" * (4 * _archive.CHUNK)}, Limits(), "compression ratio in big.bas"),
+    ({"a.bas": b"a" * 600, "b.bas": b"b" * 600}, Limits(max_total=1000), "expands beyond 1000"),
+])
+def test_check_zip_limits(members, limits, message):
+    with pytest.raises(ArchiveLimitError, match=message):
+        check_zip(make_zip(members), limits)
+
+def test_check_zip_allows_small_compressible_members():
+    check_zip(make_zip({"a.bas": b"\0" * 1000}), Limits(max_ratio=2))
+
+def test_iter_modules_filters_and_decodes():
+    zf = make_zip({"src/Module1.bas": "Sub A()\nEnd Sub\n".encode(), "readme.txt": b"x",
+                   "Sheet1.CLS": b"Sub \xffB()", "UserForm1.frx": b"\0"})
+    assert list(iter_modules(zf)) == [("src/Module1.bas", "Sub A()\nEnd Sub\n"), ("Sheet1.CLS", "Sub B()")]
+
+def test_iter_modules_checks_limits_on_first_next():
+    modules = iter_modules(make_zip({"a.bas": b"a", "b.bas": b"b"}), limits=Limits(max_members=1))
+    with pytest.raises(ArchiveLimitError):
+        next(modules)
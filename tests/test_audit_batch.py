@@ -0,0 +1,42 @@
+import base64, io, json, zipfile
+
+import pytest
+
+import _archive
+import audit_optimize
+
+def zipped(modules):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, text in modules.items():
+            zf.writestr(name, text)
+    return base64.b64encode(buf.getvalue()).decode()
+
+def records(resp):
+    return [json.loads(line) for line in resp.body.splitlines()]
+
+MODULE = "Sub A()\n    Range(\"A1\").Select\nEnd Sub\n"
+
+def test_zip_base64_uses_the_parsed_top_level_field(drive):
+    decoy = zipped({"src/Decoy.bas": "Sub D()\nEnd Sub\n"})
+    body  = {"pad": "x" * (100 * 1024),                                 # field starts past 64 KiB
+             "note": '"zipBase64": "' + decoy + '"',
+             "options": {"zipBase64": decoy},
+             "includeAnnotatedCode": False,
+             "zipBase64": zipped({"src/Real.bas": MODULE})}
+    resp  = drive(audit_optimize, json.dumps(body).encode())
+    assert resp.status == 200 and resp.headers["Content-Type"] == "application/x-ndjson"
+    (rec,) = records(resp)
+    assert rec["module"] == "src/Real.bas"
+    assert [f["line"] for f in rec["findings"]] == [2] and "annotatedCode" not in rec
+
+@pytest.mark.parametrize("value", [1, None, ["AAAA"], "QUJDR"])
+def test_zip_base64_must_be_a_base64_string(drive, value):
+    resp = drive(audit_optimize, json.dumps({"zipBase64": value}).encode())
+    assert resp.status == 400 and json.loads(resp.body) == {"error": "Invalid JSON with 'zipBase64'"}
+
+def test_json_body_is_bounded_before_it_is_read(drive, monkeypatch):
+    body = json.dumps({"modules": [{"name": "A", "code": MODULE}] * 4}).encode()
+    monkeypatch.setattr(_archive.LIMITS, "max_upload", len(body) - 1)
+    resp = drive(audit_optimize, body)
+    assert resp.status == 413 and "exceeds" in json.loads(resp.body)["error"]
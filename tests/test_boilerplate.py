@@ -0,0 +1,55 @@
+import io, json, zipfile
+
+import pytest
+
+import generate_boilerplate
+
+def post(drive, obj):
+    return drive(generate_boilerplate, json.dumps(obj).encode())
+
+@pytest.mark.parametrize("spec, message", [
+    ({"moduleName": "A", "moduleType": 5}, "A: moduleType must be a str"),
+    ({"moduleName": "A", "moduleType": "sequence", "steps": [1]}, "A: steps must be a list of strings"),
+    ({"moduleName": "A", "steps": "Load"}, "A: steps must be a list of strings"),
+    ({"moduleName": "A", "headerComment": ["x"]}, "A: headerComment must be a str"),
+    ({"moduleName": "A", "includeDebugPrint": "yes"}, "A: includeDebugPrint must be a bool"),
+    ({"moduleName": "A", "includeErrorHandler": 1}, "A: includeErrorHandler must be a bool"),
+    ({"moduleName": "1A"}, "not a valid VBA module name"),
+])
+def test_bad_spec_is_a_400_before_the_zip_starts(drive, spec, message):
+    resp = post(drive, {"modules": [{"moduleName": "Ok"}, spec]})
+    assert resp.status == 400
+    assert message in json.loads(resp.body)["error"]
+
+def test_clashing_names_are_a_400(drive):
+    resp = post(drive, {"modules": [{"moduleName": "A"}, {"moduleName": "a", "moduleType": "error"}]})
+    assert resp.status == 400 and "two different specs" in json.loads(resp.body)["error"]
+
+def test_batch_zip(drive):
+    specs = [{"moduleName": "Report", "moduleType": "sequence", "steps": ["Load data", "Build"],
+              "headerComment": "Nightly", "includeDebugPrint": True},
+             {"moduleName": "Errors", "moduleType": "error"},
+             {"moduleName": "Report", "moduleType": "sequence", "steps": ["Load data", "Build"],
+              "headerComment": "Nightly", "includeDebugPrint": True}]          # identical duplicate: dropped
+    body = {"modules": specs, "generatedAt": "2026-01-02T03:04:00Z"}
+    resp = post(drive, body)
+    assert resp.status == 200 and resp.headers["Content-Type"] == "application/zip"
+    zf   = zipfile.ZipFile(io.BytesIO(resp.body))
+    assert zf.namelist() == ["src/Report.bas", "src/Errors.bas", "todo.txt"]
+    assert {i.date_time for i in zf.infolist()} == {(2026, 1, 2, 3, 4, 0)}
+
+    report = zf.read("src/Report.bas").decode()
+    assert report.startswith('Attribute VB_Name = "Report"\n\'Nightly\n\'Generated: 2026-01-02 03:04 UTC\n')
+    assert "Public Sub Loaddata()" in report and "    Loaddata\n\n    Build\n" in report
+    assert "Public Sub HandleError(" in zf.read("src/Errors.bas").decode()
+    todo = zf.read("todo.txt").decode()
+    assert todo.startswith("Report:\n  • Call Report.Run") and "\nErrors:\n" in todo
+
+    assert post(drive, body).body == resp.body                                  # pinned stamp: same bytes
+
+def test_batch_json_matches_single_renders(drive):
+    specs = [{"moduleName": "H", "includeErrorHandler": False}, {"moduleName": "S", "moduleType": "settings"}]
+    mods  = json.loads(post(drive, {"modules": specs, "format": "json"}).body)["modules"]
+    assert [m["moduleName"] for m in mods] == ["H", "S"]
+    for spec, mod in zip(specs, mods):
+        assert json.loads(post(drive, spec).body) == {k: mod[k] for k in ("code", "todo")}
@@ -0,0 +1,137 @@
+import os, pickle, threading, time
+
+import pytest
+
+import _cache
+from _cache import DiskStore, LRUCache, ResultCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(_cache.time, "monotonic", lambda: now[0])
+    return now
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(2)
+    lru.put("a", 1), lru.put("b", 2)
+    assert lru.get("a") == 1                  # "b" is now the oldest
+    lru.put("c", 3)
+    assert lru.get("b") is None and lru.get("c") == 3
+    assert lru.stats() == {"size": 2, "maxsize": 2, "hits": 2, "misses": 1}
+
+# ----------------------------------------------------------------
+# ResultCache
+# ----------------------------------------------------------------
+def test_concurrent_misses_compute_once():
+    cache, calls, gate = ResultCache(), [], threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait(5)
+        return b"body"
+
+    results = []
+    def worker():
+        results.append(cache.get_or_compute("ep", "v1", "k", compute))
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)                                   # let the others queue behind the leader
+    gate.set()
+    for t in threads:
+        t.join(5)
+    states = [state for _, state in results]
+    assert len(calls) == 1 and len(states) == 8
+    assert states.count("miss") == 1 and "coalesced" in states and set(states) <= {"miss", "coalesced", "hit"}
+    assert {value for value, _ in results} == {b"body"}
+    assert cache.get_or_compute("ep", "v1", "k", compute) == (b"body", "hit")
+
+def test_a_failed_leader_is_not_shared():
+    cache, gate, started = ResultCache(), threading.Event(), threading.Event()
+
+    def boom():
+        started.set()
+        gate.wait(5)
+        raise RuntimeError("leader failed")
+
+    errors = []
+    def leader():
+        try:
+            cache.get_or_compute("ep", "v1", "k", boom)
+        except RuntimeError as exc:
+            errors.append(exc)
+    t = threading.Thread(target=leader)
+    t.start()
+    started.wait(5)
+    waiter = []
+    w = threading.Thread(target=lambda: waiter.append(cache.get_or_compute("ep", "v1", "k", lambda: b"mine")))
+    w.start()
+    time.sleep(0.1)                                   # the waiter is parked on the leader's flight
+    gate.set()
+    t.join(5), w.join(5)
+    assert len(errors) == 1
+    assert waiter == [(b"mine", "miss")]
+
+def test_ttl_expiry(clock):
+    cache = ResultCache(ttl=10)
+    assert cache.get_or_compute("ep", "v1", "k", lambda: b"one") == (b"one", "miss")
+    clock[0] += 9.9
+    assert cache.get_or_compute("ep", "v1", "k", lambda: b"two") == (b"one", "hit")
+    clock[0] += 0.2
+    assert cache.get_or_compute("ep", "v1", "k", lambda: b"two") == (b"two", "miss")
+    assert cache.events[("ep", "expired")] == 1
+
+def test_version_bump_drops_only_that_namespace():
+    cache = ResultCache()
+    cache.get_or_compute("a", "v1", "ka", lambda: b"a1")
+    cache.get_or_compute("b", "v1", "kb", lambda: b"b1")
+    assert cache.get_or_compute("a", "v2", "ka", lambda: b"a2") == (b"a2", "miss")
+    assert cache.get_or_compute("b", "v1", "kb", lambda: b"b2") == (b"b1", "hit")
+    assert cache.events[("a", "invalidated")] == 1 and cache.bytes == 4
+
+def test_bounded_by_entries_and_bytes():
+    cache = ResultCache(maxsize=2, max_bytes=10)
+    for key in "abc":
+        cache.get_or_compute("ep", "v1", key, lambda: b"xxx")
+    assert list(cache._data) == ["b", "c"]
+    cache.get_or_compute("ep", "v1", "big", lambda: b"y" * 11)      # larger than the cache: not kept
+    cache.get_or_compute("ep", "v1", "d", lambda: b"z" * 8)         # evicts down to 10 bytes
+    assert list(cache._data) == ["d"] and cache.bytes == 8
+    assert cache.stats()["events"][("ep", "evicted")] == 3
+
+def test_disabled_cache_bypasses():
+    assert ResultCache(maxsize=0).get_or_compute("ep", "v1", "k", lambda: b"x") == (b"x", "bypass")
+
+# ----------------------------------------------------------------
+# DiskStore
+# ----------------------------------------------------------------
+def test_disk_store_round_trip(tmp_path):
+    store = DiskStore(str(tmp_path))
+    key   = _cache.content_hash("module", "text")
+    assert store.get(key) is None
+    store.put(key, {"procs": {"a": [1, 2]}})
+    assert DiskStore(str(tmp_path)).get(key) == {"procs": {"a": [1, 2]}}
+    assert os.path.exists(tmp_path / key[:2] / f"{key}.pkl")
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"garbage",
+    pickle.dumps({"procs": list(range(100))})[:-7],                 # truncated
+    b"\x80\x05\x95\x10\x00\x00\x00\x00\x00\x00\x00\x8c\x03nope\x94.",
+    b"cnot_a_module\nthing\n.",
+], ids=["empty", "garbage", "truncated", "bad-frame", "missing-class"])
+def test_disk_store_corrupt_pickle_is_a_miss(tmp_path, data):
+    store = DiskStore(str(tmp_path))
+    key   = _cache.content_hash("corrupt")
+    store.put(key, "ok")
+    with open(store._path(key), "wb") as fh:
+        fh.write(data)
+    assert store.get(key) is None
+    store.put(key, "fixed")
+    assert store.get(key) == "fixed"
+
+def test_disk_store_unwritable_root_is_ignored(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("x")
+    store = DiskStore(str(blocker))                                  # root is a file: makedirs fails
+    assert store.put("ab" + "0" * 62, 1) == 1 and store.get("ab" + "0" * 62) is None
@@ -0,0 +1,67 @@
+from _callgraph import CallGraphIndex, _tarjan, analytics_query
+
+# main → load → parse ⇄ token, main → report → report (self-recursive), report → MsgBox (not a proc)
+GRAPH = {
+    "m.main":   {"m.load", "m.report"},
+    "m.load":   {"m.parse"},
+    "m.parse":  {"m.token"},
+    "m.token":  {"m.parse", "m.save"},
+    "m.report": {"m.report", "msgbox"},
+    "m.save":   set(),
+    "m.orphan": {"m.save"},
+}
+
+def test_tarjan_components_are_sinks_first():
+    comp, comps = _tarjan([[1], [2], [1, 3], []])
+    assert sorted(map(sorted, comps)) == [[0], [1, 2], [3]]
+    assert comp[1] == comp[2] != comp[0]
+    order = {frozenset(c): i for i, c in enumerate(comps)}
+    assert order[frozenset([3])] < order[frozenset([1, 2])] < order[frozenset([0])]
+
+def test_tarjan_is_iterative():
+    n = 20000
+    comp, comps = _tarjan([[i + 1] for i in range(n - 1)] + [[0]])   # one long cycle
+    assert len(comps) == 1 and len(comps[0]) == n
+
+def test_cycles_topo_order_and_reach():
+    idx = CallGraphIndex(GRAPH)
+    assert sorted(idx.cycles()) == [["m.parse", "m.token"], ["m.report"]]
+    topo = idx.topo_order()
+    assert topo.index("m.main") < topo.index("m.load") < topo.index("m.parse") < topo.index("m.save")
+    assert abs(topo.index("m.parse") - topo.index("m.token")) == 1
+    assert sorted(idx.reaches("m.load")) == ["m.parse", "m.save", "m.token"]
+    assert idx.reaches("m.report") == ["m.report"]                    # recursive: reaches itself
+    assert sorted(idx.default_entries()) == ["m.main", "m.orphan"]
+    assert idx.unreachable(["m.main"]) == ["m.orphan"]
+
+def test_reached_ors_over_callees():
+    idx  = CallGraphIndex(GRAPH)
+    own  = [{"m.save": 1, "m.report": 2}.get(n, 0) for n in idx.nodes]
+    got  = dict(zip(idx.nodes, idx._reached(own)))
+    assert got == {"m.main": 3, "m.load": 1, "m.parse": 1, "m.token": 1, "m.report": 2, "m.save": 1, "m.orphan": 1}
+
+def test_summary_hot_paths_score():
+    idx     = CallGraphIndex(GRAPH)
+    effects = {"m.save": {"File system access"}, "m.report": {"Touches form controls"}}
+    out     = idx.summary(effects, {"m.token"}, top=3)
+    # (fan-in + 1) × (1 + reachable effect kinds + 2 if an error hotspot is reachable)
+    assert out["hotPaths"] == [
+        {"proc": "m.parse", "fanIn": 2, "fanOut": 1, "reachesEffects": ["File system access"],
+         "reachesErrorHotspot": True, "score": 3 * 4},
+        {"proc": "m.load", "fanIn": 1, "fanOut": 1, "reachesEffects": ["File system access"],
+         "reachesErrorHotspot": True, "score": 2 * 4},
+        {"proc": "m.token", "fanIn": 1, "fanOut": 2, "reachesEffects": ["File system access"],
+         "reachesErrorHotspot": True, "score": 2 * 4},
+    ]
+    scores = {p["proc"]: p["score"] for p in idx.summary(effects, {"m.token"})["hotPaths"]}
+    assert scores == {"m.parse": 12, "m.load": 8, "m.token": 8, "m.report": 3 * 2, "m.save": 3 * 2,
+                      "m.main": 1 * (1 + 2 + 2), "m.orphan": 1 * 2}
+    assert out["fanIn"] == [{"proc": "m.parse", "count": 2}, {"proc": "m.report", "count": 2},
+                            {"proc": "m.save", "count": 2}]
+    assert out["entryPoints"] == ["m.main", "m.orphan"] and out["unreachable"] == []
+
+def test_analytics_query():
+    assert analytics_query("entry=M.Main&entry=m.orphan&reach=M.Load&top=3") == (["m.main", "m.orphan"], ["m.load"], 3)
+    assert analytics_query("top=x") == ([], [], 10)
+    out = CallGraphIndex(GRAPH).summary_from_query("entry=M.Main&reach=M.Load", {}, set())
+    assert out["unreachable"] == ["m.orphan"] and sorted(out["reach"]["m.load"]) == ["m.parse", "m.save", "m.token"]
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import _catalog
+import hidden_features
+from _catalog import Catalog, CatalogError, catalog, prebuild, register
+from contextual_features import BM25Index, KeywordIndex
+
+RAW = {"scenarios": {"charts": [{"title": "Pivot refresh", "match": ["pivot", "refresh"], "description": "x"},
+                                {"title": "Chart", "match": ["chart"], "description": "draw a chart"}],
+                     "forms":  [{"title": "Form", "match": ["userform", "pivot"], "description": "a form"}]},
+       "genericHints": {"loop": "Avoid Select in loops."}}
+
+@pytest.fixture
+def builds(tmp_path, monkeypatch):
+    """Registers a counting "kw" index; returns the build count list and a catalog factory."""
+    monkeypatch.setattr(_catalog, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(_catalog, "_INDEXES", {})
+    path  = tmp_path / "catalog.json"
+    path.write_text(json.dumps(RAW))
+    count = []
+    def build(c):
+        count.append(1)
+        return KeywordIndex(c.scenarios, c.hints)
+    register("kw", 1, build)
+    return count, lambda stamp=(1, 2): Catalog(json.loads(path.read_text()), stamp, str(path))
+
+def test_index_snapshot_round_trip(builds):
+    count, fresh = builds
+    first = fresh().derived("kw")
+    cat   = fresh()
+    again = cat.derived("kw")
+    assert len(count) == 1                                   # second catalog loaded the snapshot
+    assert again.docs.groups[0] is cat.scenarios["charts"]   # and shares its records
+    found = again.hits("refresh the pivot chart")
+    assert [r["title"] for r in again.rank(found)] == [r["title"] for r in first.rank(first.hits("refresh the pivot chart"))]
+    assert [r["title"] for r in again.rank(found, "forms")] == ["Form"]
+    assert again.rank(found, "nope") == []
+
+def test_stale_snapshots_are_rebuilt(builds):
+    count, fresh = builds
+    fresh().derived("kw")
+    fresh((1, 3)).derived("kw")                              # catalog file changed
+    register("kw", 2, _catalog._INDEXES["kw"][1])
+    fresh((1, 3)).derived("kw")                              # index layout changed
+    assert len(count) == 3
+
+def test_unreadable_snapshot_is_rebuilt(builds, tmp_path):
+    count, fresh = builds
+    fresh().derived("kw")
+    (tmp_path / "catalog.json.kw.pickle").write_bytes(b"garbage")
+    assert fresh().derived("kw").hits("pivot") == {"pivot"}
+    assert len(count) == 2
+
+def test_bm25_snapshot_scores_match(builds):
+    _, fresh = builds
+    register("bm25", 1, lambda c: BM25Index(c.scenarios))
+    built  = fresh().derived("bm25")
+    loaded = fresh().derived("bm25")
+    for topic in (None, "charts", "forms"):
+        assert loaded.top("pivot chart", 5, topic) == built.top("pivot chart", 5, topic)
+
+def test_requests_write_no_snapshots_without_a_cache_dir(builds, tmp_path, monkeypatch):
+    count, fresh = builds
+    monkeypatch.setattr(_catalog, "SNAPSHOT_DIR", None)
+    fresh().derived("kw")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["catalog.json"]
+    stamp = _catalog._stamp(tmp_path / "catalog.json")
+    assert all(prebuild(str(tmp_path / "catalog.json")))     # deploy time writes them
+    fresh(stamp).derived("kw")
+    assert len(count) == 2                                    # one for the request, one for prebuild
+
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    """catalog() over a temp file, nothing loaded yet."""
+    path = tmp_path / "catalog.json"
+    monkeypatch.setattr(_catalog, "CATALOG_PATH", str(path))
+    monkeypatch.setattr(_catalog, "SNAPSHOT_DIR", None)
+    monkeypatch.setattr(_catalog, "_current", None)
+    monkeypatch.setattr(_catalog, "_failed", None)
+    return path
+
+def test_catalog_survives_a_missing_or_broken_file(live):
+    live.write_text(json.dumps(RAW))
+    first = catalog()
+    live.unlink()
+    assert catalog() is first
+    live.write_text("{ not json")
+    assert catalog() is first
+    live.write_text(json.dumps({**RAW, "version": 2}) + " " * 10)      # a new size: a new stamp
+    assert catalog().version == 2
+
+def test_missing_catalog_is_a_503(live, drive):
+    with pytest.raises(CatalogError, match="Scenario catalog unavailable"):
+        catalog()
+    resp = drive(hidden_features, b'{"topic": "charts"}')
+    assert resp.status == 503 and "Scenario catalog unavailable" in json.loads(resp.body)["error"]
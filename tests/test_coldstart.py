@@ -0,0 +1,13 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bench"))
+import coldstart  # noqa: E402
+
+@pytest.mark.parametrize("name, method, body, budget", coldstart.CASES,
+                         ids=[f"{c[0]}-{c[1]}-{i}" for i, c in enumerate(coldstart.CASES)])
+def test_cold_start_budget(name, method, body, budget):
+    """Median of five fresh interpreters: handler import + first response within the budget."""
+    med, _ = coldstart.run_case(name, method, body, coldstart.child_env())
+    assert med["total"] <= budget, f"{name} {method}: import {med['import']:.1f} ms + first {med['first']:.1f} ms"
@@ -0,0 +1,109 @@
+import pytest
+
+import flow_analyzer
+from flow_analyzer import parse_modules
+
+def project(modules, procs=6):
+    """Modules whose procedures call into their own module and the next one."""
+    out = []
+    for m in range(modules):
+        body = [f'Attribute VB_Name = "Mod{m}"', "Private total As Long"]
+        for p in range(procs):
+            body += [f"Public Sub Step{p}()",
+                     f"    For i = 1 To 10: Step{(p + 1) % procs} i: Next i",
+                     f"    Call Mod{(m + 1) % modules}.Step0",
+                     "    Cells(1, 1).Value = total" if p % 2 else "    On Error Resume Next",
+                     "End Sub"]
+        out.append((f"src/Mod{m}.bas", "\n".join(body) + "\n"))
+    return out
+
+@pytest.fixture
+def cold(monkeypatch):
+    """Empty partial cache, no disk store."""
+    monkeypatch.setattr(flow_analyzer, "PARTIALS", flow_analyzer.LRUCache(4096))
+    monkeypatch.setattr(flow_analyzer, "DISK", None)
+
+@pytest.fixture
+def pooled(cold, monkeypatch):
+    monkeypatch.setattr(flow_analyzer, "WORKERS", 2)
+    monkeypatch.setattr(flow_analyzer, "PARALLEL_MIN_MODULES", 4)
+    monkeypatch.setattr(flow_analyzer, "_pool", None)
+    yield
+    if flow_analyzer._pool is not None:
+        flow_analyzer._pool.shutdown()
+
+def test_parallel_parse_matches_serial(pooled):
+    items = project(12)
+    stats = {"hits": 0, "misses": 0}
+    par   = parse_modules(items, stats)
+    pool  = flow_analyzer._pool
+    assert pool is not None and pool._mp_context.get_start_method() != "fork"
+    assert stats == {"hits": 0, "misses": 12}
+    assert par == [flow_analyzer.parse_module(n, t) for n, t in items]
+    assert parse_modules(items, stats) == par                     # now all cache hits
+    assert stats == {"hits": 12, "misses": 12}
+
+def test_small_inputs_stay_serial(pooled):
+    assert parse_modules(project(3)) == [flow_analyzer.parse_module(n, t) for n, t in project(3)]
+    assert flow_analyzer._pool is None
+
+# ----------------------------------------------------------------
+# parse_module + link: the module-qualified call graph
+# ----------------------------------------------------------------
+from collections import defaultdict  # noqa: E402
+
+from flow_analyzer import link, parse_module  # noqa: E402
+
+def linked(modules):
+    graph, effects, hotspots, depths = defaultdict(set), defaultdict(set), set(), {}
+    link([parse_module(name, text) for name, text in modules.items()], graph, effects, hotspots, depths)
+    return {k: sorted(v) for k, v in graph.items()}, effects, hotspots, depths
+
+def test_same_named_procs_resolve_to_the_callers_module():
+    graph, _, _, _ = linked({
+        "src/A.bas": "Sub Init()\nEnd Sub\nSub Run()\n    Init\nEnd Sub\n",
+        "src/B.bas": "Sub Init()\nEnd Sub\nSub Go()\n    Call Init\nEnd Sub\n",
+        "src/C.bas": "Sub Start()\n    Init\nEnd Sub\n",       # no Init of its own: every public one
+    })
+    assert graph["a.run"] == ["a.init"]
+    assert graph["b.go"] == ["b.init"]
+    assert graph["c.start"] == ["a.init", "b.init"]
+
+def test_module_qualified_call_vs_object_method():
+    graph, _, _, _ = linked({
+        "src/Main.bas": "Sub Main()\n"
+                        "    Helpers.Save\n"             # Module.Proc: that module only
+                        "    Call Helpers.Load(1)\n"
+                        "    ws.Save\n"                  # obj.Method: a weak ref to any project Save
+                        "    ws.Activate\n"              # ... and dropped when no proc has that name
+                        "    Private_.Save\n"
+                        "End Sub\n"
+                        "Private Sub Save()\nEnd Sub\n",
+        "src/Helpers.bas": "Sub Save()\nEnd Sub\nSub Load(n)\nEnd Sub\n",
+    })
+    assert graph["main.main"] == ["helpers.load", "helpers.save", "main.save"]
+
+def test_property_get_and_let_share_one_node():
+    mod = ("Private total As Long\n"
+           "Property Get Count() As Long\n    Count = total\nEnd Property\n"
+           "Property Let Count(ByVal v As Long)\n    Record v\n    total = v\nEnd Property\n"
+           "Sub Record(v)\nEnd Sub\n"
+           "Sub Use()\n    For i = 1 To 3\n        Count = Count + 1\n    Next\nEnd Sub\n")
+    part = parse_module("src/Store.bas", mod)
+    assert sorted(part["procs"]) == ["count", "record", "use"]
+    graph, _, _, depths = linked({"src/Store.bas": mod})
+    assert graph["store.count"] == ["store.record"]
+    assert graph["store.use"] == ["store.count"]
+    assert depths == {("store.use", "store.count"): 1}
+
+def test_effects_hotspots_and_loop_depths():
+    graph, effects, hotspots, depths = linked({"src/M.bas":
+        "Sub Outer()\n"
+        "    On Error Resume Next\n"
+        "    For i = 1 To 2\n        Do While x\n            Inner\n        Loop\n    Next\n"
+        "End Sub\n"
+        "Sub Inner()\n    Cells(1, 1).Value = 1\n    Me.Caption = \"x\"\nEnd Sub\n"})
+    assert graph == {"m.outer": ["m.inner"], "m.inner": []}
+    assert effects["m.inner"] == {"Reads/writes cells", "Touches form controls"} and not effects["m.outer"]
+    assert hotspots == {"m.outer"}
+    assert depths == {("m.outer", "m.inner"): 2}
@@ -0,0 +1,86 @@
+import json
+from http.server import BaseHTTPRequestHandler
+from types import SimpleNamespace
+
+import pytest
+
+import _http
+from _http import not_modified, request_key, send_bytes, send_cached, send_json
+
+BIG   = {"items": ["x" * 40] * 100}                 # well over HTTP_GZIP_MIN_BYTES
+SMALL = {"ok": True}
+
+class Fake(BaseHTTPRequestHandler):
+    """A handler whose GET answers ``obj``; POST answers through send_cached."""
+    obj, builds = BIG, []
+
+    def do_GET(self):
+        send_json(self, self.obj)
+
+    def do_POST(self):
+        key = request_key(self, "fake", "v1", b"")
+        if not_modified(self, key):
+            return
+        def build():
+            Fake.builds.append(1)
+            return self.obj
+        send_cached(self, "fake", "v1", {"q": self.path}, build, key)
+
+ENDPOINT = SimpleNamespace(handler=Fake)
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    monkeypatch.setattr(Fake, "obj", BIG)
+    monkeypatch.setattr(Fake, "builds", [])
+    _http.RESULTS.clear()
+    _http._ETAGS.clear()
+
+@pytest.mark.parametrize("accept, gz", [
+    ("gzip, deflate", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("identity", False),
+    ("", False),
+])
+def test_gzip_negotiation(drive, accept, gz):
+    resp = drive(ENDPOINT, headers={"Accept-Encoding": accept}, method="GET")
+    assert resp.status == 200 and json.loads(resp.body) == BIG
+    assert (resp.headers.get("Content-Encoding") == "gzip") is gz
+    assert resp.headers["ETag"].endswith('-gz"') is gz
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert int(resp.headers["Content-Length"]) == len(resp.raw.partition(b"\r\n\r\n")[2])
+
+def test_small_bodies_are_not_compressed(drive, monkeypatch):
+    monkeypatch.setattr(Fake, "obj", SMALL)
+    resp = drive(ENDPOINT, headers={"Accept-Encoding": "gzip"}, method="GET")
+    assert "Content-Encoding" not in resp.headers and resp.body == b'{"ok":true}'
+
+def test_if_none_match_gets_a_304(drive):
+    etag = drive(ENDPOINT, headers={"Accept-Encoding": "gzip"}, method="GET").headers["ETag"]
+    for inm in (etag, f'W/{etag}', f'"other", {etag}', "*"):
+        resp = drive(ENDPOINT, headers={"Accept-Encoding": "gzip", "If-None-Match": inm}, method="GET")
+        assert resp.status == 304 and resp.body == b"" and resp.headers["ETag"] == etag
+    # the plain and gzip representations have different tags
+    resp = drive(ENDPOINT, headers={"If-None-Match": etag}, method="GET")
+    assert resp.status == 200 and resp.headers["ETag"] == etag.replace("-gz", "")
+
+def test_cached_responses_report_x_cache_and_skip_work_on_304(drive):
+    first = drive(ENDPOINT, path="/?a=1")
+    again = drive(ENDPOINT, path="/?a=1")
+    assert (first.headers["X-Cache"], again.headers["X-Cache"]) == ("miss", "hit")
+    assert first.body == again.body and json.loads(first.body) == BIG
+    assert drive(ENDPOINT, path="/?a=2").headers["X-Cache"] == "miss"
+    assert len(Fake.builds) == 2
+
+    resp = drive(ENDPOINT, path="/?a=1", headers={"If-None-Match": first.headers["ETag"]})
+    assert resp.status == 304 and "X-Cache" not in resp.headers            # answered from the ETag memo
+    assert len(Fake.builds) == 2
+
+def test_error_statuses_never_304(drive):
+    class Err(Fake):
+        def do_GET(self):
+            send_bytes(self, b"nope", "text/plain", 400)
+    etag = drive(SimpleNamespace(handler=Err), method="GET").headers["ETag"]
+    resp = drive(SimpleNamespace(handler=Err), headers={"If-None-Match": etag}, method="GET")
+    assert resp.status == 400 and resp.body == b"nope"
@@ -0,0 +1,110 @@
+import pytest
+
+from _lexer import Lexed, declared, lex, nest
+
+def stmts(text):
+    return Lexed(text).statements
+
+# ----------------------------------------------------------------
+# code view: comments, Rem and continuations blanked, offsets kept
+# ----------------------------------------------------------------
+@pytest.mark.parametrize("text", [
+    "x = 1 ' note\ny = \"it's\" ' and \"quoted\"\n",
+    "x = 1 + _\n    2 ' comment _\n  continued\nRem r _\n  more\ny = 3",
+    "s = \"a \"\"b\"\" c\" & 'tail\r\n",
+])
+def test_code_view_keeps_offsets(text):
+    lx = Lexed(text)
+    assert len(lx.code) == len(text)
+    assert lx.code.count("\n") + lx.code.count("\x0b") == text.count("\n")
+
+def test_comments_and_strings():
+    lx = Lexed("x = \"it's 'not' a comment\" ' but this is\ny = 2")
+    assert lx.code == "x = \"it's 'not' a comment\"              \ny = 2"
+    assert lx.in_string(lx.text.index("not")) and not lx.in_string(lx.text.index("y"))
+    assert stmts("s = \"a \"\"b\"\" c\"") == [(1, ["s", "=", '"a ""b"" c"'])]
+
+def test_continued_comment_swallows_the_next_line():
+    assert stmts("x = 1 ' a _\n  y = 2\nz = 3") == [(1, ["x", "=", "1"]), (3, ["z", "=", "3"])]
+
+@pytest.mark.parametrize("text, expected", [
+    ("Rem note\nx = 1", [(2, ["x", "=", "1"])]),
+    ("  10 Rem numbered\nx = 1", [(2, ["x", "=", "1"])]),
+    ("Rem a _\n  b\nx = 1", [(3, ["x", "=", "1"])]),
+    ("x = 1: Rem note: y = 2\nz = 3", [(1, ["x", "=", "1"]), (2, ["z", "=", "3"])]),
+    ("If a Then Rem note", [(1, ["if", "a"])]),
+    ("If a Then b Else Rem note\nc", [(1, ["if", "a"]), (1, ["b"]), (2, ["c"])]),
+    ("Remark = 1: x = \"a: Rem b\"", [(1, ["remark", "=", "1"]), (1, ["x", "=", '"a: rem b"'])]),
+])
+def test_rem(text, expected):
+    assert stmts(text) == expected
+
+def test_continuations_join_lines_and_keep_line_numbers():
+    lx = Lexed("x = a + _\n    b _\n    + c\ny = 2\nmy_ = 3")
+    assert lx.statements == [(1, ["x", "=", "a", "+", "b", "+", "c"]), (4, ["y", "=", "2"]), (5, ["my_", "=", "3"])]
+    assert lx.line_of(lx.text.index("y =")) == 4
+
+# ----------------------------------------------------------------
+# statement split
+# ----------------------------------------------------------------
+@pytest.mark.parametrize("text, expected", [
+    ("a = 1: b = 2", [["a", "=", "1"], ["b", "=", "2"]]),
+    ("If x > 1 Then y = 1 Else y = 2", [["if", "x", ">", "1"], ["y", "=", "1"], ["y", "=", "2"]]),
+    ("Foo a:=1, b:=\"x\": Bar", [["foo", "a", ":=", "1", ",", "b", ":=", '"x"'], ["bar"]]),
+    ("Retry:\n    x = 1", [["x", "=", "1"]]),
+    ("10 x = 1\n20 GoTo 10", [["x", "=", "1"], ["goto", "10"]]),
+    ("x = 1\nDone:", [["x", "=", "1"]]),
+    ("x = &HFF& + 1.5e3 + .5 <> y", [["x", "=", "&hff&", "+", "1.5e3", "+", ".5", "<>", "y"]]),
+    ("s = Left$(t, 2)", [["s", "=", "left$", "(", "t", ",", "2", ")"]]),
+])
+def test_statement_split(text, expected):
+    assert [st for _, st in stmts(text)] == expected
+
+# ----------------------------------------------------------------
+# procedures, declarations, nesting
+# ----------------------------------------------------------------
+MODULE = """Option Explicit
+Private total As Long, names() As String
+Public Static Function Sum(ByVal a As Long, Optional b() As Variant) As Long
+    Sum = a
+End Function
+Property Get Count() As Long
+    Count = total
+End Property
+Sub Open1()
+    x = 1
+Sub Next1()
+    y = 2
+End Sub
+"""
+
+def test_procedures():
+    lx = lex(MODULE)
+    assert [(p.kind, p.name, p.scope, p.line, p.end_line, p.params) for p in lx.procedures] == [
+        ("Function", "sum", "public", 3, 5, ["a", "b"]),
+        ("Property Get", "count", "public", 6, 8, []),
+        ("Sub", "open1", "public", 9, 10, []),          # unterminated: runs to the next header
+        ("Sub", "next1", "public", 11, 13, []),
+    ]
+    assert lx.procedures[0].body == [(4, ["sum", "=", "a"])]
+    assert lx.outside == [(1, ["option", "explicit"]),
+                          (2, ["private", "total", "as", "long", ",", "names", "(", ")", "as", "string"])]
+    assert declared(lx.outside[1][1]) == ["total", "names"]
+    assert declared(["dim", "a", "(", "1", "to", "n", ")", "as", "long", ",", "b"]) == ["a", "b"]
+
+def test_nest_tracks_loops_and_with_blocks():
+    body = lex("Sub P()\n"
+               "For i = 1 To 2\n"
+               "  For j = 1 To 2\n"
+               "    With ws\n"
+               "      .Cells(i, j) = 1\n"
+               "    End With\n"
+               "Next j, i\n"
+               "Do While x\n"
+               "  x = x - 1\n"
+               "Loop\n"
+               "z = 0\n"
+               "End Sub\n").procedures[0].body
+    got = [(line, st[0], len(loops), withs) for line, st, loops, withs in nest(body)]
+    assert got == [(2, "for", 0, 0), (3, "for", 1, 0), (4, "with", 2, 0), (5, ".", 2, 1),
+                   (8, "do", 0, 0), (9, "x", 1, 0), (11, "z", 0, 0)]
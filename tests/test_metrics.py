@@ -0,0 +1,132 @@
+import json, re, time
+from http.server import BaseHTTPRequestHandler
+from types import SimpleNamespace
+
+import pytest
+
+import _metrics
+import metrics
+from _cache import LRUCache, ResultCache
+from _http import send_json
+from _metrics import BUCKETS, Registry, Request, instrumented, span
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_][a-zA-Z0-9_]*="[^"]*",?)*)\})? (\S+)$')
+
+class Fake(BaseHTTPRequestHandler):
+    @instrumented("fake")
+    def do_POST(self):
+        with span(self, "parse"):
+            time.sleep(0.01)
+        with span(self, "render"):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+        if body == b"boom":
+            raise RuntimeError("boom")
+        send_json(self, {"n": len(body)})
+
+    @instrumented("fake")
+    def do_GET(self):
+        time.sleep(0.05)
+        send_json(self, {})
+
+ENDPOINT = SimpleNamespace(handler=Fake)
+
+@pytest.fixture
+def registry(monkeypatch):
+    reg = Registry()
+    monkeypatch.setattr(_metrics, "REGISTRY", reg)
+    monkeypatch.setattr(metrics, "REGISTRY", reg)
+    return reg
+
+def parse(text):
+    """{family: TYPE} and [(name, {label: value}, float)] from exposition text, checking every line."""
+    assert text.endswith("\n")
+    types, samples, helped = {}, [], set()
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            helped.add(line.split()[2])
+        elif line.startswith("# TYPE "):
+            _, _, family, kind = line.split()
+            assert family in helped and family not in types and kind in {"counter", "gauge", "histogram"}
+            types[family] = kind
+        else:
+            m = SAMPLE.match(line)
+            assert m, f"malformed sample line: {line!r}"
+            name, labels, value = m.groups()
+            family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+            assert family in types, f"{name} before its TYPE line"
+            samples.append((name, dict(re.findall(r'(\w+)="([^"]*)"', labels or "")), float(value)))
+    return types, samples
+
+def test_render_is_well_formed_prometheus_text(registry):
+    for elapsed, status in ((0.003, 200), (0.2, 200), (40.0, 500)):
+        req = Request("audit", 120)
+        req.status, req.bytes_out, req.spans = status, 50, [("parse", elapsed / 2)]
+        registry.record(req, elapsed)
+    registry.watch("lru", LRUCache(4)).get("x")
+    results = registry.watch("results", ResultCache())
+    results.get_or_compute("audit", "v1", "k", lambda: b"x")
+    results.get_or_compute("audit", "v1", "k", lambda: b"x")
+
+    types, samples = parse(registry.render())
+    assert types["excelgpt_request_duration_seconds"] == "histogram"
+    assert types["excelgpt_requests_total"] == "counter" and types["excelgpt_cache_entries"] == "gauge"
+
+    buckets = [(s[1]["le"], s[2]) for s in samples if s[0] == "excelgpt_request_duration_seconds_bucket"]
+    assert [le for le, _ in buckets] == [str(b) for b in BUCKETS] + ["+Inf"]
+    counts = [n for _, n in buckets]
+    assert counts == sorted(counts)                                         # cumulative
+    assert dict(buckets)["0.0025"] == 0 and dict(buckets)["0.005"] == 1 and dict(buckets)["0.25"] == 2
+    assert dict(buckets)["30.0"] == 2 and dict(buckets)["+Inf"] == 3        # 40 s only lands in +Inf
+    value = {(name, tuple(sorted(labels.items()))): v for name, labels, v in samples}
+    assert value[("excelgpt_request_duration_seconds_count", (("endpoint", "audit"),))] == 3
+    assert value[("excelgpt_request_duration_seconds_sum", (("endpoint", "audit"),))] == pytest.approx(40.203)
+    assert value[("excelgpt_requests_total", (("endpoint", "audit"), ("status", "200")))] == 2
+    assert value[("excelgpt_requests_total", (("endpoint", "audit"), ("status", "500")))] == 1
+    assert value[("excelgpt_request_bytes_total", (("endpoint", "audit"),))] == 360
+    assert value[("excelgpt_span_count_total", (("endpoint", "audit"), ("span", "parse")))] == 3
+    assert value[("excelgpt_cache_lookups_total", (("cache", "lru"), ("result", "miss")))] == 1
+    assert value[("excelgpt_result_cache_hit_ratio", (("cache", "results"), ("endpoint", "audit")))] == 0.5
+
+def test_spans_record_durations(drive, registry):
+    resp = drive(ENDPOINT, b"abc")
+    assert resp.status == 200 and json.loads(resp.body) == {"n": 3}
+    timing = dict(part.split(";dur=") for part in resp.headers["Server-Timing"].split(", "))
+    assert list(timing) == ["parse", "render", "serialize"] and float(timing["parse"]) >= 10
+
+    assert registry.span_cnt[("fake", "parse")] == 1
+    assert registry.span_sum[("fake", "parse")] >= 0.01
+    assert 0 <= registry.span_sum[("fake", "render")] < registry.span_sum[("fake", "parse")]
+    assert registry.latency["fake"][-1] == 1 and registry.latency["fake"][-2] >= 0.01
+    assert registry.bytes_in["fake"] == 3 and registry.bytes_out["fake"] == len(b'{"n":3}')
+
+def test_failures_are_counted_as_500(drive, registry):
+    with pytest.raises(RuntimeError):
+        drive(ENDPOINT, b"boom")
+    assert registry.requests == {("fake", 500): 1}
+    assert registry.span_cnt[("fake", "render")] == 1                      # spans closed on the way out
+
+def test_span_without_a_request_is_a_no_op():
+    with span(object(), "parse"):
+        pass
+
+def test_slow_requests_are_sampled(drive, registry, monkeypatch):
+    seen = []
+    monkeypatch.setattr(_metrics, "PROFILE_MS", 10)
+    monkeypatch.setattr(_metrics, "PROFILE_TICK", 0.002)
+    monkeypatch.setattr(_metrics, "_profile_hook", lambda ep, elapsed, samples: seen.append((ep, elapsed, samples)))
+    assert drive(ENDPOINT, method="GET").status == 200
+    (ep, elapsed, samples), = seen
+    assert ep == "fake" and elapsed >= 0.05 and sum(samples.values()) >= 1
+    assert any("test_metrics.py:do_GET" in stack for stack in samples)
+    assert not _metrics._Sampler.active
+
+    monkeypatch.setattr(Fake, "do_GET", instrumented("fake")(lambda self: send_json(self, {})))
+    drive(ENDPOINT, method="GET")
+    assert len(seen) == 1                                                   # fast requests are not reported
+
+def test_metrics_endpoint_serves_the_registry(drive, registry):
+    registry.record(Request("audit", 0), 0.01)
+    resp = drive(metrics, method="GET")
+    assert resp.status == 200 and resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    _, samples = parse(resp.body.decode())
+    assert ("excelgpt_requests_total", {"endpoint": "audit", "status": "200"}, 1.0) in samples
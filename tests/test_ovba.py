@@ -0,0 +1,196 @@
+import struct
+
+import pytest
+
+from _ovba import CFB_MAGIC, ENDOFCHAIN, FREESECT, CompoundFile, OVBAError, decompress, iter_vba_modules
+
+# ----------------------------------------------------------------
+# decompress: MS-OVBA 3.2 examples, chunk boundaries, bad input
+# ----------------------------------------------------------------
+@pytest.mark.parametrize("packed, text", [
+    # 3.2.1 no compression (literal tokens only)
+    ("01 19 B0 00 61 62 63 64 65 66 67 68 00 69 6A 6B 6C 6D 6E 6F 70 00 71 72 73 74 75 76 2E",
+     b"abcdefghijklmnopqrstuv."),
+    # 3.2.2 normal compression: copy tokens while the offset field widens 4 → 5 → 6 bits
+    ("01 2F B0 00 23 61 61 61 62 63 64 65 82 66 00 70 61 67 68 69 6A 01 38 08 61 6B 6C 00 30 6D 6E 6F 70 "
+     "06 71 02 70 04 10 72 73 74 75 76 10 77 78 79 7A 00 3C",
+     b"#aaabcdefaaaaghijaaaaaklaaamnopqaaaaaaaaaaaarstuvwxyzaaa"),
+    # 3.2.3 maximum compression: one literal, then one overlapping copy of 72 bytes
+    ("01 03 B0 02 61 45 00", b"a" * 73),
+])
+def test_decompress_spec_examples(packed, text):
+    assert decompress(bytes.fromhex(packed)) == text
+
+RAW_CHUNK = b"\xff\x3f"                  # header of an uncompressed 4096-byte chunk
+
+def literal_chunk(data):
+    """A compressed chunk holding ``data`` as literal tokens only."""
+    body = b"".join(b"\x00" + data[i:i + 8] for i in range(0, len(data), 8))
+    return struct.pack("<H", 0xB000 | (len(body) + 2 - 3)) + body
+
+def pack(data):
+    """Raw chunks for every full 4096 bytes, then one literal chunk for the tail."""
+    full = len(data) - len(data) % 4096
+    return (b"\x01" + b"".join(RAW_CHUNK + data[i:i + 4096] for i in range(0, full, 4096))
+            + (literal_chunk(data[full:]) if data[full:] else b""))
+
+def test_decompress_raw_and_compressed_chunks():
+    data = bytes(range(256)) * 20 + b"tail"          # two raw chunks, then a compressed one
+    assert decompress(pack(data)) == data
+
+def test_copy_tokens_are_relative_to_their_chunk():
+    # the second chunk starts with one literal, so its copy token uses the 4-bit
+    # offset field again even though 4096 bytes were already decompressed
+    assert decompress(b"\x01" + RAW_CHUNK + b"x" * 4096 + bytes.fromhex("03 B0 02 61 45 00")) == b"x" * 4096 + b"a" * 73
+
+@pytest.mark.parametrize("packed", [b"", b"\x02\x19\xb0"])
+def test_decompress_rejects_bad_signature(packed):
+    with pytest.raises(OVBAError, match="signature"):
+        decompress(packed)
+
+def test_decompress_rejects_copy_before_chunk_start():
+    with pytest.raises(OVBAError, match="before chunk"):
+        decompress(bytes.fromhex("01 02 B0 01 00 00"))
+
+# ----------------------------------------------------------------
+# A minimal compound file writer (v3, 512-byte sectors, header DIFAT only)
+# ----------------------------------------------------------------
+SECT, MINI, NOSTREAM, FATSECT = 512, 64, 0xFFFFFFFF, 0xFFFFFFFD
+
+def _entry(name, kind, start=ENDOFCHAIN, size=0, left=NOSTREAM, right=NOSTREAM, child=NOSTREAM):
+    raw = name.encode("utf-16-le") + b"\0\0"
+    e   = bytearray(128)
+    e[:len(raw)] = raw
+    struct.pack_into("<HBB", e, 64, len(raw), kind, 1)
+    struct.pack_into("<III", e, 68, left, right, child)
+    struct.pack_into("<IQ", e, 116, start, size)
+    return bytes(e)
+
+def _pad(data, size):
+    return data + b"\0" * (-len(data) % size)
+
+def compound_file(streams, cutoff=4096):
+    """Bytes of a compound file holding ``{name: data}`` as streams of storage "VBA".
+
+    Streams below ``cutoff`` live in the mini stream.  The VBA storage's
+    children hang off a balanced sibling tree so both left and right links
+    are followed.
+    """
+    sectors, fat = [], []
+
+    def chain(data, size, table, store):
+        if not data:
+            return ENDOFCHAIN
+        start = len(store)
+        for i in range(0, len(data), size):
+            store.append(_pad(data[i:i + size], size))
+            table.append(len(store))
+        table[-1] = ENDOFCHAIN
+        return start
+
+    mini, minifat, placed = [], [], {}
+    for name, data in streams.items():
+        if len(data) < cutoff:
+            placed[name] = chain(data, MINI, minifat, mini)
+    ministream = b"".join(mini)
+    for name, data in streams.items():
+        if len(data) >= cutoff:
+            placed[name] = chain(data, SECT, fat, sectors)
+    root_start  = chain(ministream, SECT, fat, sectors)
+    minifat_raw = b"".join(struct.pack("<I", v) for v in minifat)
+    first_mini  = chain(minifat_raw, SECT, fat, sectors)
+
+    # directory: root, VBA storage, then the streams as a balanced tree
+    names = list(streams)
+    def tree(lo, hi):
+        if lo >= hi:
+            return NOSTREAM, {}
+        mid = (lo + hi) // 2
+        left, l_links   = tree(lo, mid)
+        right, r_links  = tree(mid + 1, hi)
+        return 2 + mid, {**l_links, **r_links, mid: (left, right)}
+    top, links = tree(0, len(names))
+    entries = [_entry("Root Entry", 5, root_start, len(ministream), child=1),
+               _entry("VBA", 1, child=top)]
+    for i, name in enumerate(names):
+        data = streams[name]
+        entries.append(_entry(name, 2, placed[name], len(data), *links[i]))
+    first_dir = chain(_pad(b"".join(entries), SECT), SECT, fat, sectors)
+
+    # FAT sectors go last and describe themselves too
+    n_fat = 1
+    while len(fat) + n_fat > n_fat * SECT // 4:
+        n_fat += 1
+    fat_at = list(range(len(sectors), len(sectors) + n_fat))
+    fat   += [FATSECT] * n_fat
+    fat   += [FREESECT] * (n_fat * SECT // 4 - len(fat))
+    table  = b"".join(struct.pack("<I", v) for v in fat)
+    sectors += [table[i:i + SECT] for i in range(0, len(table), SECT)]
+
+    head = bytearray(SECT)
+    head[:8] = CFB_MAGIC
+    struct.pack_into("<HHHHH", head, 0x18, 0x3E, 3, 0xFFFE, 9, 6)
+    struct.pack_into("<IIIIIIII", head, 0x2C, n_fat, first_dir, 0, cutoff,
+                     first_mini, len(minifat_raw) // SECT + bool(len(minifat_raw) % SECT), ENDOFCHAIN, 0)
+    struct.pack_into("<109I", head, 0x4C, *(fat_at + [FREESECT] * (109 - n_fat)))
+    return bytes(head) + b"".join(sectors)
+
+def test_compound_file_reads_mini_and_regular_streams():
+    small, big = b"s" * 100 + b"end", bytes(range(256)) * 40
+    cfb = CompoundFile(compound_file({"dir": small, "Module1": big, "Sheet1": b"x", "Other": b"y" * 70}))
+    assert cfb.read("VBA/dir") == small                 # mini stream, two mini sectors
+    assert cfb.read("VBA/Module1") == big               # regular sectors through the FAT
+    assert cfb.read("vba/SHEET1") == b"x"               # names are case-insensitive
+    assert cfb.read("VBA/Other") == b"y" * 70
+
+def test_compound_file_errors():
+    with pytest.raises(OVBAError, match="Not an OLE"):
+        CompoundFile(b"PK\x03\x04" + b"\0" * 600)
+    cfb = CompoundFile(compound_file({"dir": b"d"}))
+    with pytest.raises(OVBAError, match="not found"):
+        cfb.read("VBA/Module1")
+
+def test_compound_file_detects_fat_loops():
+    data = bytearray(compound_file({"dir": b"d"}))
+    fat, first_dir = struct.unpack_from("<I", data, 0x4C)[0], struct.unpack_from("<I", data, 0x30)[0]
+    struct.pack_into("<I", data, SECT * (fat + 1) + 4 * first_dir, first_dir)   # directory sector points to itself
+    with pytest.raises(OVBAError, match="loops"):
+        CompoundFile(bytes(data))
+
+# ----------------------------------------------------------------
+# vbaProject.bin → modules
+# ----------------------------------------------------------------
+def _rec(rid, value=b""):
+    return struct.pack("<HI", rid, len(value)) + value
+
+def dir_stream(modules, codepage=1252):
+    out = _rec(0x0003, struct.pack("<H", codepage))
+    out += struct.pack("<HIIH", 0x0009, 4, 0x1234, 2)       # PROJECTVERSION: size field is not the size
+    for name, stream, offset, cls, unicode_name in modules:
+        out += _rec(0x0019, name.encode(f"cp{codepage}"))
+        if unicode_name:
+            out += _rec(0x0047, unicode_name.encode("utf-16-le"))
+        out += _rec(0x001A, stream.encode(f"cp{codepage}")) + _rec(0x0032, stream.encode("utf-16-le"))
+        out += _rec(0x0031, struct.pack("<I", offset)) + _rec(0x0022 if cls else 0x0021) + _rec(0x002B)
+    return out
+
+def test_iter_vba_modules():
+    std   = 'Attribute VB_Name = "Module1"\r\nSub Caf\xe9()\r\nEnd Sub\r\n'
+    big   = "Sub Big()\r\n" + "    x = 1\r\n" * 700 + "End Sub\r\n"
+    cache = b"\xcc" * 37                                      # performance cache before the source
+    project = compound_file({
+        "dir":     pack(dir_stream([("Module1", "Module1", len(cache), False, None),
+                                    ("Sheet1", "Sheet1", 0, True, "Feuille1"),
+                                    ("Gone", "Gone", 0, False, None)])),
+        "Module1": cache + pack(std.encode("cp1252")),
+        "Sheet1":  pack(big.encode("cp1252")),               # > 4096 bytes: regular FAT stream
+    })
+    assert list(iter_vba_modules(project)) == [("Module1.bas", std), ("Feuille1.cls", big)]
+
+@pytest.mark.parametrize("project", [
+    CFB_MAGIC + b"\0" * 40,                                  # truncated header
+    b"not a compound file at all",
+])
+def test_iter_vba_modules_rejects_corrupt_projects(project):
+    with pytest.raises(OVBAError):
+        list(iter_vba_modules(project))
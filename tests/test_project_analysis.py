@@ -0,0 +1,72 @@
+import io, json, zipfile
+
+import pytest
+
+import _archive
+import project_analysis
+from _archive import NO_MODULES, ArchiveLimitError
+from _ovba import OVBAError
+
+REPORT = ("Public Sub Build()\n"
+          "    On Error Resume Next\n"
+          "    Range(\"A1\").Select\n"
+          "    Helpers.Save\n"
+          "End Sub\n"
+          "Property Get Title() As String\n    Title = \"x\"\nEnd Property\n"
+          "Property Let Title(ByVal v As String)\nEnd Property\n")
+HELPERS = "Public Sub Save()\n    Cells(1, 1) = 1\nEnd Sub\n"
+
+def upload(drive, members, path="/"):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, text in members.items():
+            zf.writestr(name, text)
+    return drive(project_analysis, buf.getvalue(), {"Content-Type": "application/zip"}, path)
+
+def records(resp):
+    assert resp.status == 200 and resp.headers["Content-Type"] == "application/x-ndjson"
+    return [json.loads(line) for line in resp.body.splitlines()]
+
+def test_module_records_then_project(drive):
+    report, helpers, project = records(upload(drive, {"src/Report.bas": REPORT, "src/Helpers.bas": HELPERS,
+                                                     "readme.txt": "x"}, "/?top=1"))
+    assert report["module"] == "src/Report.bas" and report["node"] == "report"
+    assert report["procedures"] == [
+        {"name": "build", "node": "report.build", "kind": "Sub", "line": 1, "endLine": 5, "public": True,
+         "effects": ["Reads/writes cells"], "errorHotspot": True, "findings": 3},
+        {"name": "title", "node": "report.title", "kind": "Property Get", "line": 6, "endLine": 10,
+         "public": True, "effects": [], "errorHotspot": False, "findings": 0},     # Get and Let: one node
+    ]
+    assert [(f["line"], f["proc"], f["node"]) for f in report["findings"]] == [
+        (1, "build", "report.build"), (2, "build", "report.build"), (3, "build", "report.build")]
+    assert len(report["todo"]) == 3
+    assert helpers["procedures"][0]["effects"] == ["Reads/writes cells"] and helpers["findings"][0]["node"] == "helpers.save"
+
+    proj = project["project"]
+    assert proj["modules"] == 2
+    assert proj["callGraph"] == {"report.build": ["helpers.save"], "report.title": [], "helpers.save": []}
+    assert proj["errorHotspots"] == ["report.build"]
+    assert proj["analytics"]["entryPoints"] == ["report.build", "report.title"]
+    assert proj["lint"] == {"findings": 5, "topNodes": [{"node": "report.build", "findings": 3}]}
+    assert proj["cache"]["hits"] + proj["cache"]["misses"] == 2
+
+@pytest.mark.parametrize("exc, message", [(ArchiveLimitError("ZIP expands beyond 10 bytes"), "ZIP expands beyond 10 bytes"),
+                                          (OVBAError("bad chunk"), "bad chunk")])
+def test_archive_error_mid_stream_is_a_trailer(drive, monkeypatch, exc, message):
+    def modules(zf):
+        yield "src/Helpers.bas", HELPERS
+        raise exc
+    monkeypatch.setattr(project_analysis, "iter_modules", modules)
+    first, trailer = records(upload(drive, {"src/Helpers.bas": HELPERS}))
+    assert first["module"] == "src/Helpers.bas"
+    assert trailer == {"error": message}
+
+def test_no_modules_is_a_400_before_streaming(drive):
+    resp = upload(drive, {"readme.txt": "x"})
+    assert resp.status == 400 and json.loads(resp.body) == {"error": NO_MODULES}
+    assert "Transfer-Encoding" not in resp.headers
+
+def test_archive_limit_before_streaming_is_a_413(drive, monkeypatch):
+    monkeypatch.setattr(_archive.LIMITS, "max_members", 1)
+    resp = upload(drive, {"src/Report.bas": REPORT, "src/Helpers.bas": HELPERS})
+    assert resp.status == 413 and json.loads(resp.body) == {"error": "ZIP has more than 1 members"}
@@ -0,0 +1,309 @@
+import pytest
+
+from _rewrite import optimize
+
+def report(code):
+    return [(r["transform"], r["applied"], r.get("detail") or r.get("reason")) for r in optimize(code)["rewrites"]]
+
+def reasons(code, transform):
+    return [text for t, applied, text in report(code) if t == transform and not applied]
+
+# ----------------------------------------------------------------
+# buffer-cells
+# ----------------------------------------------------------------
+def test_buffer_cells_single_loop():
+    code = (
+        "Sub Fill()\n"
+        "    Dim i As Long, n As Long\n"
+        "    n = 10\n"
+        "    For i = 1 To n\n"
+        "        Cells(i, 1).Value = i * 2\n"
+        "    Next i\n"
+        "End Sub\n"
+    )
+    out = optimize(code)
+    assert out["optimizedCode"] == (
+        "Sub Fill()\n"
+        "    Dim i As Long, n As Long\n"
+        "    n = 10\n"
+        "    Dim cellBuf As Variant\n"
+        "    If n >= 1 Then ReDim cellBuf(1 To n, 1 To 1)\n"
+        "    For i = 1 To n\n"
+        "        cellBuf(i, 1) = i * 2\n"
+        "    Next i\n"
+        "    If n >= 1 Then Range(Cells(1, 1), Cells(n, 1)).Value = cellBuf\n"
+        "End Sub\n"
+    )
+    assert out["rewrites"] == [{"transform": "buffer-cells", "proc": "fill", "line": 4, "applied": True,
+                                "detail": "Cells writes collected in an array and written to the range at once"}]
+    # the buffered loop no longer writes cells, so app-guard has nothing to do
+    assert all(r["transform"] == "buffer-cells" for r in out["rewrites"])
+
+def test_buffer_cells_nested_loops_keep_qualifier_and_value2():
+    code = (
+        "Sub Grid(ws As Worksheet)\n"
+        "    Dim r As Long, c As Long\n"
+        "    For r = 2 To 5\n"
+        "        For c = 1 To 3\n"
+        "            ws.Cells(r, c).Value2 = r * c\n"
+        "        Next c\n"
+        "    Next r\n"
+        "End Sub\n"
+    )
+    assert optimize(code)["optimizedCode"] == (
+        "Sub Grid(ws As Worksheet)\n"
+        "    Dim r As Long, c As Long\n"
+        "    Dim cellBuf As Variant\n"
+        "    ReDim cellBuf(1 To 4, 1 To 3)\n"
+        "    For r = 2 To 5\n"
+        "        For c = 1 To 3\n"
+        "            cellBuf(r - 1, c) = r * c\n"
+        "        Next c\n"
+        "    Next r\n"
+        "    ws.Range(ws.Cells(2, 1), ws.Cells(5, 3)).Value2 = cellBuf\n"
+        "End Sub\n"
+    )
+
+def test_buffer_cells_fresh_name_avoids_existing_identifiers():
+    code = (
+        "Sub Fill()\n"
+        "    Dim i As Long, cellBuf As Long\n"
+        "    For i = 1 To 3\n"
+        "        Cells(i, 1).Value = i\n"
+        "    Next i\n"
+        "End Sub\n"
+    )
+    new = optimize(code)["optimizedCode"]
+    assert "Dim cellBuf2 As Variant" in new
+    assert "Range(Cells(1, 1), Cells(3, 1)).Value = cellBuf2" in new
+
+def sub(body):
+    return "Sub P()\n    Dim i As Long, j As Long, n As Long, ws As Worksheet, x As Long\n" + body + "End Sub\n"
+
+@pytest.mark.parametrize("body, reason", [
+    ("    With ws\n    For i = 1 To 10\n        .Cells(i, 1).Value = i\n    Next i\n    End With\n",
+     "target is qualified by a With block"),
+    ("    For i = 1 To 10\n        Cells(i + 1, 1).Value = i\n    Next i\n",
+     "Cells index is not a plain variable or number"),
+    ("    For i = 1 To 10\n        x = i\n        Cells(i, 1).Value = x\n    Next i\n",
+     "not the only statement of one or two nested For loops"),
+    ("    For i = 1 To 10\n        Cells(x, 1).Value = i\n    Next i\n",
+     "Cells index does not use the loop variable"),
+    ("    For i = 1 To 10\n        Cells(i, k).Value = i\n    Next i\n",
+     "fixed Cells index is not a declared variable or number"),
+    ("    For i = 1 To ws.Rows.Count\n        Cells(i, 1).Value = i\n    Next i\n",
+     "loop bounds are not numbers or declared variables independent of the loops"),
+    ("    For i = 1 To 10\n        Cells(i, 1).Value = Cells(i, 2).Value\n    Next i\n",
+     "value may read the sheet or call a procedure"),
+    ("    For i = 1 To 10\n        Cells(i, 1).Value = Compute(i)\n    Next i\n",
+     "value may read the sheet or call a procedure"),
+    ("    For i = 1 To 10\n        other.Cells(i, 1).Value = i\n    Next i\n",
+     "Cells qualifier is not a declared worksheet variable"),
+    ("    For i = 1 To 10: Cells(i, 1).Value = i: Next i\n",
+     "loop shares its lines with other statements"),
+    ("    For i = 5 To 1\n        Cells(i, 1).Value = i\n    Next i\n",
+     "loop never runs"),
+    # both loops are tried; the innermost attempt's reason is the one reported
+    ("    For i = 1 To 10\n        For j = 1 To 3\n            Cells(i, 1).Value = j\n        Next j\n    Next i\n",
+     "Cells index does not use the loop variable"),
+])
+def test_buffer_cells_rejections(body, reason):
+    code = sub(body)
+    assert reasons(code, "buffer-cells") == [reason]
+    assert "cellBuf" not in optimize(code)["optimizedCode"]
+
+# ----------------------------------------------------------------
+# getrows
+# ----------------------------------------------------------------
+def test_getrows_reads_one_array():
+    code = (
+        "Sub Load(rs As Object)\n"
+        "    Dim total As Double\n"
+        "    Do While Not rs.EOF\n"
+        "        total = total + rs.Fields(1).Value + rs(2)\n"
+        "        rs.MoveNext\n"
+        "    Loop\n"
+        "End Sub\n"
+    )
+    out = optimize(code)
+    assert out["optimizedCode"] == (
+        "Sub Load(rs As Object)\n"
+        "    Dim total As Double\n"
+        "    Dim rsRows As Variant, rsRow As Long\n"
+        "    If Not rs.EOF Then\n"
+        "        rsRows = rs.GetRows()\n"
+        "        For rsRow = 0 To UBound(rsRows, 2)\n"
+        "            total = total + rsRows(1, rsRow) + rsRows(2, rsRow)\n"
+        "        Next rsRow\n"
+        "    End If\n"
+        "End Sub\n"
+    )
+    assert [(r["transform"], r["line"], r["applied"]) for r in out["rewrites"]] == [("getrows", 3, True)]
+
+@pytest.mark.parametrize("header, closer", [("Do Until rs.EOF", "Loop"), ("While Not rs.EOF", "Wend")])
+def test_getrows_other_loop_forms(header, closer):
+    code = f"Sub Load(rs As Object)\n    Dim t As Double\n    {header}\n        t = t + rs(0).Value\n        rs.MoveNext\n    {closer}\nEnd Sub\n"
+    new = optimize(code)["optimizedCode"]
+    assert "t = t + rsRows(0, rsRow)" in new
+    assert "MoveNext" not in new
+
+def test_getrows_ignores_field_lookalikes_in_strings():
+    code = (
+        "Sub Load(rs As Object)\n"
+        "    Dim t As String\n"
+        "    Do While Not rs.EOF\n"
+        "        t = t & rs(0).Value & \"rs(1)\"\n"
+        "        rs.MoveNext\n"
+        "    Loop\n"
+        "End Sub\n"
+    )
+    assert "t = t & rsRows(0, rsRow) & \"rs(1)\"" in optimize(code)["optimizedCode"]
+
+def loop(body):
+    return "Sub P(rs As Object)\n    Dim t As Double, x As Object\n" + body + "End Sub\n"
+
+@pytest.mark.parametrize("body, reason", [
+    ("    Do While Not rs.EOF\n        t = t + rs(0).Value\n        rs.MoveNext\n    Loop Until t > 5\n",
+     "loop is unterminated or tests a condition at its end"),
+    ("    Do Until rs.EOF\n        t = t + rs(0).Value\n    Loop\n",
+     "loop does not end with rs.MoveNext"),
+    ("    While Not rs.EOF\n        t = t + rs(0).Value\n        If t > 5 Then Exit Sub\n        rs.MoveNext\n    Wend\n",
+     "loop body can leave the loop early"),
+    ("    Do While Not rs.EOF\n        t = t + x.rs(0)\n        rs.MoveNext\n    Loop\n",
+     "a member named rs is used in the loop"),
+    ("    Do While Not rs.EOF\n        t = t + rs(\"Amount\")\n        rs.MoveNext\n    Loop\n",
+     "rs is used other than by field ordinal"),
+    ("    Do While Not rs.EOF\n        Debug.Print rs(0)\n        rs.MoveNext\n    Loop\n",
+     "a field is passed as an object (read .Value to rewrite it)"),
+    ("    Do While Not rs.EOF\n        t = t + 1\n        rs.MoveNext\n    Loop\n",
+     "loop reads no fields"),
+    ("    Do While Not rs.EOF\n        t = t + rs(0).Value: rs.MoveNext\n    Loop\n",
+     "loop header or MoveNext shares its line with other statements"),
+])
+def test_getrows_rejections(body, reason):
+    code = loop(body)
+    assert report(code) == [("getrows", False, reason)]
+    assert optimize(code)["optimizedCode"] == code
+
+# ----------------------------------------------------------------
+# app-guard
+# ----------------------------------------------------------------
+def test_app_guard_manual_calculation_when_sub_is_self_contained():
+    code = (
+        "Sub Paint(ws As Worksheet)\n"
+        "    Dim i As Long\n"
+        "    For i = 1 To 10\n"
+        "        ws.Range(\"A1\").Offset(i, 0).Value = i\n"
+        "    Next i\n"
+        "End Sub\n"
+    )
+    out = optimize(code)
+    assert out["optimizedCode"] == (
+        "Sub Paint(ws As Worksheet)\n"
+        "    Dim i As Long\n"
+        "    Dim prevScreenUpdating As Boolean, prevCalculation As Long\n"
+        "    prevScreenUpdating = Application.ScreenUpdating\n"
+        "    prevCalculation = Application.Calculation\n"
+        "    On Error GoTo RestoreApp\n"
+        "    Application.ScreenUpdating = False\n"
+        "    Application.Calculation = xlCalculationManual\n"
+        "    For i = 1 To 10\n"
+        "        ws.Range(\"A1\").Offset(i, 0).Value = i\n"
+        "    Next i\n"
+        "RestoreApp:\n"
+        "    Application.Calculation = prevCalculation\n"
+        "    Application.ScreenUpdating = prevScreenUpdating\n"
+        "    If Err.Number <> 0 Then Err.Raise Err.Number, Err.Source, Err.Description\n"
+        "End Sub\n"
+    )
+    assert out["rewrites"] == [{"transform": "app-guard", "proc": "paint", "line": 1, "applied": True,
+                                "detail": "ScreenUpdating off and Calculation manual; restored at RestoreApp"}]
+
+def test_app_guard_reroutes_exit_sub_and_keeps_calculation_when_sheet_is_read():
+    code = (
+        "Sub Tidy()\n"
+        "    Dim i As Long\n"
+        "    For i = 1 To 10\n"
+        "        Range(\"A\" & i).Value = Format(i)\n"
+        "        If i = 5 Then Exit Sub ' not \"Exit Sub\" in here\n"
+        "    Next i\n"
+        "    Range(\"A1\").Select\n"
+        "End Sub\n"
+    )
+    out = optimize(code)
+    assert out["optimizedCode"] == (
+        "Sub Tidy()\n"
+        "    Dim i As Long\n"
+        "    Dim prevScreenUpdating As Boolean\n"
+        "    prevScreenUpdating = Application.ScreenUpdating\n"
+        "    On Error GoTo RestoreApp\n"
+        "    Application.ScreenUpdating = False\n"
+        "    For i = 1 To 10\n"
+        "        Range(\"A\" & i).Value = Format(i)\n"
+        "        If i = 5 Then GoTo RestoreApp ' not \"Exit Sub\" in here\n"
+        "    Next i\n"
+        "    Range(\"A1\").Select\n"
+        "RestoreApp:\n"
+        "    Application.ScreenUpdating = prevScreenUpdating\n"
+        "    If Err.Number <> 0 Then Err.Raise Err.Number, Err.Source, Err.Description\n"
+        "End Sub\n"
+    )
+    assert out["rewrites"][0]["detail"].endswith("restored at RestoreApp, 1 Exit Sub rerouted there")
+
+@pytest.mark.parametrize("code, reason", [
+    ("Function F() As Long\n    Range(\"A1\").Select\nEnd Function\n",
+     "Functions and Properties may run from worksheet formulas"),
+    ("Sub P()\n    Application.ScreenUpdating = False\n    Range(\"A1\").Select\nEnd Sub\n",
+     "procedure already sets ScreenUpdating or Calculation"),
+    ("Sub P()\n    On Error Resume Next\n    Range(\"A1\").Select\nEnd Sub\n",
+     "procedure has its own error handling"),
+    ("Sub P()\n    Range(\"A1\").Select\n    End\nEnd Sub\n",
+     "procedure can halt with End or Stop"),
+    ("Sub P()\n    Range(\"A1\").Select\n    Stop\nEnd Sub\n",
+     "procedure can halt with End or Stop"),
+    ("Sub P(): Range(\"A1\").Select\nEnd Sub\n",
+     "procedure header or End Sub shares its line with other statements"),
+    ("Sub P()\n    Range(\"A1\").Select: End Sub\n",
+     "procedure header or End Sub shares its line with other statements"),
+])
+def test_app_guard_rejections(code, reason):
+    assert report(code) == [("app-guard", False, reason)]
+    assert optimize(code)["optimizedCode"] == code
+
+# ----------------------------------------------------------------
+# whole-module behaviour
+# ----------------------------------------------------------------
+def test_nothing_to_do_leaves_module_and_diff_empty():
+    code = "Sub P()\n    Dim x As Long\n    x = 1\nEnd Sub\n"
+    assert optimize(code) == {"optimizedCode": code, "diff": "", "rewrites": []}
+
+def test_line_endings_and_trailing_newline():
+    lf   = "Sub P()\n    Range(\"A1\").Select\nEnd Sub\n"
+    crlf = optimize(lf.replace("\n", "\r\n"))
+    assert crlf == optimize(lf)
+    assert not optimize(lf.rstrip("\n"))["optimizedCode"].endswith("\n")
+
+def test_diff_names_the_module():
+    diff = optimize("Sub P()\n    Range(\"A1\").Select\nEnd Sub\n", "Sheet1")["diff"]
+    assert diff.startswith("--- a/Sheet1\n+++ b/Sheet1\n@@ ")
+    assert "+    Application.ScreenUpdating = False" in diff
+
+def test_rewritten_module_is_stable():
+    code = (
+        "Sub Fill()\n"
+        "    Dim i As Long\n"
+        "    For i = 1 To 3\n"
+        "        Cells(i, 1).Value = i\n"
+        "    Next i\n"
+        "End Sub\n"
+        "Sub Load(rs As Object)\n"
+        "    Dim t As Double\n"
+        "    Do Until rs.EOF\n"
+        "        t = t + rs(0).Value\n"
+        "        rs.MoveNext\n"
+        "    Loop\n"
+        "End Sub\n"
+    )
+    once = optimize(code)["optimizedCode"]
+    assert once != code
+    assert optimize(once) == {"optimizedCode": once, "diff": "", "rewrites": []}
@@ -0,0 +1,50 @@
+import pytest
+
+from _lexer import Lexed
+from audit_optimize import ENGINE, RULES, RuleEngine, _anchors, _heads, _line_scoped
+
+@pytest.mark.parametrize("pattern, scoped", [
+    (r"a\s+b", r"a[^\S\n]+b"),
+    (r"a\\s", r"a\\s"),                                 # escaped backslash, then "s"
+    (r"[^\S\n]*\S", r"[^\S\n]*\S"),
+])
+def test_line_scoped(pattern, scoped):
+    assert _line_scoped(pattern) == scoped
+
+def test_line_scoped_rejects_whitespace_class():
+    with pytest.raises(ValueError, match="inside a character class"):
+        _line_scoped(r"x[\s,]+y")
+
+@pytest.mark.parametrize("pattern, anchors, heads", [
+    (r"\bCells?\(.+?\)\s*=", ["Cell"], {"C", "c"}),
+    (r"\.Select\b|\bSelection\.", [".Select", "Selection."], {".", "S", "s"}),
+    (r"On\s+Error\s+Resume\s+Next", ["Resume"], {"O", "o"}),
+    (r"^\s*Public\s+", ["Public"], {"^"}),
+    (r"ab{2}c|x(?:yz)+w", ["ab", "x"], {"a", "A", "x", "X"}),
+    (r"(?:a|b)cd", ["cd"], None),
+    (r"\bs?tr", ["tr"], None),
+])
+def test_anchors_and_heads(pattern, anchors, heads):
+    assert _anchors(pattern) == anchors
+    assert _heads(pattern) == heads
+
+def test_rule_without_anchor_is_rejected():
+    with pytest.raises(ValueError, match="no literal anchor"):
+        RuleEngine([{"pattern": r"\w+\s*\d", "message": "", "fix": ""}])
+
+CODE = """Public Sub A()
+    Dim v As Variant: Variant = 3
+    x = "Cells(1, 1) = 2": Cells(1, 1) = 2
+    For i = 1 To 9: Range("A1").Select: Selection.Value = i: Next
+    On Error Resume Next ' Cells(1, 1) = 1
+    İ = 1: DoEvents()
+End Sub
+"""
+
+def test_prefilter_finds_every_hit():
+    whole = RuleEngine(RULES)
+    whole._spans = lambda code: [(0, len(code))]
+    lx = Lexed(CODE)
+    assert list(ENGINE.scan(lx)) == list(whole.scan(lx))
+    assert [(ln, RULES.index(r)) for ln, r, _ in ENGINE.scan(lx)] == [
+        (1, 12), (2, 9), (3, 1), (4, 0), (4, 2), (5, 4), (6, 8)]
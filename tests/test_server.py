@@ -0,0 +1,172 @@
+import http.client, json, os, socket, sys, threading, time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import server  # noqa: E402
+from _http import send_json  # noqa: E402
+from server import BUSY, DRAIN_MAX, Lane  # noqa: E402
+
+class Slow(BaseHTTPRequestHandler):
+    """Holds its slot until the test opens ``gate``."""
+    entered = gate = None
+
+    def do_POST(self):
+        self.rfile.read()
+        Slow.entered.set()
+        Slow.gate.wait(5)
+        send_json(self, {"done": True})
+
+class Echo(BaseHTTPRequestHandler):
+    """Answers without reading the body."""
+
+    def do_POST(self):
+        send_json(self, {"path": self.path})
+    do_GET = do_POST
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(server.Router, "routes", {"slow": Slow, "echo": Echo})
+    monkeypatch.setattr(server.Router, "lanes", {})
+    monkeypatch.setattr(server.Router, "timeout", 5)
+    monkeypatch.setattr(Slow, "entered", threading.Event())
+    monkeypatch.setattr(Slow, "gate", threading.Event())
+    running = []
+
+    def start(threads=4, backlog=4, lanes=None):
+        server.Router.lanes = lanes or {}
+        srv = server.Server(("127.0.0.1", 0), threads, backlog)
+        threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        running.append(srv)
+        return srv
+
+    yield start
+    Slow.gate.set()
+    for srv in running:
+        srv.shutdown()
+        srv.server_close()
+        srv.pool.shutdown(wait=True)
+
+def connect(srv):
+    return http.client.HTTPConnection(*srv.server_address, timeout=5)
+
+def post(srv, path, body=b"{}"):
+    conn = connect(srv)
+    conn.request("POST", path, body)
+    resp = conn.getresponse()
+    out  = resp.status, json.loads(resp.read())
+    conn.close()
+    return out
+
+def hold_slot(srv):
+    """A /api/slow request parked inside its handler; join() it after opening the gate."""
+    result = []
+    t = threading.Thread(target=lambda: result.append(post(srv, "/api/slow")), daemon=True)
+    t.start()
+    assert Slow.entered.wait(5)
+    return t, result
+
+def raw(srv, request, send_first=True):
+    """Everything the server writes back on one connection, until it closes it."""
+    with socket.create_connection(srv.server_address, timeout=5) as sock:
+        if send_first:
+            sock.sendall(request)
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+# ----------------------------------------------------------------
+# lanes
+# ----------------------------------------------------------------
+def test_saturated_lane_answers_busy_without_starving_other_routes(serve):
+    srv = serve(lanes={"slow": Lane(1, 0)})
+    t, result = hold_slot(srv)
+
+    conn = connect(srv)
+    conn.request("POST", "/api/slow", b"x" * 1000)
+    resp = conn.getresponse()
+    assert resp.status == 503 and resp.getheader("Retry-After") == "1" and resp.will_close
+    assert json.loads(resp.read()) == {"error": "Server too busy"}
+    assert post(srv, "/api/echo") == (200, {"path": "/api/echo"})          # unlaned routes still run
+
+    Slow.gate.set()
+    t.join(5)
+    assert result == [(200, {"done": True})]
+    assert post(srv, "/api/slow") == (200, {"done": True})                # the slot came back
+
+def test_busy_reads_off_the_body_before_closing(serve):
+    srv = serve(lanes={"slow": Lane(1, 0)})
+    hold_slot(srv)
+    body = b"x" * (DRAIN_MAX // 2)
+    head = f"POST /api/slow HTTP/1.1\r\nHost: t\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+    assert raw(srv, head + body) == BUSY                                  # a clean FIN, not a reset
+
+def test_lane_queue_admits_waiters_up_to_capacity():
+    lane, inside = Lane(1, 1), threading.Event()
+    with lane:
+        waiter = threading.Thread(target=lambda: lane.__enter__() and inside.set())
+        waiter.start()
+        time.sleep(0.05)
+        assert not inside.is_set() and lane.count == 2
+        with pytest.raises(server.Busy):
+            lane.__enter__()
+    waiter.join(5)
+    assert inside.is_set()
+    lane.__exit__(None, None, None)
+    assert lane.count == 0
+
+# ----------------------------------------------------------------
+# keep-alive framing
+# ----------------------------------------------------------------
+def test_unread_body_is_drained_and_the_connection_reused(serve):
+    srv  = serve()
+    conn = connect(srv)
+    conn.request("POST", "/api/echo?a", b"x" * 10000)
+    first = conn.getresponse()
+    assert json.loads(first.read()) == {"path": "/api/echo?a"} and not first.will_close
+    sock = conn.sock
+    conn.request("POST", "/api/echo?b", b"{}")
+    assert json.loads(conn.getresponse().read()) == {"path": "/api/echo?b"}
+    assert conn.sock is sock
+    conn.close()
+
+def test_body_past_drain_max_closes_the_connection(serve):
+    srv  = serve()
+    head = f"POST /api/echo HTTP/1.1\r\nHost: t\r\nContent-Length: {DRAIN_MAX + 1}\r\n\r\n".encode()
+    out  = raw(srv, head)                                                 # returns only once the server hangs up
+    assert out.startswith(b"HTTP/1.1 200 ") and out.endswith(b'{"path":"/api/echo"}')
+
+def test_refusals_drain_the_body(serve):
+    srv  = serve()
+    body = b"x" * 20000
+    out  = raw(srv, f"POST /api/nope HTTP/1.1\r\nHost: t\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    assert out.startswith(b"HTTP/1.1 404 ")
+
+# ----------------------------------------------------------------
+# connection pool and shutdown
+# ----------------------------------------------------------------
+def test_full_connection_pool_answers_busy_from_the_accept_loop(serve):
+    srv = serve(threads=1, backlog=0)
+    t, result = hold_slot(srv)
+    assert raw(srv, b"", send_first=False) == BUSY
+    Slow.gate.set()
+    t.join(5)
+    assert result == [(200, {"done": True})]
+    assert post(srv, "/api/echo") == (200, {"path": "/api/echo"})
+
+def test_shutdown_lets_in_flight_requests_finish(serve):
+    srv = serve()
+    t, result = hold_slot(srv)
+    srv.shutdown()
+    srv.server_close()
+    with pytest.raises(OSError):
+        socket.create_connection(srv.server_address, timeout=1)
+    done = threading.Thread(target=srv.pool.shutdown, kwargs={"wait": True})
+    done.start()
+    done.join(0.2)
+    assert done.is_alive()                                                # waiting on the parked request
+    Slow.gate.set()
+    t.join(5), done.join(5)
+    assert result == [(200, {"done": True})] and not done.is_alive()